@@ -1,3 +1,18 @@
-from .tasks import app as celery_app
+import sys
+from types import ModuleType
 
 __all__ = ('celery_app',)
+
+
+class _Package(ModuleType):
+
+    # Importing the tasks sets up the whole worker, clients which only use the router or the format table shouldn't
+    # need that. Celery's -A option looks for the app as "app". A module level __getattr__ would need Python 3.7.
+    def __getattr__(self, name: str):
+        if name in ('celery_app', 'app'):
+            from .tasks import app
+            return app
+        raise AttributeError(f'module {self.__name__} has no attribute {name}')
+
+
+sys.modules[__name__].__class__ = _Package
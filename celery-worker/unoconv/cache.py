@@ -0,0 +1,175 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from io import SEEK_SET
+from typing import BinaryIO, Callable, Dict, Optional
+
+from fs import open_fs
+from fs.errors import ResourceNotFound
+
+logger = logging.getLogger(__name__)
+
+# Leftovers of interrupted stores are removed after this many seconds
+_TEMPORARY_FILE_MAX_AGE = 3600
+
+# The counters are created before the Celery worker forks its pool processes, so that they are shared between all
+# processes of a worker.
+_counters = {name: multiprocessing.Value('Q', 0) for name in ('hits', 'misses', 'stores', 'evictions', 'errors')}
+
+
+def _increment(name: str, amount: int = 1) -> None:
+    counter = _counters[name]
+    with counter.get_lock():
+        counter.value += amount
+
+
+def statistics() -> Dict[str, int]:
+    return {name: counter.value for name, counter in _counters.items()}
+
+
+class ConversionCache:
+
+    def __init__(self, *, fs_url: str, max_bytes: Optional[int], ttl: Optional[int]) -> None:
+        self._fs = open_fs(fs_url, create=True)
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._eviction_lock = threading.Lock()
+
+    @staticmethod
+    def _path(key: str) -> str:
+        return f'{key[:2]}/{key}'
+
+    def get(self, key: str, file_factory: Callable[[], BinaryIO]) -> Optional[BinaryIO]:
+        path = self._path(key)
+        data = file_factory()
+        try:
+            self._fs.download(path, data)
+        except ResourceNotFound:
+            data.close()
+            _increment('misses')
+            return None
+        except Exception as exception:
+            data.close()
+            logger.warning(f'Reading {path} from the conversion cache failed with a {type(exception).__name__} '
+                           f'exception: {str(exception)}.')
+            _increment('errors')
+            _increment('misses')
+            return None
+
+        # Eviction is based on the modification time, refreshing it on each hit makes it least recently used.
+        # Filesystems which don't support setting it (like S3) degrade to first in, first out.
+        try:
+            self._fs.touch(path)
+        except Exception:
+            pass
+
+        _increment('hits')
+        data.seek(0, SEEK_SET)
+        return data
+
+    def put(self, key: str, data: BinaryIO) -> None:
+        path = self._path(key)
+        temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            self._fs.makedirs(key[:2], recreate=True)
+            # Readers must never see a partially written entry
+            self._fs.upload(temporary_path, data)
+            self._fs.move(temporary_path, path, overwrite=True)
+            _increment('stores')
+        except Exception as exception:
+            logger.warning(f'Writing {path} to the conversion cache failed with a {type(exception).__name__} '
+                           f'exception: {str(exception)}.')
+            _increment('errors')
+            try:
+                self._fs.remove(temporary_path)
+            except Exception:
+                pass
+        finally:
+            data.seek(0, SEEK_SET)
+
+    def _remove(self, path: str) -> None:
+        try:
+            self._fs.remove(path)
+        except ResourceNotFound:
+            # Already evicted by another worker
+            pass
+
+    def evict(self) -> None:
+        if not self._eviction_lock.acquire(blocking=False):
+            return
+
+        try:
+            now = time.time()
+            entries = []
+            total_bytes = 0
+            for path, info in self._fs.walk.info(namespaces=['details']):
+                if info.is_dir:
+                    continue
+                modified = info.modified.timestamp() if info.modified is not None else now
+
+                if path.endswith('.tmp'):
+                    if now - modified > _TEMPORARY_FILE_MAX_AGE:
+                        self._remove(path)
+                    continue
+
+                if self._ttl is not None and now - modified > self._ttl:
+                    self._remove(path)
+                    _increment('evictions')
+                    continue
+
+                entries.append((modified, info.size, path))
+                total_bytes += info.size
+
+            if self._max_bytes is not None and total_bytes > self._max_bytes:
+                entries.sort()
+                for _, size, path in entries:
+                    if total_bytes <= self._max_bytes:
+                        break
+                    self._remove(path)
+                    _increment('evictions')
+                    total_bytes -= size
+        finally:
+            self._eviction_lock.release()
+
+
+class Evictor:
+
+    # Evicts entries in a thread of the main worker process, so that listing the whole cache doesn't delay tasks
+    def __init__(self, *, cache: ConversionCache, interval: int) -> None:
+        self._cache = cache
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='unoconv-cache-evictor', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            try:
+                self._cache.evict()
+            except Exception as exception:
+                logger.warning(f'Evicting entries from the conversion cache failed with a {type(exception).__name__} '
+                               f'exception: {str(exception)}.')
+                _increment('errors')
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+_cache: Optional[ConversionCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(*, fs_url: str, max_bytes: Optional[int], ttl: Optional[int]) -> ConversionCache:
+    global _cache, _cache_pid
+
+    with _cache_lock:
+        # Don't share filesystem connections with the parent process
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = ConversionCache(fs_url=fs_url, max_bytes=max_bytes, ttl=ttl)
+            _cache_pid = os.getpid()
+        return _cache
@@ -0,0 +1,527 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional, Set
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+    from com.sun.star.uno import RuntimeException as UnoRuntimeException
+except ImportError:
+    uno = None
+
+logger = logging.getLogger(__name__)
+
+_Export = namedtuple('Export', ['export_format_name', 'filter_data', 'printer'])
+
+# Order matters: global documents are also text documents.
+# yapf: disable
+_EXPORT_FILTERS = [
+    ('com.sun.star.text.GlobalDocument', {'pdf': 'writer_globaldocument_pdf_Export', 'jpg': 'writer_jpg_Export', 'png': 'writer_png_Export'}),
+    ('com.sun.star.text.TextDocument', {'pdf': 'writer_pdf_Export', 'jpg': 'writer_jpg_Export', 'png': 'writer_png_Export'}),
+    ('com.sun.star.sheet.SpreadsheetDocument', {'pdf': 'calc_pdf_Export', 'jpg': 'calc_jpg_Export', 'png': 'calc_png_Export'}),
+    ('com.sun.star.presentation.PresentationDocument', {'pdf': 'impress_pdf_Export', 'jpg': 'impress_jpg_Export', 'png': 'impress_png_Export'}),
+    ('com.sun.star.drawing.DrawingDocument', {'pdf': 'draw_pdf_Export', 'jpg': 'draw_jpg_Export', 'png': 'draw_png_Export'}),
+    ('com.sun.star.formula.FormulaProperties', {'pdf': 'math_pdf_Export'}),
+]
+# yapf: enable
+
+# Exit code of soffice when it has just initialized a new user profile and needs to be restarted
+_SOFFICE_RESTART_EXIT_CODE = 81
+
+
+class ConversionTimeout(RuntimeError):
+    pass
+
+
+def available() -> bool:
+    return uno is not None
+
+
+def _parse_value(value: str) -> Any:
+    # Same conversion rules as unoconv uses for its -e option
+    if value in ('True', 'true'):
+        return True
+    elif value in ('False', 'false'):
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+# Interprets the subset of unoconv's command line options generated by the tasks module
+def parse_unoconv_args(args: List[str]) -> _Export:
+    export_format_name = None
+    filter_data = {}
+    printer = {}
+    args_iter = iter(args)
+    for arg in args_iter:
+        if arg in ('-f', '--format'):
+            export_format_name = next(args_iter)
+        elif arg in ('-e', '--export'):
+            name, _, value = next(args_iter).partition('=')
+            filter_data[name] = _parse_value(value)
+        elif arg in ('-P', '--printer'):
+            name, _, value = next(args_iter).partition('=')
+            printer[name] = value.upper() if name == 'PaperOrientation' else value
+        elif arg in ('-d', '--doctype', '-I', '--import-filter-name', '-T', '--timeout'):
+            # The import filter is chosen by LibreOffice's type detection and the export filter is derived
+            # from the type of the loaded document.
+            next(args_iter)
+        elif arg in ('--stdin', '--stdout'):
+            pass
+        else:
+            raise ValueError(f'Unsupported unoconv option {arg}.')
+
+    if export_format_name is None:
+        raise ValueError('No export format specified.')
+
+    return _Export(export_format_name=export_format_name, filter_data=filter_data, printer=printer)
+
+
+def _properties(**kwargs) -> tuple:
+    return tuple(PropertyValue(name, 0, value, 0) for name, value in kwargs.items())
+
+
+def _process_tree_rss(pid: int) -> int:
+    # soffice is a wrapper, most of the memory is used by its descendants
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name is in parentheses and may contain anything, the parent's PID is the second field after it
+        fields = stat[stat.rfind(')') + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(entry))
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    rss = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/statm') as statm_file:
+                rss += int(statm_file.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+        pending.extend(children.get(current, []))
+    return rss
+
+
+class UnoInstance:
+
+    def __init__(self, *, name: str, soffice: str, profile_dir: str, startup_timeout: int, slot: int = 0) -> None:
+        self.name = name
+        self.slot = slot
+        self.profile_dir = profile_dir
+        self._soffice = soffice
+        self._startup_timeout = startup_timeout
+        self._connection = f'pipe,name={name}'
+        self._process: Optional[subprocess.Popen] = None
+        self._desktop = None
+        self._timed_out = False
+        self.healthy = False
+        # Managed by UnoPool
+        self.conversions = 0
+        self.replacing = False
+        self.parked = False
+        self.retired = False
+
+    def start(self) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        args = [
+            self._soffice, '--headless', '--invisible', '--nocrashreport', '--nodefault', '--nofirststartwizard',
+            '--nologo', '--norestore', f'--accept={self._connection};urp;StarOffice.ComponentContext',
+            '-env:UserInstallation=' + uno.systemPathToFileUrl(self.profile_dir)
+        ]
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver',
+                                                                          local_context)
+
+        self._process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + self._startup_timeout
+        while True:
+            returncode = self._process.poll()
+            if returncode == _SOFFICE_RESTART_EXIT_CODE:
+                logger.debug(f'LibreOffice instance {self.name} initialized its profile, restarting.')
+                self._process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            elif returncode is not None:
+                raise RuntimeError(f'LibreOffice instance {self.name} exited with return code {returncode} during startup.')
+
+            try:
+                context = resolver.resolve(f'uno:{self._connection};urp;StarOffice.ComponentContext')
+                break
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    self._kill()
+                    raise RuntimeError(f'LibreOffice instance {self.name} did not accept connections within '
+                                       f'{self._startup_timeout} seconds.') from None
+                time.sleep(0.25)
+
+        self._desktop = context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        self._timed_out = False
+        self.conversions = 0
+        self.healthy = True
+        logger.info(f'LibreOffice instance {self.name} started with PID {self._process.pid}.')
+
+    def _kill(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def _on_timeout(self) -> None:
+        self._timed_out = True
+        self._kill()
+
+    def stop(self) -> None:
+        self.healthy = False
+        if self._desktop is not None:
+            try:
+                self._desktop.terminate()
+            except Exception:
+                pass
+            self._desktop = None
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._kill()
+            self._process = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def warm_up(self, input_path: str) -> None:
+        # Loads the filters and fonts before the first real conversion
+        with tempfile.TemporaryDirectory(prefix='unoconv-warmup-') as scratch_dir:
+            with self.open(input_path=input_path, timeout=self._startup_timeout) as document:
+                document.export(args=['--format', 'pdf'], output_path=os.path.join(scratch_dir, 'output.pdf'))
+        if not self.healthy:
+            raise RuntimeError(f'LibreOffice instance {self.name} failed during warm-up.')
+
+    def rss(self) -> int:
+        if self._process is None:
+            return 0
+        return _process_tree_rss(self._process.pid)
+
+    def _load(self, input_path: str):
+        document = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(input_path), '_blank', 0, _properties(Hidden=True, ReadOnly=True, UpdateDocMode=0))
+        if document is None:
+            raise RuntimeError('LibreOffice was unable to load the document.')
+        return document
+
+    @staticmethod
+    def _export_filter(document, export_format_name: str) -> str:
+        for service, filters in _EXPORT_FILTERS:
+            if document.supportsService(service):
+                if export_format_name not in filters:
+                    raise ValueError(f'Export format {export_format_name} is not supported for this document type.')
+                return filters[export_format_name]
+        raise ValueError('Unsupported document type.')
+
+    def _export(self, document, export: _Export, output_path: str) -> None:
+        if export.printer:
+            printer = document.getPrinter()
+            for setting in printer:
+                if setting.Name == 'PaperFormat' and 'PaperFormat' in export.printer:
+                    setting.Value = uno.Enum('com.sun.star.view.PaperFormat', export.printer['PaperFormat'])
+                elif setting.Name == 'PaperOrientation' and 'PaperOrientation' in export.printer:
+                    setting.Value = uno.Enum('com.sun.star.view.PaperOrientation', export.printer['PaperOrientation'])
+            document.setPrinter(printer)
+
+        properties = _properties(
+            FilterName=self._export_filter(document, export.export_format_name), Overwrite=True)
+        if export.filter_data:
+            properties += (PropertyValue(
+                'FilterData', 0, uno.Any('[]com.sun.star.beans.PropertyValue', _properties(**export.filter_data)), 0),)
+
+        document.storeToURL(uno.systemPathToFileUrl(output_path), properties)
+
+    def _failure(self, exception: Exception, timeout: int) -> RuntimeError:
+        # Errors caused by the document itself leave the instance usable, everything else indicates that
+        # LibreOffice has died or the UNO bridge is gone.
+        if self._timed_out or isinstance(exception, UnoRuntimeException) or self._process.poll() is not None:
+            self.healthy = False
+        if self._timed_out:
+            return ConversionTimeout(f'UNO conversion failed due to timeout after {timeout} seconds.')
+        return RuntimeError(f'UNO conversion failed with a {type(exception).__name__} exception: {str(exception)}.')
+
+    @contextmanager
+    def open(self, *, input_path: str, timeout: int):
+        # The timeout covers the whole time the document is open, i.e. loading and all exports
+        watchdog = threading.Timer(timeout, self._on_timeout)
+        watchdog.start()
+        document = None
+        try:
+            try:
+                document = self._load(input_path)
+            except (RuntimeError, ValueError):
+                raise
+            except Exception as exception:
+                raise self._failure(exception, timeout) from None
+
+            yield UnoDocument(instance=self, document=document, timeout=timeout)
+        finally:
+            watchdog.cancel()
+            if document is not None and self.healthy:
+                try:
+                    document.close(True)
+                except Exception:
+                    self.healthy = False
+
+
+class UnoDocument:
+
+    def __init__(self, *, instance: UnoInstance, document, timeout: int) -> None:
+        self._instance = instance
+        self._document = document
+        self._timeout = timeout
+
+    def page_count(self) -> Optional[int]:
+        # Pages of text documents and slides or drawing pages otherwise. Spreadsheets have no cheap equivalent.
+        try:
+            if self._document.supportsService('com.sun.star.text.TextDocument'):
+                return self._document.getCurrentController().getPropertyValue('PageCount')
+            elif self._document.supportsService('com.sun.star.drawing.GenericDrawingDocument'):
+                return self._document.getDrawPages().getCount()
+        except Exception as exception:
+            logger.debug(f'Determining the page count failed with a {type(exception).__name__} exception: '
+                         f'{str(exception)}.')
+        return None
+
+    def export(self, *, args: List[str], output_path: str) -> None:
+        export = parse_unoconv_args(args)
+
+        if not self._instance.healthy:
+            raise RuntimeError(f'LibreOffice instance {self._instance.name} failed during an earlier export.')
+        try:
+            self._instance._export(self._document, export, output_path)
+        except (RuntimeError, ValueError):
+            raise
+        except Exception as exception:
+            raise self._instance._failure(exception, self._timeout) from None
+
+
+class UnoPool:
+
+    def __init__(self,
+                 *,
+                 instances: int,
+                 soffice: str,
+                 profile_root: str,
+                 startup_timeout: int,
+                 max_conversions: Optional[int] = None,
+                 max_rss: Optional[int] = None,
+                 warmup_file: Optional[str] = None,
+                 on_recycle: Optional[Callable[[str], None]] = None) -> None:
+        if instances < 1:
+            raise ValueError('The number of LibreOffice instances must be at least one.')
+
+        self._soffice = soffice
+        self._startup_timeout = startup_timeout
+        self._max_conversions = max_conversions
+        self._max_rss = max_rss
+        self._warmup_file = warmup_file
+        self._on_recycle = on_recycle
+        self._profile_root = tempfile.mkdtemp(prefix='unoconv-profiles-', dir=profile_root)
+        self._generations = [0] * instances
+        # All instances which haven't been stopped yet, including retired ones still draining
+        self._instances: Set[UnoInstance] = set()
+        self._replacements: List[threading.Thread] = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._available: queue.Queue = queue.Queue()
+        try:
+            for slot in range(instances):
+                self._available.put(self._start_instance(slot))
+        except Exception:
+            # Otherwise the instances started so far would be left running
+            self.close()
+            raise
+
+    def _start_instance(self, slot: int) -> UnoInstance:
+        with self._lock:
+            generation = self._generations[slot]
+            self._generations[slot] += 1
+        # A replacement starts while its predecessor is still running, so each generation gets its own profile
+        instance = UnoInstance(
+            name=f'unoconv-{os.getpid()}-{slot}-{generation}',
+            soffice=self._soffice,
+            profile_dir=os.path.join(self._profile_root, f'{slot}-{generation}'),
+            startup_timeout=self._startup_timeout,
+            slot=slot)
+        with self._lock:
+            self._instances.add(instance)
+        try:
+            instance.start()
+            if self._warmup_file is not None:
+                instance.warm_up(self._warmup_file)
+        except Exception:
+            self._stop_instance(instance)
+            raise
+        return instance
+
+    def _stop_instance(self, instance: UnoInstance) -> None:
+        with self._lock:
+            self._instances.discard(instance)
+        instance.stop()
+        shutil.rmtree(instance.profile_dir, ignore_errors=True)
+
+    def _retire(self, instance: UnoInstance) -> None:
+        # Stopping waits for LibreOffice to terminate, nobody should have to wait for that
+        threading.Thread(target=self._stop_instance, args=(instance,), daemon=True).start()
+
+    def _recycle_reason(self, instance: UnoInstance) -> Optional[str]:
+        if not instance.healthy:
+            return 'timeout' if instance._timed_out else 'crash'
+        if self._max_conversions is not None and instance.conversions >= self._max_conversions:
+            return 'conversions'
+        if self._max_rss is not None and instance.rss() > self._max_rss:
+            return 'rss'
+        return None
+
+    def _replace(self, instance: UnoInstance, reason: str) -> None:
+        logger.info(f'Recycling LibreOffice instance {instance.name} after {instance.conversions} conversions '
+                    f'(reason: {reason}).')
+        try:
+            replacement = self._start_instance(instance.slot)
+        except Exception as exception:
+            logger.error(f'Starting a replacement for LibreOffice instance {instance.name} failed: {str(exception)}.')
+            with self._lock:
+                instance.replacing = False
+                parked, instance.parked = instance.parked, False
+            # Retried on the next checkout, see checkout()
+            if parked:
+                self._available.put(instance)
+            return
+
+        with self._lock:
+            closed = self._closed
+            instance.retired = True
+            parked = instance.parked
+        if closed:
+            self._stop_instance(replacement)
+            return
+        self._available.put(replacement)
+        if parked:
+            self._retire(instance)
+        if self._on_recycle is not None:
+            self._on_recycle(reason)
+
+    def _checkin(self, instance: UnoInstance) -> None:
+        instance.conversions += 1
+        reason = self._recycle_reason(instance)
+        with self._lock:
+            if instance.retired:
+                # The replacement is already available and the instance has finished its last conversion
+                retire = True
+            else:
+                retire = False
+                if reason is not None and not instance.replacing and not self._closed:
+                    instance.replacing = True
+                    replacement = threading.Thread(target=self._replace, args=(instance, reason), daemon=True)
+                    self._replacements.append(replacement)
+                    replacement.start()
+                # A healthy instance keeps serving until its replacement is ready
+                instance.parked = instance.replacing and not instance.healthy
+        if retire:
+            self._retire(instance)
+        elif not instance.parked:
+            self._available.put(instance)
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            try:
+                instance = self._available.get(
+                    timeout=max(0, deadline - time.monotonic()) if deadline is not None else None)
+            except queue.Empty:
+                raise RuntimeError('No LibreOffice instance became available in time.') from None
+            if not instance.retired:
+                break
+            self._retire(instance)
+
+        try:
+            if not instance.healthy:
+                # Only happens when starting a replacement has failed
+                instance.restart()
+            yield instance
+        finally:
+            self._checkin(instance)
+
+    @contextmanager
+    def open(self, *, input_path: str, timeout: int):
+        with self.checkout(timeout=timeout) as instance:
+            with instance.open(input_path=input_path, timeout=timeout) as document:
+                yield document
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            replacements, self._replacements = self._replacements, []
+        for replacement in replacements:
+            replacement.join()
+        with self._lock:
+            instances, self._instances = self._instances, set()
+        for instance in instances:
+            instance.stop()
+        shutil.rmtree(self._profile_root, ignore_errors=True)
+
+
+_pool: Optional[UnoPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(*,
+             instances: int,
+             soffice: str,
+             profile_root: Optional[str],
+             startup_timeout: int,
+             max_conversions: Optional[int] = None,
+             max_rss: Optional[int] = None,
+             warmup_file: Optional[str] = None,
+             on_recycle: Optional[Callable[[str], None]] = None) -> UnoPool:
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        # A pool inherited through fork() is unusable as the UNO bridges belong to the parent process.
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = UnoPool(
+                instances=instances,
+                soffice=soffice,
+                profile_root=profile_root,
+                startup_timeout=startup_timeout,
+                max_conversions=max_conversions,
+                max_rss=max_rss,
+                warmup_file=warmup_file,
+                on_recycle=on_recycle)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
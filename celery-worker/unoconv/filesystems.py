@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import List, Optional
+
+from fs import open_fs
+from fs.base import FS
+
+logger = logging.getLogger(__name__)
+
+_IdleFilesystem = namedtuple('IdleFilesystem', ['fs_url', 'fs', 'released'])
+
+
+def _close(fs: FS) -> None:
+    try:
+        fs.close()
+    except Exception as exception:
+        logger.debug(f'Closing filesystem failed with a {type(exception).__name__} exception: {str(exception)}.')
+
+
+class FilesystemPool:
+
+    def __init__(self, *, max_idle: int, idle_timeout: float, health_check_interval: float) -> None:
+        self._max_idle = max_idle
+        self._idle_timeout = idle_timeout
+        self._health_check_interval = health_check_interval
+        # Least recently released first
+        self._idle: List[_IdleFilesystem] = []
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> List[FS]:
+        expired = [entry.fs for entry in self._idle if now - entry.released > self._idle_timeout]
+        if expired:
+            self._idle = [entry for entry in self._idle if now - entry.released <= self._idle_timeout]
+        return expired
+
+    @staticmethod
+    def _healthy(fs: FS) -> bool:
+        try:
+            fs.check()
+            # Cheap for all filesystems, but goes over the wire for most remote ones
+            fs.getinfo('/')
+            return True
+        except Exception as exception:
+            logger.info(f'Dropping pooled filesystem after a failed health check ({type(exception).__name__} '
+                        f'exception: {str(exception)}).')
+            return False
+
+    def acquire(self, fs_url: str) -> FS:
+        # A filesystem is used exclusively by one caller at a time, not all implementations are thread-safe.
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                stale = self._expire(now)
+                entry = None
+                for index in range(len(self._idle) - 1, -1, -1):
+                    if self._idle[index].fs_url == fs_url:
+                        entry = self._idle.pop(index)
+                        break
+            for fs in stale:
+                _close(fs)
+
+            if entry is None:
+                return open_fs(fs_url)
+            if now - entry.released < self._health_check_interval or self._healthy(entry.fs):
+                return entry.fs
+            _close(entry.fs)
+
+    def release(self, fs_url: str, fs: FS, *, discard: bool = False) -> None:
+        if discard or self._max_idle < 1 or fs.isclosed():
+            _close(fs)
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            stale = self._expire(now)
+            self._idle.append(_IdleFilesystem(fs_url=fs_url, fs=fs, released=now))
+            while len(self._idle) > self._max_idle:
+                stale.append(self._idle.pop(0).fs)
+        for stale_fs in stale:
+            _close(stale_fs)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            _close(entry.fs)
+
+
+_pool: Optional[FilesystemPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(*, max_idle: int, idle_timeout: float, health_check_interval: float) -> FilesystemPool:
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        # Connections inherited through fork() are shared with the parent process and must not be used. They aren't
+        # closed either as that might affect the parent.
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = FilesystemPool(
+                max_idle=max_idle, idle_timeout=idle_timeout, health_check_interval=health_check_interval)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
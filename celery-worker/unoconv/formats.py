@@ -0,0 +1,116 @@
+from collections import namedtuple
+from typing import Any, Callable, Dict, Optional
+
+ImportFormat = namedtuple('ImportFormat', ['mime_type', 'document_type', 'import_filter', 'extension'])
+
+# yapf: disable
+FORMATS = [
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.graphics', document_type='presentation', import_filter='odg', extension='.odg'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.graphics-template', document_type='graphics', import_filter='otg', extension='.otg'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.graphics-flat-xml', document_type='graphics', import_filter='fodg', extension='.fodg'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.presentation', document_type='presentation', import_filter='odp', extension='.odp'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.presentation-template', document_type='presentation', import_filter='otp', extension='.otp'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.presentation-flat-xml', document_type='presentation', import_filter='fodp', extension='.fodp'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.spreadsheet', document_type='spreadsheet', import_filter='ods', extension='.ods'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.spreadsheet-template', document_type='spreadsheet', import_filter='ots', extension='.ots'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.spreadsheet-flat-xml', document_type='spreadsheet', import_filter='fods', extension='.fods'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.text', document_type='document', import_filter='odt', extension='.odt'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.text-flat-xml', document_type='document', import_filter='fodt', extension='.fodt'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.text-template', document_type='document', import_filter='ott', extension='.ott'),
+    ImportFormat(mime_type='application/vnd.oasis.opendocument.text-master-template', document_type='global', import_filter='otm', extension='.otm'),
+    ImportFormat(mime_type='application/vnd.sun.xml.calc', document_type='spreadsheet', import_filter='sxc', extension='.sxc'),
+    ImportFormat(mime_type='application/vnd.sun.xml.calc.template', document_type='spreadsheet', import_filter='stc', extension='.stc'),
+    ImportFormat(mime_type='application/vnd.sun.xml.draw', document_type='graphics', import_filter='sxd', extension='.sxd'),
+    ImportFormat(mime_type='application/vnd.sun.xml.draw.template', document_type='graphics', import_filter='std', extension='.std'),
+    ImportFormat(mime_type='application/vnd.sun.xml.impress', document_type='presentation', import_filter='sxi', extension='.sxi'),
+    ImportFormat(mime_type='application/vnd.sun.xml.impress.template', document_type='presentation', import_filter='sti', extension='.sti'),
+    ImportFormat(mime_type='application/vnd.sun.xml.math', document_type='formula', import_filter='sxm', extension='.sxm'),
+    ImportFormat(mime_type='application/vnd.sun.xml.writer', document_type='document', import_filter='sxw', extension='.sxw'),
+    ImportFormat(mime_type='application/vnd.sun.xml.writer.global', document_type='document', import_filter='sxg', extension='.sxg'),
+    ImportFormat(mime_type='application/vnd.sun.xml.writer.template', document_type='document', import_filter='stw', extension='.stw'),
+    ImportFormat(mime_type='application/vnd.sun.xml.writer.web', document_type='document', import_filter='stw', extension='.stw'),
+    ImportFormat(mime_type='application/msword', document_type='document', import_filter='doc', extension='.doc'),
+    ImportFormat(mime_type='application/msword', document_type='document', import_filter='doc', extension='.dot'),
+    ImportFormat(mime_type='application/x-mswrite', document_type='document', import_filter=None, extension='.wri'),
+    ImportFormat(mime_type='application/vnd.ms-works', document_type='document', import_filter=None, extension='.wps'),
+    ImportFormat(mime_type='application/vnd.ms-word.document.macroEnabled.12', document_type='document', import_filter=None, extension='.docm'),
+    ImportFormat(mime_type='application/vnd.ms-word.template.macroEnabled.12', document_type='document', import_filter='dotm', extension='.dotm'),
+    ImportFormat(mime_type='application/vnd.ms-powerpoint', document_type='presentation', import_filter='ppt', extension='.ppt'),
+    ImportFormat(mime_type='application/vnd.ms-powerpoint.presentation.macroEnabled.12', document_type='presentation', import_filter=None, extension='.pptm'),
+    ImportFormat(mime_type='application/vnd.ms-powerpoint', document_type='presentation', import_filter='pps', extension='.pps'),
+    ImportFormat(mime_type='application/vnd.ms-powerpoint.slideshow.macroEnabled.12', document_type='presentation', import_filter='pps', extension='.ppsm'),
+    ImportFormat(mime_type='application/vnd.ms-excel', document_type='spreadsheet', import_filter='xls', extension='.xls'),
+    ImportFormat(mime_type='application/vnd.ms-excel.sheet.macroEnabled.12', document_type='spreadsheet', import_filter='xls', extension='.xlsm'),
+    ImportFormat(mime_type='application/vnd.ms-excel', document_type='spreadsheet', import_filter='xlt', extension='.xlt'),
+    ImportFormat(mime_type='application/vnd.ms-excel.sheet.macroEnabled.12', document_type='spreadsheet', import_filter='xltm', extension='.xltm'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', document_type='spreadsheet', import_filter='xlsx', extension='.xlsx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.spreadsheetml.template', document_type='spreadsheet', import_filter='xlsx', extension='.xlsx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.presentation', document_type='presentation', import_filter='pptx', extension='.pptx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.template', document_type='presentation', import_filter='pptx', extension='.pptx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.slideshow', document_type='presentation', import_filter='pptx', extension='.pptx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.slide', document_type='presentation', import_filter='pptx', extension='.pptx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document', document_type='document', import_filter='docx', extension='.docx'),
+    ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.wordprocessingml.template', document_type='document', import_filter='docx', extension='.dotx'),
+    ImportFormat(mime_type='application/wps-office.doc', document_type='document', import_filter='doc', extension='.doc'),
+    ImportFormat(mime_type='application/wps-office.docx', document_type='document', import_filter='docx', extension='.docx'),
+    ImportFormat(mime_type='application/wps-office.xls', document_type='spreadsheet', import_filter='xls', extension='.xls'),
+    ImportFormat(mime_type='application/wps-office.xlsx', document_type='spreadsheet', import_filter='xlsx', extension='.xlsx'),
+    ImportFormat(mime_type='application/wps-office.ppt', document_type='presentation', import_filter='ppt', extension='.ppt'),
+    ImportFormat(mime_type='application/wps-office.pptx', document_type='presentation', import_filter='pptx', extension='.pptx'),
+    ImportFormat(mime_type='application/docbook+xml', document_type='document', import_filter='docbook', extension='.docbook'),
+    ImportFormat(mime_type='text/csv', document_type='spreadsheet', import_filter='csv', extension='.csv'),
+    ImportFormat(mime_type='text/spreadsheet', document_type='spreadsheet', import_filter='slk', extension='.slk'),
+    ImportFormat(mime_type='application/vnd.stardivision.draw', document_type='graphics', import_filter='sda', extension='.sda'),
+    ImportFormat(mime_type='application/vnd.stardivision.calc', document_type='spreadsheet', import_filter='sdc', extension='.sdc'),
+    ImportFormat(mime_type='application/vnd.sun.xml.calc.template', document_type='spreadsheet', import_filter='stc', extension='.stc'),
+    ImportFormat(mime_type='application/vnd.stardivision.impress', document_type='presentation', import_filter='sdd', extension='.sdd'),
+    ImportFormat(mime_type='application/vnd.stardivision.writer', document_type='document', import_filter='sdw', extension='.sdw'),
+    ImportFormat(mime_type='application/x-starwriter', document_type='document', import_filter='sdw', extension='.sdw'),
+    ImportFormat(mime_type='image/tiff', document_type='graphics', import_filter='tiff', extension='.tiff'),
+    ImportFormat(mime_type='image/tiff', document_type='graphics', import_filter='tiff', extension='.tif'),
+    ImportFormat(mime_type='image/emf', document_type='graphics', import_filter='emf', extension='.emf'),
+    ImportFormat(mime_type='image/x-emf', document_type='graphics', import_filter='emf', extension='.emf'),
+    ImportFormat(mime_type='image/x-svm', document_type='graphics', import_filter='svm', extension='.svm'),
+    ImportFormat(mime_type='image/wmf', document_type='graphics', import_filter='wmf', extension='.wmf'),
+    ImportFormat(mime_type='image/x-wmf', document_type='graphics', import_filter='wmf', extension='.wmf'),
+    ImportFormat(mime_type='image/x-pict', document_type='graphics', import_filter='pct', extension='.pct'),
+    ImportFormat(mime_type='image/x-cmx', document_type='graphics', import_filter='cmx', extension='.cmx'),
+    ImportFormat(mime_type='image/svg+xml', document_type='graphics', import_filter='svg', extension='.svg'),
+    ImportFormat(mime_type='image/bmp', document_type='graphics', import_filter='bmp', extension='.bmp'),
+    ImportFormat(mime_type='image/x-ms-bmp', document_type='graphics', import_filter='bmp', extension='.bmp'),
+    ImportFormat(mime_type='image/x-eps', document_type='graphics', import_filter='eps', extension='.eps'),
+    ImportFormat(mime_type='application/rtf', document_type='document', import_filter='rtf', extension='.rtf'),
+    ImportFormat(mime_type='text/rtf', document_type='document', import_filter='rtf', extension='.rtf'),
+]
+# yapf: enable
+
+# Raster images which the preview tasks can decode with Pillow instead of LibreOffice
+RASTER_IMPORT_FILTERS = {'tiff', 'bmp'}
+
+
+def _index_formats(key: Callable[[ImportFormat], Any]) -> Dict[Any, ImportFormat]:
+    index: Dict[Any, ImportFormat] = {}
+    for import_format in FORMATS:
+        # The first entry wins like with a linear search
+        index.setdefault(key(import_format), import_format)
+    return index
+
+
+_FORMATS_BY_MIME_TYPE_AND_EXTENSION = _index_formats(lambda import_format: (import_format.mime_type,
+                                                                            import_format.extension))
+_FORMATS_BY_EXTENSION = _index_formats(lambda import_format: import_format.extension)
+_FORMATS_BY_MIME_TYPE = _index_formats(lambda import_format: import_format.mime_type)
+
+
+def determine_import_format(mime_type: str, extension: str) -> Optional[ImportFormat]:
+    import_format = None
+    # Search for a full match
+    if mime_type is not None and extension is not None and extension not in ['.', '']:
+        import_format = _FORMATS_BY_MIME_TYPE_AND_EXTENSION.get((mime_type, extension))
+    # Search only by extension
+    if import_format is None and extension is not None and extension not in ['.', '']:
+        import_format = _FORMATS_BY_EXTENSION.get(extension)
+    # Search only by MIME type
+    if import_format is None and mime_type is not None:
+        import_format = _FORMATS_BY_MIME_TYPE.get(mime_type)
+    return import_format
@@ -0,0 +1,56 @@
+import logging
+import os
+
+from celery import bootsteps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 10
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class Heartbeat(bootsteps.StartStopStep):
+
+    # Touches a file as long as the main process of the worker is responsive and connected to the broker. The timer
+    # runs in the main process, so long conversions in the pool processes don't delay it. The liveness probe only
+    # checks the age of the file, see healthcheck-celery-worker.sh.
+    requires = {'celery.worker.components:Timer'}
+
+    def __init__(self, worker, **kwargs) -> None:
+        super().__init__(worker, **kwargs)
+        self._path = worker.app.conf.get('unoconv_heartbeat_file', os.environ.get('UNOCONV_HEARTBEAT_FILE'))
+        self._interval = worker.app.conf.get('unoconv_heartbeat_interval', DEFAULT_INTERVAL)
+        self._timer = None
+
+    def include_if(self, worker) -> bool:
+        return bool(self._path)
+
+    def start(self, worker) -> None:
+        # A file left over from a previous run would make the worker look alive before it has connected
+        _unlink(self._path)
+        self._timer = worker.timer.call_repeatedly(self._interval, self._beat, (worker,), priority=10)
+        logger.info(f'Writing heartbeat to {self._path} every {self._interval} seconds.')
+
+    def stop(self, worker) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        _unlink(self._path)
+
+    def _beat(self, worker) -> None:
+        connection = getattr(getattr(worker, 'consumer', None), 'connection', None)
+        # Without a broker connection the file gets stale and the worker is eventually restarted
+        if connection is None or not connection.connected:
+            return
+        try:
+            with open(self._path, 'a'):
+                pass
+            os.utime(self._path, None)
+        except OSError as exception:
+            logger.warning(f'Writing heartbeat failed with a {type(exception).__name__} exception: {str(exception)}.')
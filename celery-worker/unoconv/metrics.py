@@ -0,0 +1,156 @@
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, start_http_server
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+_DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_STAGE_DURATION = Histogram(
+    'unoconv_stage_duration_seconds',
+    'Time spent in each stage of a task',
+    ['task', 'stage', 'import_format', 'document_type', 'outcome'],
+    buckets=_DURATION_BUCKETS)
+_TASK_DURATION = Histogram(
+    'unoconv_task_duration_seconds',
+    'Time spent per task',
+    ['task', 'import_format', 'document_type', 'outcome'],
+    buckets=_DURATION_BUCKETS)
+_INPUT_BYTES = Counter('unoconv_input_bytes', 'Bytes read from input documents', ['task'])
+_OUTPUT_BYTES = Counter('unoconv_output_bytes', 'Bytes written to output files', ['task'])
+_BYTES_SAVED = Counter('unoconv_optimized_bytes_saved', 'Bytes saved by re-encoding images', ['task'])
+_REJECTED_DOCUMENTS = Counter('unoconv_rejected_documents', 'Documents rejected before conversion', ['task', 'reason'])
+_TIMEOUTS = Counter('unoconv_timeouts', 'Conversions aborted because of a timeout', ['task', 'backend'])
+_INSTANCE_RECYCLES = Counter('unoconv_instance_recycles', 'LibreOffice instances replaced by the uno backend', ['reason'])
+_SUBPROCESS_PEAK_RSS = Gauge(
+    'unoconv_subprocess_peak_rss_bytes',
+    'Largest resident set size of any conversion subprocess so far',
+    multiprocess_mode='max')
+
+_UNKNOWN = 'unknown'
+
+
+class _Measurement:
+
+    def __init__(self, task: str) -> None:
+        self.task = task
+        self.import_format = _UNKNOWN
+        self.document_type = _UNKNOWN
+        self.start = time.monotonic()
+        self.stages: List[Tuple[str, float]] = []
+
+
+# A worker process executes one task at a time, but stages may run in helper threads. So this is deliberately not
+# thread-local.
+_current: Optional[_Measurement] = None
+_lock = threading.Lock()
+
+
+def _task() -> str:
+    measurement = _current
+    return measurement.task if measurement is not None else _UNKNOWN
+
+
+def begin(task: str) -> None:
+    global _current
+
+    with _lock:
+        _current = _Measurement(task)
+
+
+def set_import_format(*, import_format: Optional[str], document_type: Optional[str]) -> None:
+    with _lock:
+        if _current is not None:
+            _current.import_format = import_format or _UNKNOWN
+            _current.document_type = document_type or _UNKNOWN
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        # Observed at the end of the task when the labels are known
+        with _lock:
+            if _current is not None:
+                _current.stages.append((name, time.monotonic() - start))
+
+
+def end(outcome: str) -> None:
+    global _current
+
+    with _lock:
+        measurement, _current = _current, None
+    if measurement is None:
+        return
+
+    for name, duration in measurement.stages:
+        _STAGE_DURATION.labels(
+            task=measurement.task,
+            stage=name,
+            import_format=measurement.import_format,
+            document_type=measurement.document_type,
+            outcome=outcome).observe(duration)
+    _TASK_DURATION.labels(
+        task=measurement.task,
+        import_format=measurement.import_format,
+        document_type=measurement.document_type,
+        outcome=outcome).observe(time.monotonic() - measurement.start)
+
+
+def input_bytes(amount: int) -> None:
+    _INPUT_BYTES.labels(task=_task()).inc(amount)
+
+
+def output_bytes(amount: int) -> None:
+    _OUTPUT_BYTES.labels(task=_task()).inc(amount)
+
+
+def bytes_saved(amount: int) -> None:
+    _BYTES_SAVED.labels(task=_task()).inc(amount)
+
+
+def document_rejected(reason: str) -> None:
+    _REJECTED_DOCUMENTS.labels(task=_task(), reason=reason).inc()
+
+
+def timeout(backend: str) -> None:
+    _TIMEOUTS.labels(task=_task(), backend=backend).inc()
+
+
+def instance_recycled(reason: str) -> None:
+    _INSTANCE_RECYCLES.labels(reason=reason).inc()
+
+
+def subprocess_finished() -> None:
+    # Covers all waited-for descendants, i.e. unoconv and a LibreOffice instance started by it
+    _SUBPROCESS_PEAK_RSS.set(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024)
+
+
+def _multiprocess_dir() -> Optional[str]:
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR', os.environ.get('prometheus_multiproc_dir'))
+
+
+def start_server(port: int) -> None:
+    if _multiprocess_dir() is not None:
+        # Aggregates the metrics written by all worker processes
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        logger.warning('PROMETHEUS_MULTIPROC_DIR is not set, only metrics of the main worker process are exported.')
+        registry = REGISTRY
+    start_http_server(port, registry=registry)
+    logger.info(f'Serving metrics on port {port}.')
+
+
+def process_exited(pid: int) -> None:
+    if _multiprocess_dir() is not None:
+        multiprocess.mark_process_dead(pid)
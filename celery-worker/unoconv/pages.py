@@ -0,0 +1,104 @@
+import math
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# Resolution used when no pixel dimensions are given, LibreOffice's image export uses the same
+DEFAULT_RESOLUTION = 96
+
+_PAGES_PATTERN = re.compile(r'^Pages:\s+(\d+)\s*$', re.MULTILINE)
+_PAGE_SIZE_PATTERN = re.compile(r'^Page\s+(\d+)\s+size:\s+([\d.]+)\s+x\s+([\d.]+)\s+pts', re.MULTILINE)
+_PAGE_ROTATION_PATTERN = re.compile(r'^Page\s+(\d+)\s+rot:\s+(\d+)', re.MULTILINE)
+
+
+def cpu_limit() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # Kubernetes CPU limits are enforced via the CFS quota, the affinity mask still contains all CPUs of the node.
+    quota = None
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            limit, period = cpu_max.read().split()
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as cfs_quota, \
+                    open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as cfs_period:
+                limit = int(cfs_quota.read())
+                if limit > 0:
+                    quota = limit / int(cfs_period.read())
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def _run(args: List[str], timeout: float) -> bytes:
+    try:
+        result = subprocess.run(
+            args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, check=True)
+    except FileNotFoundError:
+        raise RuntimeError(f'{args[0]} is not installed.') from None
+    except subprocess.CalledProcessError as exception:
+        raise RuntimeError(f'{args[0]} invocation failed with return code {exception.returncode} and output: ' +
+                           exception.stderr.decode('utf-8', errors='ignore').replace('\n', ', ')) from None
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f'{args[0]} invocation failed due to timeout after {timeout:.0f} seconds.') from None
+    return result.stdout
+
+
+def page_count(*, pdf_path: str, timeout: float) -> int:
+    output = _run(['pdfinfo', pdf_path], timeout).decode('utf-8', errors='ignore')
+    match = _PAGES_PATTERN.search(output)
+    if match is None:
+        raise RuntimeError('Determining the number of pages of the intermediate PDF document failed.')
+    return int(match.group(1))
+
+
+def page_sizes(*, pdf_path: str, first_page: int, last_page: int, timeout: float) -> Dict[int, Tuple[float, float]]:
+    # Returns the size (width, height) in points of each requested page as displayed, i.e. with the page rotation
+    # applied. pdfinfo fails when the first page is beyond the end of the document.
+    args = ['pdfinfo', '-f', str(first_page), '-l', str(last_page), pdf_path]
+    output = _run(args, timeout).decode('utf-8', errors='ignore')
+
+    rotations = {int(page): int(rotation) for page, rotation in _PAGE_ROTATION_PATTERN.findall(output)}
+    sizes = {}
+    for page, width, height in _PAGE_SIZE_PATTERN.findall(output):
+        page = int(page)
+        if rotations.get(page, 0) % 180 == 90:
+            width, height = height, width
+        sizes[page] = (float(width), float(height))
+
+    return sizes
+
+
+def rasterize(*, pdf_path: str, page: int, output_root: str, export_format_name: str, pixel_width: Optional[int],
+              pixel_height: Optional[int], quality: Optional[int], timeout: float) -> str:
+    args = ['pdftoppm', '-f', str(page), '-l', str(page), '-singlefile']
+    if export_format_name == 'jpg':
+        args.append('-jpeg')
+        if quality is not None:
+            args.extend(['-jpegopt', f'quality={quality}'])
+    elif export_format_name == 'png':
+        args.append('-png')
+    else:
+        raise NotImplementedError
+
+    if pixel_width is not None and pixel_height is not None:
+        args.extend(['-scale-to-x', str(pixel_width), '-scale-to-y', str(pixel_height)])
+    else:
+        args.extend(['-r', str(DEFAULT_RESOLUTION)])
+    args.extend([pdf_path, output_root])
+    _run(args, timeout)
+
+    output_path = output_root + ('.jpg' if export_format_name == 'jpg' else '.png')
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        raise RuntimeError(f'Rasterizing page {page} failed, pdftoppm produced no output.')
+    return output_path
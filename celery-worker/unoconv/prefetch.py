@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Tuple
+
+from fs.errors import ResourceNotFound
+
+from . import filesystems
+
+logger = logging.getLogger(__name__)
+
+_PART_SUFFIX = '.part'
+
+
+def _path(directory: str, task_id: str, fs_url: str, file: str) -> str:
+    # Each task gets its own copy, so that tasks with the same input can't claim or discard each other's copy. The
+    # URL may contain credentials, so it doesn't appear in the file name.
+    return os.path.join(directory, hashlib.sha256(f'{task_id}\0{fs_url}\0{file}'.encode('utf-8')).hexdigest())
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class Prefetcher:
+
+    # Runs in the main process of the worker and downloads the input documents of reserved tasks into a directory
+    # shared with the pool processes.
+    def __init__(self, *, directory: str, max_files: int, max_bytes: int, max_size: Optional[int], ttl: float,
+                 threads: int, fs_pool: filesystems.FilesystemPool) -> None:
+        self._directory = directory
+        self._max_files = max_files
+        self._max_bytes = max_bytes
+        self._max_size = max_size
+        self._ttl = ttl
+        self._fs_pool = fs_pool
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._reserved_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _usage(self) -> Tuple[int, int]:
+        files, size = 0, 0
+        now = time.time()
+        for entry in os.scandir(self._directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # Inputs of tasks which have been revoked or have failed before reading their input
+            if now - stat.st_mtime > self._ttl:
+                _unlink(entry.path)
+                continue
+            # Downloads in progress are accounted for separately
+            if not entry.name.endswith(_PART_SUFFIX):
+                files += 1
+                size += stat.st_size
+        return files, size
+
+    def submit(self, *, task_id: str, fs_url: str, file: str) -> None:
+        path = _path(self._directory, task_id, fs_url, file)
+        with self._lock:
+            files, _ = self._usage()
+            if files + self._pending >= self._max_files or os.path.exists(path):
+                return
+            # Tells the task that a download is coming, so that it waits instead of reading the document itself
+            try:
+                open(path + _PART_SUFFIX, 'xb').close()
+            except FileExistsError:
+                return
+            self._pending += 1
+        self._executor.submit(self._download, fs_url, file, path)
+
+    def _download(self, fs_url: str, file: str, path: str) -> None:
+        try:
+            try:
+                fs = self._fs_pool.acquire(fs_url)
+            except Exception as exception:
+                logger.info(f'Prefetching {file} failed with a {type(exception).__name__} exception: {str(exception)}.')
+                _unlink(path + _PART_SUFFIX)
+                return
+
+            discard = False
+            try:
+                size = fs.getinfo(file, namespaces=['details']).size
+                # The task rejects documents which are too large without downloading them
+                if self._max_size is not None and size > self._max_size:
+                    _unlink(path + _PART_SUFFIX)
+                    return
+                with self._lock:
+                    _, used_bytes = self._usage()
+                    if used_bytes + self._reserved_bytes + size > self._max_bytes:
+                        _unlink(path + _PART_SUFFIX)
+                        return
+                    self._reserved_bytes += size
+                try:
+                    with open(path + _PART_SUFFIX, 'wb') as part_file:
+                        fs.download(file, part_file)
+                    os.rename(path + _PART_SUFFIX, path)
+                finally:
+                    with self._lock:
+                        self._reserved_bytes -= size
+            except ResourceNotFound:
+                _unlink(path + _PART_SUFFIX)
+            except Exception as exception:
+                discard = True
+                # The task reads the document itself and reports any error
+                logger.info(f'Prefetching {file} failed with a {type(exception).__name__} exception: {str(exception)}.')
+                _unlink(path + _PART_SUFFIX)
+            finally:
+                self._fs_pool.release(fs_url, fs, discard=discard)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+
+def claim(*, directory: str, task_id: str, fs_url: str, file: str, wait: float) -> Optional[BinaryIO]:
+    # Called by the task. Returns the prefetched document if there is one, waiting for a download in progress.
+    path = _path(directory, task_id, fs_url, file)
+    claimed_path = f'{path}.{os.getpid()}'
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            os.rename(path, claimed_path)
+            break
+        except FileNotFoundError:
+            if not os.path.exists(path + _PART_SUFFIX) or time.monotonic() > deadline:
+                # Check again, the download might have finished in the meantime
+                try:
+                    os.rename(path, claimed_path)
+                    break
+                except FileNotFoundError:
+                    return None
+            time.sleep(0.05)
+
+    data = open(claimed_path, 'rb')
+    # The open file stays accessible after the directory entry is gone
+    os.unlink(claimed_path)
+    return data
+
+
+def discard(*, directory: str, task_id: str, fs_url: str, file: str) -> None:
+    _unlink(_path(directory, task_id, fs_url, file))
@@ -0,0 +1,83 @@
+import zipfile
+import zlib
+from io import SEEK_END, SEEK_SET
+from typing import BinaryIO
+
+from . import sniffer
+
+REASON_ENCRYPTED = 'encrypted'
+REASON_CORRUPT = 'corrupt'
+REASON_ZIP_BOMB = 'zip_bomb'
+
+# Streams of encrypted Office Open XML documents (which are wrapped in an OLE2 container) and of encrypted
+# PowerPoint 97-2003 presentations
+_OLE2_ENCRYPTION_STREAMS = ['EncryptionInfo', 'EncryptedPackage', 'EncryptedSummary']
+
+_ODF_MANIFEST = 'META-INF/manifest.xml'
+_ODF_MANIFEST_MAX_SIZE = 4 * 1024 * 1024
+
+# Office documents are compressed XML, so high ratios are normal for small documents
+_MIN_CHECKED_UNCOMPRESSED_SIZE = 16 * 1024 * 1024
+
+
+class DocumentRejectedError(ValueError):
+
+    def __init__(self, message: str, reason: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # Keeps the exception picklable for the result backend
+        return type(self), (str(self), self.reason)
+
+
+def _inspect_ole2(data: BinaryIO) -> None:
+    directory = sniffer.ole2_directory(data)
+    for stream_name in _OLE2_ENCRYPTION_STREAMS:
+        if sniffer.ole2_entry_name(stream_name) in directory:
+            raise DocumentRejectedError('Document is encrypted.', REASON_ENCRYPTED)
+
+
+def _inspect_zip(data: BinaryIO, *, max_compression_ratio: float, max_uncompressed_size: int) -> None:
+    size = data.seek(0, SEEK_END)
+    data.seek(0, SEEK_SET)
+    try:
+        # Only the central directory is read, nothing is decompressed except the ODF manifest
+        with zipfile.ZipFile(data) as archive:
+            infos = archive.infolist()
+            uncompressed_size = sum(info.file_size for info in infos)
+            # zipfile shifts the offsets by the difference between the recorded and the actual position of the
+            # central directory, so data missing before it results in negative offsets
+            if any(info.header_offset < 0 or info.header_offset + info.compress_size > size for info in infos):
+                raise DocumentRejectedError('Document is truncated.', REASON_CORRUPT)
+            if uncompressed_size > max_uncompressed_size:
+                raise DocumentRejectedError(
+                    f'Document is too large when uncompressed ({uncompressed_size} bytes, the limit is '
+                    f'{max_uncompressed_size} bytes).', REASON_ZIP_BOMB)
+            if uncompressed_size > _MIN_CHECKED_UNCOMPRESSED_SIZE and uncompressed_size > size * max_compression_ratio:
+                raise DocumentRejectedError(
+                    f'Document has a suspicious compression ratio of {uncompressed_size / size:.0f} (the limit is '
+                    f'{max_compression_ratio}).', REASON_ZIP_BOMB)
+
+            if any(info.flag_bits & 0x1 for info in infos):
+                raise DocumentRejectedError('Document is encrypted.', REASON_ENCRYPTED)
+            names = {info.filename for info in infos}
+            if _ODF_MANIFEST in names and archive.getinfo(_ODF_MANIFEST).file_size <= _ODF_MANIFEST_MAX_SIZE:
+                if b'encryption-data' in archive.read(_ODF_MANIFEST):
+                    raise DocumentRejectedError('Document is encrypted.', REASON_ENCRYPTED)
+    except (zipfile.BadZipFile, EOFError, zlib.error) as exception:
+        raise DocumentRejectedError(f'Document is corrupt: {str(exception)}.', REASON_CORRUPT) from None
+    finally:
+        data.seek(0, SEEK_SET)
+
+
+def inspect(data: BinaryIO, *, max_compression_ratio: float, max_uncompressed_size: int) -> None:
+    # Rejects documents which LibreOffice can't convert, but often only notices after a long time. Only the
+    # container is looked at, so this is cheap.
+    data.seek(0, SEEK_SET)
+    head = data.read(len(sniffer.OLE2_SIGNATURE))
+    data.seek(0, SEEK_SET)
+    if head.startswith(sniffer.OLE2_SIGNATURE):
+        _inspect_ole2(data)
+    elif head.startswith(sniffer.ZIP_SIGNATURE):
+        _inspect_zip(data, max_compression_ratio=max_compression_ratio, max_uncompressed_size=max_uncompressed_size)
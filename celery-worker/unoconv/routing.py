@@ -0,0 +1,162 @@
+import logging
+import os
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fs.errors import ResourceNotFound
+
+from . import filesystems, formats
+
+logger = logging.getLogger(__name__)
+
+Lane = namedtuple('Lane', ['queue', 'tasks', 'outputs', 'document_types', 'max_input_size'])
+
+_LANE_OPTIONS = set(Lane._fields)
+
+_TASK_OUTPUTS = {
+    'generate_preview_jpg': 'jpg',
+    'generate_preview_png': 'png',
+    'generate_preview_webp': 'webp',
+    'generate_pdf': 'pdf',
+    'generate_preview_jpg_batch': 'jpg',
+    'generate_preview_png_batch': 'png',
+    'generate_pdf_batch': 'pdf',
+    'generate_preview_jpg_inline': 'jpg',
+    'generate_preview_png_inline': 'png',
+    'generate_pdf_inline': 'pdf',
+}
+
+
+def parse_lanes(specifications: List[Dict[str, Any]]) -> List[Lane]:
+    lanes = []
+    for specification in specifications:
+        unknown_options = set(specification.keys()) - _LANE_OPTIONS
+        if unknown_options:
+            raise ValueError(f'Unknown lane options {", ".join(sorted(unknown_options))}.')
+        if not specification.get('queue'):
+            raise ValueError('Each lane needs a queue.')
+        lanes.append(
+            Lane(
+                queue=specification['queue'],
+                tasks=set(specification['tasks']) if specification.get('tasks') is not None else None,
+                outputs=set(specification['outputs']) if specification.get('outputs') is not None else None,
+                document_types=set(specification['document_types'])
+                if specification.get('document_types') is not None else None,
+                max_input_size=specification.get('max_input_size')))
+    return lanes
+
+
+def select_lane(lanes: List[Lane], *, task: str, outputs: Set[str], document_type: Optional[str],
+                input_size: Optional[int]) -> Optional[Lane]:
+    # The first matching lane wins. Criteria which can't be evaluated because the information is missing don't match,
+    # so the document ends up in a later, more tolerant lane.
+    for lane in lanes:
+        if lane.tasks is not None and task not in lane.tasks:
+            continue
+        if lane.outputs is not None and (not outputs or not outputs <= lane.outputs):
+            continue
+        if lane.document_types is not None and document_type not in lane.document_types:
+            continue
+        if lane.max_input_size is not None and (input_size is None or input_size > lane.max_input_size):
+            continue
+        return lane
+    return None
+
+
+def _task_outputs(task: str, kwargs: Dict[str, Any]) -> Set[str]:
+    if task in _TASK_OUTPUTS:
+        return {_TASK_OUTPUTS[task]}
+    elif task == 'generate_renditions':
+        return {rendition.get('format') for rendition in kwargs.get('renditions') or []}
+    elif task == 'generate_page_previews':
+        return {kwargs.get('format', 'jpg')}
+    return set()
+
+
+def _task_inputs(kwargs: Dict[str, Any]) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    if 'items' in kwargs:
+        return [(item.get('input_file'), item.get('mime_type'), item.get('extension'))
+                for item in kwargs.get('items') or []
+                if isinstance(item, dict)]
+    elif 'input_file' in kwargs or 'data' in kwargs:
+        return [(kwargs.get('input_file'), kwargs.get('mime_type'), kwargs.get('extension'))]
+    return []
+
+
+class Router:
+
+    # Usable as a Celery router, see the README
+    def __init__(self,
+                 *,
+                 lanes: List[Dict[str, Any]],
+                 max_input_size: Optional[int] = None,
+                 fs_pool_max_idle: int = 8,
+                 fs_pool_idle_timeout: float = 300,
+                 fs_pool_health_check_interval: float = 60) -> None:
+        self._lanes = parse_lanes(lanes)
+        self._max_input_size = max_input_size
+        self._fs_pool_max_idle = fs_pool_max_idle
+        self._fs_pool_idle_timeout = fs_pool_idle_timeout
+        self._fs_pool_health_check_interval = fs_pool_health_check_interval
+
+    def _input_size(self, fs_url: str, files: List[str]) -> Optional[int]:
+        pool = filesystems.get_pool(
+            max_idle=self._fs_pool_max_idle,
+            idle_timeout=self._fs_pool_idle_timeout,
+            health_check_interval=self._fs_pool_health_check_interval)
+        try:
+            fs = pool.acquire(fs_url)
+        except Exception as exception:
+            logger.warning(f'Opening filesystem for routing failed with a {type(exception).__name__} exception: '
+                           f'{str(exception)}.')
+            return None
+
+        discard = False
+        try:
+            return sum(fs.getinfo(file, namespaces=['details']).size for file in files)
+        except ResourceNotFound:
+            # Reported by the worker
+            return None
+        except Exception as exception:
+            discard = True
+            logger.warning(f'Determining the input size for routing failed with a {type(exception).__name__} '
+                           f'exception: {str(exception)}.')
+            return None
+        finally:
+            pool.release(fs_url, fs, discard=discard)
+
+    def __call__(self, name: str, args: Tuple, kwargs: Dict[str, Any], options: Dict[str, Any], task=None,
+                 **_) -> Optional[Dict[str, Any]]:
+        module, _, task_name = name.rpartition('.')
+        if module != 'unoconv.tasks' or 'queue' in options:
+            return None
+
+        inputs = _task_inputs(kwargs or {})
+        input_size = None
+        files = [file for file, _, _ in inputs if file is not None]
+        if isinstance(kwargs.get('data'), (bytes, bytearray, memoryview)):
+            input_size = len(kwargs['data'])
+        elif files and kwargs.get('input_fs_url') is not None:
+            input_size = self._input_size(kwargs['input_fs_url'], files)
+        if self._max_input_size is not None and input_size is not None and input_size > self._max_input_size:
+            raise ValueError(f'Input is too large ({input_size} bytes, the limit is {self._max_input_size} bytes).')
+
+        document_types = set()
+        for file, mime_type, extension in inputs:
+            if extension is None and file is not None:
+                _, extension = os.path.splitext(file)
+            import_format = formats.determine_import_format(mime_type, extension)
+            document_types.add(import_format.document_type if import_format is not None else None)
+        # Batches of mixed document types only match lanes without a restriction on the document type
+        document_type = document_types.pop() if len(document_types) == 1 else None
+
+        lane = select_lane(
+            self._lanes,
+            task=task_name,
+            outputs=_task_outputs(task_name, kwargs or {}),
+            document_type=document_type,
+            input_size=input_size)
+        if lane is None:
+            return None
+        logger.debug(f'Routing {name} to queue {lane.queue} (input size {input_size}, document type {document_type}).')
+        return {'queue': lane.queue}
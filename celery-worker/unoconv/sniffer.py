@@ -0,0 +1,222 @@
+import re
+import struct
+import zipfile
+import zlib
+from collections import namedtuple
+from io import SEEK_SET
+from typing import BinaryIO, Optional
+
+# Only this many bytes are read from the start of a document. For ZIP containers the central directory at the end
+# is only consulted when the first entry doesn't identify the format.
+SNIFF_SIZE = 8192
+
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_SIGNATURE = b'PK\x03\x04'
+
+# Either the MIME type or the extension may be None, the container is always set. A result with neither only says
+# what kind of file it is, but not which format.
+Sniffed = namedtuple('Sniffed', ['mime_type', 'extension', 'container'])
+
+# yapf: disable
+_CONTAINERS = {
+    'ole2': {'.doc', '.dot', '.xls', '.xlt', '.ppt', '.pps', '.wps', '.sdw', '.sdc', '.sda', '.sdd'},
+    'zip': {
+        '.odg', '.otg', '.odp', '.otp', '.ods', '.ots', '.odt', '.ott', '.otm',
+        '.sxc', '.stc', '.sxd', '.std', '.sxi', '.sti', '.sxm', '.sxw', '.sxg', '.stw',
+        '.docx', '.dotx', '.docm', '.dotm', '.xlsx', '.xlsm', '.xltm', '.pptx', '.pptm', '.ppsm',
+    },
+    'rtf': {'.rtf'},
+    'tiff': {'.tif', '.tiff'},
+    'bmp': {'.bmp'},
+    'emf': {'.emf'},
+    'wmf': {'.wmf'},
+    'svg': {'.svg'},
+}
+# yapf: enable
+
+_CONTAINER_BY_EXTENSION = {
+    extension: container for container, extensions in _CONTAINERS.items() for extension in extensions
+}
+
+# yapf: disable
+# Names of the main stream in an OLE2 compound document
+_OLE2_STREAMS = [
+    ('WordDocument', '.doc'),
+    ('Workbook', '.xls'),
+    ('Book', '.xls'),
+    ('PowerPoint Document', '.ppt'),
+    ('StarWriterDocument', '.sdw'),
+    ('StarCalcDocument', '.sdc'),
+    ('CONTENTS', '.wps'),
+]
+
+# Content type of the main part of an OOXML document
+_OOXML_CONTENT_TYPES = {
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml': 'application/vnd.openxmlformats-officedocument.wordprocessingml.template',
+    'application/vnd.ms-word.document.macroEnabled.main+xml': 'application/vnd.ms-word.document.macroEnabled.12',
+    'application/vnd.ms-word.template.macroEnabledTemplate.main+xml': 'application/vnd.ms-word.template.macroEnabled.12',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.template.main+xml': 'application/vnd.openxmlformats-officedocument.spreadsheetml.template',
+    'application/vnd.ms-excel.sheet.macroEnabled.main+xml': 'application/vnd.ms-excel.sheet.macroEnabled.12',
+    'application/vnd.ms-excel.template.macroEnabled.main+xml': 'application/vnd.ms-excel.sheet.macroEnabled.12',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'application/vnd.openxmlformats-officedocument.presentationml.template.main+xml': 'application/vnd.openxmlformats-officedocument.presentationml.template',
+    'application/vnd.openxmlformats-officedocument.presentationml.slideshow.main+xml': 'application/vnd.openxmlformats-officedocument.presentationml.slideshow',
+    'application/vnd.ms-powerpoint.presentation.macroEnabled.main+xml': 'application/vnd.ms-powerpoint.presentation.macroEnabled.12',
+    'application/vnd.ms-powerpoint.slideshow.macroEnabled.main+xml': 'application/vnd.ms-powerpoint.slideshow.macroEnabled.12',
+}
+# yapf: enable
+
+_CONTENT_TYPE_PATTERN = re.compile(rb'ContentType="([^"]+\.main\+xml)"')
+
+# Whitespace, processing instructions, comments and the document type declaration before the root element
+_XML_PROLOG_PATTERN = re.compile(rb'(?:\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^\[>]*(?:\[.*?\])?\s*>)*', re.DOTALL)
+_SVG_ROOT_PATTERN = re.compile(rb'<(?:[A-Za-z_][\w.-]*:)?svg[\s/>]')
+
+# Bounds the reads for corrupt or hostile sector chains
+_OLE2_MAX_DIRECTORY_SECTORS = 32
+
+_ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+
+def container(extension: Optional[str]) -> Optional[str]:
+    return _CONTAINER_BY_EXTENSION.get(extension)
+
+
+def _read_ole2_directory(data: BinaryIO, head: bytes) -> bytes:
+    if len(head) < 512:
+        return b''
+
+    sector_shift, = struct.unpack_from('<H', head, 0x1e)
+    if sector_shift not in (9, 12):
+        return b''
+    sector_size = 1 << sector_shift
+    # The first 109 FAT sectors are listed in the header, that covers documents of up to about 7 MiB (with
+    # 512 byte sectors) completely and the directory is usually near the start anyway.
+    fat_sectors = struct.unpack_from('<109I', head, 0x4c)
+    entries_per_sector = sector_size // 4
+
+    def read_sector(sector: int) -> bytes:
+        data.seek((sector + 1) * sector_size, SEEK_SET)
+        return data.read(sector_size)
+
+    directory = []
+    sector, = struct.unpack_from('<I', head, 0x30)
+    while sector < 0xfffffffa and len(directory) < _OLE2_MAX_DIRECTORY_SECTORS:
+        directory.append(read_sector(sector))
+        fat_index = sector // entries_per_sector
+        if fat_index >= len(fat_sectors) or fat_sectors[fat_index] >= 0xfffffffa:
+            break
+        fat_sector = read_sector(fat_sectors[fat_index])
+        offset = (sector % entries_per_sector) * 4
+        if offset + 4 > len(fat_sector):
+            break
+        sector, = struct.unpack_from('<I', fat_sector, offset)
+
+    return b''.join(directory)
+
+
+def ole2_directory(data: BinaryIO) -> bytes:
+    # The raw directory entries of an OLE2 compound document, see _read_ole2_directory for the limits
+    data.seek(0, SEEK_SET)
+    try:
+        return _read_ole2_directory(data, data.read(SNIFF_SIZE))
+    finally:
+        data.seek(0, SEEK_SET)
+
+
+def ole2_entry_name(name: str) -> bytes:
+    # Directory entries start with the NUL terminated UTF-16 name
+    return (name + '\0').encode('utf-16-le')
+
+
+def _sniff_ole2(data: BinaryIO, head: bytes) -> Sniffed:
+    directory = _read_ole2_directory(data, head)
+    for stream_name, extension in _OLE2_STREAMS:
+        if ole2_entry_name(stream_name) in directory:
+            return Sniffed(mime_type=None, extension=extension, container='ole2')
+
+    return Sniffed(mime_type=None, extension=None, container='ole2')
+
+
+def _ooxml_mime_type(content_types: bytes) -> Optional[str]:
+    for content_type in _CONTENT_TYPE_PATTERN.findall(content_types):
+        mime_type = _OOXML_CONTENT_TYPES.get(content_type.decode('ascii', errors='ignore'))
+        if mime_type is not None:
+            return mime_type
+    return None
+
+
+def _sniff_zip_head(head: bytes) -> Optional[str]:
+    # OpenDocument requires an uncompressed mimetype entry first, and Office usually writes [Content_Types].xml
+    # first. In both cases the head is sufficient.
+    if len(head) < _ZIP_LOCAL_HEADER.size:
+        return None
+    _, _, _, method, _, _, _, compressed_size, size, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack_from(head)
+    name = head[_ZIP_LOCAL_HEADER.size:_ZIP_LOCAL_HEADER.size + name_length]
+    content = head[_ZIP_LOCAL_HEADER.size + name_length + extra_length:]
+
+    if name == b'mimetype' and method == zipfile.ZIP_STORED and 0 < size <= len(content):
+        return content[:size].decode('ascii', errors='ignore').strip()
+    elif name == b'[Content_Types].xml' and method in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        if method == zipfile.ZIP_DEFLATED:
+            try:
+                content = zlib.decompressobj(-zlib.MAX_WBITS).decompress(content, 64 * 1024)
+            except zlib.error:
+                return None
+        return _ooxml_mime_type(content)
+    return None
+
+
+def _sniff_zip(data: BinaryIO, head: bytes) -> Sniffed:
+    mime_type = _sniff_zip_head(head)
+    if mime_type is not None:
+        return Sniffed(mime_type=mime_type, extension=None, container='zip')
+
+    try:
+        with zipfile.ZipFile(data) as archive:
+            names = set(archive.namelist())
+            # OpenDocument and the older StarOffice XML formats
+            if 'mimetype' in names:
+                mime_type = archive.read('mimetype').decode('ascii', errors='ignore').strip()
+            # Office Open XML
+            elif '[Content_Types].xml' in names:
+                mime_type = _ooxml_mime_type(archive.read('[Content_Types].xml'))
+    except (zipfile.BadZipFile, EOFError, ValueError, zlib.error):
+        pass
+
+    return Sniffed(mime_type=mime_type, extension=None, container='zip')
+
+
+def _is_svg(head: bytes) -> bool:
+    # Only the root element counts, flat OpenDocument and DocBook files may contain SVG elements as well
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+    prolog = _XML_PROLOG_PATTERN.match(head)
+    return _SVG_ROOT_PATTERN.match(head, prolog.end()) is not None
+
+
+def sniff(data: BinaryIO) -> Optional[Sniffed]:
+    data.seek(0, SEEK_SET)
+    try:
+        head = data.read(SNIFF_SIZE)
+        if head.startswith(OLE2_SIGNATURE):
+            return _sniff_ole2(data, head)
+        elif head.startswith(ZIP_SIGNATURE):
+            return _sniff_zip(data, head)
+        elif head.startswith(b'{\\rtf'):
+            return Sniffed(mime_type='application/rtf', extension='.rtf', container='rtf')
+        elif head.startswith((b'II*\0', b'MM\0*')):
+            return Sniffed(mime_type='image/tiff', extension='.tiff', container='tiff')
+        elif head.startswith(b'BM') and head[6:10] == b'\0\0\0\0':
+            return Sniffed(mime_type='image/bmp', extension='.bmp', container='bmp')
+        elif head.startswith(b'\x01\0\0\0') and head[40:44] == b' EMF':
+            return Sniffed(mime_type='image/emf', extension='.emf', container='emf')
+        elif head.startswith(b'\xd7\xcd\xc6\x9a'):
+            return Sniffed(mime_type='image/wmf', extension='.wmf', container='wmf')
+        elif _is_svg(head):
+            return Sniffed(mime_type='image/svg+xml', extension='.svg', container='svg')
+        return None
+    finally:
+        data.seek(0, SEEK_SET)
@@ -1,160 +1,363 @@
+import fcntl
+import hashlib
+import json
 import os
+import re
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+import zipfile
 from collections import namedtuple
-from io import BytesIO, SEEK_SET
-from typing import ByteString, List, Optional, Tuple, BinaryIO
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from io import BytesIO, SEEK_END, SEEK_SET, UnsupportedOperation
+from typing import Any, ByteString, Callable, Dict, Iterator, List, Optional, Tuple, BinaryIO
 
 from PIL import Image
-from fs import open_fs
-from celery import Celery
+from fs.base import FS
+from celery import Celery, current_task
+from celery.signals import (task_postrun, task_prerun, task_received, worker_init, worker_process_init,
+                            worker_process_shutdown, worker_shutdown)
+from celery.utils.log import get_task_logger
+from celery.worker.control import inspect_command
 from fs.errors import ResourceNotFound
+from fs.path import dirname
+
+from . import cache, engine, filesystems, formats, heartbeat, metrics, pages, preflight, prefetch, sniffer
+from .formats import ImportFormat
 
 app = Celery('unoconv')
 app.config_from_object('unoconv.celeryconfig')
+app.steps['worker'].add(heartbeat.Heartbeat)
+
+logger = get_task_logger(__name__)
 
-_ImportFormat = namedtuple('ImportFormat', ['mime_type', 'document_type', 'import_filter', 'extension'])
 _Dimensions = namedtuple(
     'Dimensions', ['pixel_height', 'pixel_width', 'logical_height', 'logical_width', 'scale_height', 'scale_width'])
 _null_dimensions = _Dimensions(None, None, None, None, False, False)
-
-# yapf: disable
-FORMATS = [
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.graphics', document_type='presentation', import_filter='odg', extension='.odg'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.graphics-template', document_type='graphics', import_filter='otg', extension='.otg'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.graphics-flat-xml', document_type='graphics', import_filter='fodg', extension='.fodg'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.presentation', document_type='presentation', import_filter='odp', extension='.odp'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.presentation-template', document_type='presentation', import_filter='otp', extension='.otp'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.presentation-flat-xml', document_type='presentation', import_filter='fodp', extension='.fodp'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.spreadsheet', document_type='spreadsheet', import_filter='ods', extension='.ods'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.spreadsheet-template', document_type='spreadsheet', import_filter='ots', extension='.ots'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.spreadsheet-flat-xml', document_type='spreadsheet', import_filter='fods', extension='.fods'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.text', document_type='document', import_filter='odt', extension='.odt'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.text-flat-xml', document_type='document', import_filter='fodt', extension='.fodt'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.text-template', document_type='document', import_filter='ott', extension='.ott'),
-    _ImportFormat(mime_type='application/vnd.oasis.opendocument.text-master-template', document_type='global', import_filter='otm', extension='.otm'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.calc', document_type='spreadsheet', import_filter='sxc', extension='.sxc'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.calc.template', document_type='spreadsheet', import_filter='stc', extension='.stc'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.draw', document_type='graphics', import_filter='sxd', extension='.sxd'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.draw.template', document_type='graphics', import_filter='std', extension='.std'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.impress', document_type='presentation', import_filter='sxi', extension='.sxi'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.impress.template', document_type='presentation', import_filter='sti', extension='.sti'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.math', document_type='formula', import_filter='sxm', extension='.sxm'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.writer', document_type='document', import_filter='sxw', extension='.sxw'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.writer.global', document_type='document', import_filter='sxg', extension='.sxg'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.writer.template', document_type='document', import_filter='stw', extension='.stw'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.writer.web', document_type='document', import_filter='stw', extension='.stw'),
-    _ImportFormat(mime_type='application/msword', document_type='document', import_filter='doc', extension='.doc'),
-    _ImportFormat(mime_type='application/msword', document_type='document', import_filter='doc', extension='.dot'),
-    _ImportFormat(mime_type='application/x-mswrite', document_type='document', import_filter=None, extension='.wri'),
-    _ImportFormat(mime_type='application/vnd.ms-works', document_type='document', import_filter=None, extension='.wps'),
-    _ImportFormat(mime_type='application/vnd.ms-word.document.macroEnabled.12', document_type='document', import_filter=None, extension='.docm'),
-    _ImportFormat(mime_type='application/vnd.ms-word.template.macroEnabled.12', document_type='document', import_filter='dotm', extension='.dotm'),
-    _ImportFormat(mime_type='application/vnd.ms-powerpoint', document_type='presentation', import_filter='ppt', extension='.ppt'),
-    _ImportFormat(mime_type='application/vnd.ms-powerpoint.presentation.macroEnabled.12', document_type='presentation', import_filter=None, extension='.pptm'),
-    _ImportFormat(mime_type='application/vnd.ms-powerpoint', document_type='presentation', import_filter='pps', extension='.pps'),
-    _ImportFormat(mime_type='application/vnd.ms-powerpoint.slideshow.macroEnabled.12', document_type='presentation', import_filter='pps', extension='.ppsm'),
-    _ImportFormat(mime_type='application/vnd.ms-excel', document_type='spreadsheet', import_filter='xls', extension='.xls'),
-    _ImportFormat(mime_type='application/vnd.ms-excel.sheet.macroEnabled.12', document_type='spreadsheet', import_filter='xls', extension='.xlsm'),
-    _ImportFormat(mime_type='application/vnd.ms-excel', document_type='spreadsheet', import_filter='xlt', extension='.xlt'),
-    _ImportFormat(mime_type='application/vnd.ms-excel.sheet.macroEnabled.12', document_type='spreadsheet', import_filter='xltm', extension='.xltm'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', document_type='spreadsheet', import_filter='xlsx', extension='.xlsx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.spreadsheetml.template', document_type='spreadsheet', import_filter='xlsx', extension='.xlsx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.presentation', document_type='presentation', import_filter='pptx', extension='.pptx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.template', document_type='presentation', import_filter='pptx', extension='.pptx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.slideshow', document_type='presentation', import_filter='pptx', extension='.pptx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.presentationml.slide', document_type='presentation', import_filter='pptx', extension='.pptx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document', document_type='document', import_filter='docx', extension='.docx'),
-    _ImportFormat(mime_type='application/vnd.openxmlformats-officedocument.wordprocessingml.template', document_type='document', import_filter='docx', extension='.dotx'),
-    _ImportFormat(mime_type='application/wps-office.doc', document_type='document', import_filter='doc', extension='.doc'),
-    _ImportFormat(mime_type='application/wps-office.docx', document_type='document', import_filter='docx', extension='.docx'),
-    _ImportFormat(mime_type='application/wps-office.xls', document_type='spreadsheet', import_filter='xls', extension='.xls'),
-    _ImportFormat(mime_type='application/wps-office.xlsx', document_type='spreadsheet', import_filter='xlsx', extension='.xlsx'),
-    _ImportFormat(mime_type='application/wps-office.ppt', document_type='presentation', import_filter='ppt', extension='.ppt'),
-    _ImportFormat(mime_type='application/wps-office.pptx', document_type='presentation', import_filter='pptx', extension='.pptx'),
-    _ImportFormat(mime_type='application/docbook+xml', document_type='document', import_filter='docbook', extension='.docbook'),
-    _ImportFormat(mime_type='text/csv', document_type='spreadsheet', import_filter='csv', extension='.csv'),
-    _ImportFormat(mime_type='text/spreadsheet', document_type='spreadsheet', import_filter='slk', extension='.slk'),
-    _ImportFormat(mime_type='application/vnd.stardivision.draw', document_type='graphics', import_filter='sda', extension='.sda'),
-    _ImportFormat(mime_type='application/vnd.stardivision.calc', document_type='spreadsheet', import_filter='sdc', extension='.sdc'),
-    _ImportFormat(mime_type='application/vnd.sun.xml.calc.template', document_type='spreadsheet', import_filter='stc', extension='.stc'),
-    _ImportFormat(mime_type='application/vnd.stardivision.impress', document_type='presentation', import_filter='sdd', extension='.sdd'),
-    _ImportFormat(mime_type='application/vnd.stardivision.writer', document_type='document', import_filter='sdw', extension='.sdw'),
-    _ImportFormat(mime_type='application/x-starwriter', document_type='document', import_filter='sdw', extension='.sdw'),
-    _ImportFormat(mime_type='image/tiff', document_type='graphics', import_filter='tiff', extension='.tiff'),
-    _ImportFormat(mime_type='image/tiff', document_type='graphics', import_filter='tiff', extension='.tif'),
-    _ImportFormat(mime_type='image/emf', document_type='graphics', import_filter='emf', extension='.emf'),
-    _ImportFormat(mime_type='image/x-emf', document_type='graphics', import_filter='emf', extension='.emf'),
-    _ImportFormat(mime_type='image/x-svm', document_type='graphics', import_filter='svm', extension='.svm'),
-    _ImportFormat(mime_type='image/wmf', document_type='graphics', import_filter='wmf', extension='.wmf'),
-    _ImportFormat(mime_type='image/x-wmf', document_type='graphics', import_filter='wmf', extension='.wmf'),
-    _ImportFormat(mime_type='image/x-pict', document_type='graphics', import_filter='pct', extension='.pct'),
-    _ImportFormat(mime_type='image/x-cmx', document_type='graphics', import_filter='cmx', extension='.cmx'),
-    _ImportFormat(mime_type='image/svg+xml', document_type='graphics', import_filter='svg', extension='.svg'),
-    _ImportFormat(mime_type='image/bmp', document_type='graphics', import_filter='bmp', extension='.bmp'),
-    _ImportFormat(mime_type='image/x-ms-bmp', document_type='graphics', import_filter='bmp', extension='.bmp'),
-    _ImportFormat(mime_type='image/x-eps', document_type='graphics', import_filter='eps', extension='.eps'),
-    _ImportFormat(mime_type='application/rtf', document_type='document', import_filter='rtf', extension='.rtf'),
-    _ImportFormat(mime_type='text/rtf', document_type='document', import_filter='rtf', extension='.rtf'),
-]
-# yapf: enable
+_Rendition = namedtuple(
+    'Rendition',
+    ['export_format_name', 'output_file', 'dimensions', 'quality', 'compression', 'paper_format', 'paper_orientation',
+     'page'])
+# Converts the document of a conversion session with the supplied unoconv arguments
+_Session = Callable[[List[str]], BinaryIO]
 
 UNOCONV_DEFAULT_TIMEOUT = 300
+DEFAULT_SPOOL_THRESHOLD = 8 * 1024 * 1024
 
+SOURCE_CONVERSION = 'conversion'
+SOURCE_RASTER = 'raster'
+SOURCE_CACHE = 'cache'
+SOURCE_EMBEDDED_THUMBNAIL = 'embedded_thumbnail'
+SOURCE_MIXED = 'mixed'
+
+BACKEND_UNOCONV = 'unoconv'
+BACKEND_UNO = 'uno'
+
+
+class _Report:
+
+    # Collects what is returned to the client about the conversion of one document. It is passed along explicitly,
+    # the items of a batch are processed concurrently and tasks can be called directly. The metrics only observe it.
+    def __init__(self) -> None:
+        self.durations: Dict[str, float] = {}
+        self.bytes_saved = 0
+        self.page_count: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            with metrics.stage(name):
+                yield
+        finally:
+            with self._lock:
+                self.durations[name] = self.durations.get(name, 0.0) + time.monotonic() - start
+
+    def add_bytes_saved(self, amount: int) -> None:
+        with self._lock:
+            self.bytes_saved += amount
+        metrics.bytes_saved(amount)
+
+
+def _setting(name: str, default: Any = None) -> Any:
+    return app.conf.get(f'unoconv_{name}', default)
 
-def _determine_import_format(mime_type: str, extension: str) -> Optional[_ImportFormat]:
-    # Search for a full match
-    if mime_type is not None and extension is not None and extension not in ['.', '']:
-        for import_format in FORMATS:
-            if mime_type == import_format.mime_type and extension == import_format.extension:
-                return import_format
-    # Search only by extension
-    if extension is not None and extension not in ['.', '']:
-        for import_format in FORMATS:
-            if extension == import_format.extension:
-                return import_format
-    # Search only by MIME type
-    if mime_type is not None:
-        for import_format in FORMATS:
-            if mime_type == import_format.mime_type:
-                return import_format
-    return None
+
+def _sniff_import_format(data: BinaryIO, import_format: Optional[ImportFormat]) -> Optional[ImportFormat]:
+    sniffed = sniffer.sniff(data)
+    if sniffed is None:
+        return import_format
+
+    sniffed_import_format = formats.determine_import_format(sniffed.mime_type, sniffed.extension)
+    if import_format is None:
+        return sniffed_import_format
+
+    # The content and the supplied metadata agree as long as both are the same kind of container. The metadata is
+    # more specific then (templates, macro-enabled variants) unless it contradicts the sniffed document type.
+    if sniffer.container(import_format.extension) == sniffed.container:
+        if sniffed_import_format is None or sniffed_import_format.document_type == import_format.document_type:
+            return import_format
+
+    if sniffed_import_format is None:
+        return import_format
+
+    logger.info(f'Document content indicates {sniffed_import_format.mime_type} ({sniffed_import_format.extension}) '
+                f'instead of {import_format.mime_type} ({import_format.extension}).')
+    return sniffed_import_format
 
 
 @app.task
 def supported_import_format(*, mime_type: str = None, extension: str = None) -> bool:
-    import_format = _determine_import_format(mime_type, extension)
+    import_format = formats.determine_import_format(mime_type, extension)
     return import_format is not None
 
 
-def _call_unoconv(*, args: List[str], data: BinaryIO, timeout: int) -> BytesIO:
+class _SpooledFile(tempfile.SpooledTemporaryFile):
+
+    # Keeps track of whether the data has been moved to a file, SpooledTemporaryFile only records that privately
+    on_disk = False
+
+    def rollover(self) -> None:
+        super().rollover()
+        self.on_disk = True
+
+
+def _spooled_file() -> BinaryIO:
+    # Data is kept in memory up to the spool threshold and then moved to a file in the temporary directory, this
+    # bounds the memory usage independent of the document size.
+    return _SpooledFile(max_size=_setting('spool_threshold', DEFAULT_SPOOL_THRESHOLD))
+
+
+def _file_descriptor(data: BinaryIO) -> Optional[int]:
+    # Don't force a spooled file which is still in memory to disk
+    if isinstance(data, tempfile.SpooledTemporaryFile) and not getattr(data, 'on_disk', True):
+        return None
+    try:
+        return data.fileno()
+    except (AttributeError, UnsupportedOperation):
+        return None
+
+
+# Lock file and port of the listener leased by this worker process
+_listener_lease: Optional[Tuple[Optional[BinaryIO], int]] = None
+
+
+def _listener_ports() -> List[int]:
+    instances = int(os.environ.get('UNOCONV_INSTANCES', '1'))
+    base_port = int(os.environ.get('UNOCONV_BASE_PORT', '2002'))
+    return [base_port + index for index in range(instances)]
+
+
+@worker_process_init.connect
+def _lease_listener(**_) -> None:
+    global _listener_lease
+
+    ports = _listener_ports()
+    if len(ports) < 2:
+        return
+
+    # Each worker process exclusively uses one of the listeners. The lock is released by the kernel when the
+    # process exits, so that its replacement can take over the listener.
+    for port in ports:
+        lock_file = open(os.path.join(tempfile.gettempdir(), f'unoconv-listener-{port}.lock'), 'wb')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            continue
+        _listener_lease = (lock_file, port)
+        logger.info(f'Leased unoconv listener on port {port}.')
+        return
+
+    # More worker processes than listeners, share one
+    port = ports[os.getpid() % len(ports)]
+    _listener_lease = (None, port)
+    logger.warning(f'All unoconv listeners are leased, sharing the listener on port {port}.')
+
+
+def _call_unoconv(*, args: List[str], data: BinaryIO, timeout: int, report: _Report) -> BinaryIO:
     args.insert(0, 'unoconv')
+    if _listener_lease is not None:
+        _, port = _listener_lease
+        # The profile is only used when unoconv has to start LibreOffice itself because there is no listener
+        args.extend(['--port', str(port), f'--user-profile={tempfile.gettempdir()}/unoconv-profile-{port}'])
     args.extend(['--stdin', '--stdout', '--timeout', str(timeout)])
 
+    output_data = tempfile.TemporaryFile()
     try:
-        # Unfortunately we can't pass the file like object directly to subprocess.run as it requires a real
-        # OS file descriptor underneath.
-        result = subprocess.run(
-            args, input=data.read(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        # Documents residing in a real file are passed to unoconv by file descriptor without reading them into
+        # memory, the output is written to a file directly, too.
+        with report.stage('convert'):
+            if _file_descriptor(data) is not None:
+                result = subprocess.run(args, stdin=data, stdout=output_data, stderr=subprocess.PIPE, timeout=timeout)
+            else:
+                result = subprocess.run(
+                    args, input=data.read(), stdout=output_data, stderr=subprocess.PIPE, timeout=timeout)
     except subprocess.CalledProcessError as exception:
+        output_data.close()
         raise RuntimeError(f'unoconv invocation failed with return code {result.returncode} and output: ' +
                            exception.stderr.decode('utf-8', errors='ignore').replace('\n', ', ')) from None
     except subprocess.TimeoutExpired as exception:
+        output_data.close()
+        metrics.timeout(BACKEND_UNOCONV)
         raise RuntimeError(f'unoconv invocation failed due to timeout with output: ' +
                            exception.stderr.decode('utf-8', errors='ignore').replace('\n', ', ')) from None
     except Exception as exception:
+        output_data.close()
         raise RuntimeError(f'unoconv invocation failed with a {type(exception).__name__} exception: {str(exception)}.') from None
+    finally:
+        metrics.subprocess_finished()
 
     decoded_stderr = result.stderr.decode('utf-8', errors='ignore').replace('\n', ', ')
     if result.returncode == 0:
-        if len(result.stdout) == 0:
+        if output_data.seek(0, SEEK_END) == 0:
+            output_data.close()
             raise RuntimeError(f'unoconv invocation was successful but did not return any data. Output on stderr was: ' + decoded_stderr)
-        return BytesIO(result.stdout)
+        output_data.seek(0, SEEK_SET)
+        return output_data
     else:
+        output_data.close()
         raise RuntimeError(f'unoconv invocation failed with return code {result.returncode} and output: ' + decoded_stderr)
 
 
-def _populate_args_for_image(*, import_format: _ImportFormat, export_format_name: str,
-                             dimensions: _Dimensions) -> List[str]:
+def _uno_backend_enabled() -> bool:
+    backend = _setting('backend', BACKEND_UNOCONV)
+    if backend == BACKEND_UNOCONV:
+        return False
+    elif backend == BACKEND_UNO:
+        if not engine.available():
+            logger.warning('The UNO Python module is not available, falling back to invoking unoconv.')
+            return False
+        return True
+    else:
+        raise RuntimeError(f'Unknown conversion backend {backend}.')
+
+
+def _uno_pool() -> engine.UnoPool:
+    return engine.get_pool(
+        instances=_setting('uno_instances', 1),
+        soffice=_setting('uno_soffice', 'soffice'),
+        profile_root=_setting('uno_profile_dir'),
+        startup_timeout=_setting('uno_startup_timeout', 60),
+        max_conversions=_setting('uno_max_conversions'),
+        max_rss=_setting('uno_max_rss'),
+        warmup_file=_setting('uno_warmup_file'),
+        on_recycle=metrics.instance_recycled)
+
+
+@worker_process_init.connect
+def _start_uno_pool(**_) -> None:
+    # Start LibreOffice before the first task arrives so that it doesn't have to pay for the cold start
+    if _uno_backend_enabled():
+        _uno_pool()
+
+
+@worker_process_shutdown.connect
+def _stop_uno_pool(**_) -> None:
+    engine.close_pool()
+
+
+@worker_init.connect
+def _start_metrics_server(**_) -> None:
+    # Runs in the main worker process, the pool processes write their metrics to PROMETHEUS_MULTIPROC_DIR
+    port = _setting('metrics_port')
+    if port is not None:
+        metrics.start_server(port)
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid: int, **_) -> None:
+    metrics.process_exited(pid)
+
+
+@task_prerun.connect
+def _begin_task_metrics(task, **_) -> None:
+    metrics.begin(task.name)
+
+
+@task_postrun.connect
+def _end_task_metrics(state: str, **_) -> None:
+    metrics.end(state.lower() if state is not None else 'unknown')
+
+
+def _clamp_timeout(timeout: int) -> int:
+    # Workers of a lane for small documents don't accept the default timeout meant for large ones
+    max_timeout = _setting('max_timeout')
+    return min(timeout, max_timeout) if max_timeout is not None else timeout
+
+
+@contextmanager
+def _conversion_session(*, data: BinaryIO, import_format: ImportFormat, timeout: int,
+                        report: _Report) -> Iterator[_Session]:
+    # A session converts the same input document repeatedly. With the UNO backend the document is only loaded
+    # once per session, with unoconv each conversion is a separate invocation.
+    timeout = _clamp_timeout(timeout)
+    if not _uno_backend_enabled():
+
+        def convert(args: List[str]) -> BinaryIO:
+            data.seek(0, SEEK_SET)
+            return _call_unoconv(args=list(args), data=data, timeout=timeout, report=report)
+
+        yield convert
+        return
+
+    try:
+        pool = _uno_pool()
+    except Exception as exception:
+        raise RuntimeError(f'Starting LibreOffice failed with a {type(exception).__name__} exception: {str(exception)}.') from None
+
+    with tempfile.TemporaryDirectory(prefix='unoconv-') as scratch_dir:
+        input_path = os.path.join(scratch_dir, 'input' + (import_format.extension or ''))
+        output_path = os.path.join(scratch_dir, 'output')
+        data.seek(0, SEEK_SET)
+        with open(input_path, 'wb') as input_file:
+            shutil.copyfileobj(data, input_file)
+
+        with ExitStack() as stack:
+            try:
+                with report.stage('load'):
+                    document = stack.enter_context(pool.open(input_path=input_path, timeout=timeout))
+            except engine.ConversionTimeout:
+                metrics.timeout(BACKEND_UNO)
+                raise
+            report.page_count = document.page_count()
+
+            def convert(args: List[str]) -> BinaryIO:
+                try:
+                    with report.stage('convert'):
+                        document.export(args=args, output_path=output_path)
+                except engine.ConversionTimeout:
+                    metrics.timeout(BACKEND_UNO)
+                    raise
+                try:
+                    # The open file stays accessible after the directory entry is gone
+                    output_data = open(output_path, 'rb')
+                finally:
+                    if os.path.exists(output_path):
+                        os.unlink(output_path)
+                if os.fstat(output_data.fileno()).st_size == 0:
+                    output_data.close()
+                    raise RuntimeError('UNO conversion was successful but did not return any data.')
+                return output_data
+
+            yield convert
+
+
+def _page_range(page: Optional[int]) -> Optional[str]:
+    if page is None and _setting('preview_first_page_only', False):
+        page = 1
+    if page is None:
+        return None
+    # unoconv would pass a plain number as an integer, but the export filters expect a string
+    return f'{page}-{page}'
+
+
+def _populate_args_for_image(*, import_format: ImportFormat, export_format_name: str, dimensions: _Dimensions,
+                             page: Optional[int]) -> List[str]:
     unoconv_args = ['--format', export_format_name]
     if import_format.document_type is not None:
         unoconv_args.extend(['--doctype', import_format.document_type])
@@ -171,23 +374,31 @@ def _populate_args_for_image(*, import_format: _ImportFormat, export_format_name
     if dimensions.logical_width:
         unoconv_args.extend(['-e', f'LogicalWidth={dimensions.logical_width}'])
 
-    return unoconv_args
-
+    # Without a page range LibreOffice lays out the whole document before exporting the first page
+    page_range = _page_range(page)
+    if page_range is not None:
+        unoconv_args.extend(['-e', f'PageRange={page_range}'])
 
-def _scale_dimensions(*, data: BinaryIO, dimensions: _Dimensions) -> _Dimensions:
+    return unoconv_args
 
-    assert dimensions.scale_height or dimensions.scale_width
 
+def _load_image(data: BinaryIO) -> Image.Image:
     try:
         image = Image.open(data)
         image.load()
     except Exception as exception:
         raise RuntimeError(f'Loading internal image data failed with a {type(exception).__name__} exception: {str(exception)}.') from None
+    return image
+
+
+def _fit_dimensions(*, dimensions: _Dimensions, height: int, width: int) -> _Dimensions:
+
+    assert dimensions.scale_height or dimensions.scale_width
 
     scale_height = dimensions.scale_height
     scale_width = dimensions.scale_width
     if scale_height and scale_width:
-        ratio = image.height / image.width
+        ratio = height / width
         # Image is wider than high
         if ratio < 1.0:
             scale_width = False
@@ -196,21 +407,21 @@ def _scale_dimensions(*, data: BinaryIO, dimensions: _Dimensions) -> _Dimensions
             scale_height = False
 
     if scale_height:
-        scaled_pixel_height = round(dimensions.pixel_width * image.height / image.width)
+        scaled_pixel_height = round(dimensions.pixel_width * height / width)
         scaled_pixel_width = dimensions.pixel_width
 
         if dimensions.logical_width is not None:
-            scaled_logical_height = round(dimensions.logical_width * image.height / image.width)
+            scaled_logical_height = round(dimensions.logical_width * height / width)
         else:
             scaled_logical_height = dimensions.logical_height
         scaled_logical_width = dimensions.logical_width
     elif scale_width:
         scaled_pixel_height = dimensions.pixel_height
-        scaled_pixel_width = round(dimensions.pixel_height * image.width / image.height)
+        scaled_pixel_width = round(dimensions.pixel_height * width / height)
 
         scaled_logical_height = dimensions.logical_height
         if dimensions.logical_height is not None:
-            scaled_logical_width = round(dimensions.logical_height * image.width / image.height)
+            scaled_logical_width = round(dimensions.logical_height * width / height)
         else:
             scaled_logical_width = dimensions.logical_width
 
@@ -223,48 +434,214 @@ def _scale_dimensions(*, data: BinaryIO, dimensions: _Dimensions) -> _Dimensions
         scale_width=dimensions.scale_width)
 
 
-def _convert_to_jpg(*, data: BinaryIO, import_format: _ImportFormat, dimensions: _Dimensions, quality: int,
-                    timeout: int) -> BytesIO:
+def _scale_dimensions(*, data: BinaryIO, dimensions: _Dimensions, report: _Report) -> _Dimensions:
+    with report.stage('scale'):
+        image = _load_image(data)
+        return _fit_dimensions(dimensions=dimensions, height=image.height, width=image.width)
+
+
+_JPEG_OPTIMIZE_OPTIONS = {'optimize': True, 'progressive': True}
+
+
+# Image formats LibreOffice can't export, these are encoded by Pillow from a lossless PNG rendition
+_PILLOW_FORMATS = {
+    'webp': 'WEBP',
+}
+
+
+def _encode_jpg(*, image: Image.Image, quality: Optional[int], report: _Report) -> BytesIO:
+    with report.stage('encode'):
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        output_data = BytesIO()
+        # 75 is LibreOffice's default quality, too.
+        image.save(
+            output_data,
+            format='JPEG',
+            quality=quality if quality is not None else 75,
+            **_JPEG_OPTIMIZE_OPTIONS if _setting('optimize_images', False) else {})
+        output_data.seek(0, SEEK_SET)
+        return output_data
+
+
+def _encode_png(*, image: Image.Image, compression: Optional[int], report: _Report) -> BytesIO:
+    with report.stage('encode'):
+        if _setting('optimize_images', False):
+            return _encode_png_optimized(image=image, compression=compression)
+
+        output_data = BytesIO()
+        # 6 is LibreOffice's default compression level, too.
+        image.save(output_data, format='PNG', compress_level=compression if compression is not None else 6)
+        output_data.seek(0, SEEK_SET)
+        return output_data
+
+
+def _encode_png_optimized(*, image: Image.Image, compression: Optional[int]) -> BytesIO:
+    # Slides and diagrams often use only a few colors, a palette makes them much smaller without any loss. Median
+    # cut quantization keeps the colors exactly when there are no more colors than palette entries.
+    if image.mode == 'RGB' and image.getcolors(256) is not None:
+        image = image.quantize(colors=len(image.getcolors(256)))
+    output_data = BytesIO()
+    if compression is None:
+        image.save(output_data, format='PNG', optimize=True)
+    else:
+        # optimize would override the requested compression level with the highest one
+        image.save(output_data, format='PNG', compress_level=compression)
+    output_data.seek(0, SEEK_SET)
+    return output_data
+
+
+def _optimize_image(*, data: BinaryIO, export_format_name: str, report: _Report,
+                    compression: Optional[int] = None) -> BinaryIO:
+    # Re-encodes an image exported by LibreOffice. The JPEG quantization tables are kept, so there is no
+    # noticeable generation loss. The original is kept if the result isn't smaller.
+    with report.stage('optimize'):
+        if not _setting('optimize_images', False):
+            return data
+
+        image = _load_image(data)
+        if export_format_name == 'jpg':
+            optimized_data = BytesIO()
+            image.save(optimized_data, format='JPEG', quality='keep', **_JPEG_OPTIMIZE_OPTIONS)
+            optimized_data.seek(0, SEEK_SET)
+        else:
+            optimized_data = _encode_png_optimized(image=image, compression=compression)
+
+        original_size = _data_size(data)
+        optimized_size = _data_size(optimized_data)
+        if optimized_size >= original_size:
+            return data
+        data.close()
+        report.add_bytes_saved(original_size - optimized_size)
+        return optimized_data
+
+
+def _check_pillow_format(export_format_name: str) -> None:
+    Image.init()
+    if _PILLOW_FORMATS[export_format_name] not in Image.SAVE:
+        raise ValueError(f'Export format {export_format_name} is not supported by this worker.')
+
+
+def _encode_pillow(*, image: Image.Image, export_format_name: str, quality: Optional[int],
+                   report: _Report) -> BytesIO:
+    with report.stage('encode'):
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+        output_data = BytesIO()
+        # Pillow's default quality for WebP
+        image.save(
+            output_data, format=_PILLOW_FORMATS[export_format_name], quality=quality if quality is not None else 80)
+        output_data.seek(0, SEEK_SET)
+        return output_data
+
+
+def _render_scaled_once(*, session: _Session, import_format: ImportFormat, dimensions: _Dimensions,
+                        page: Optional[int], report: _Report) -> Tuple[_Dimensions, Optional[Image.Image]]:
+    # Renders the document once at its natural size, losslessly and with minimal compression effort. When the
+    # scaled dimensions fit into this rendition the final image is produced by resampling it, otherwise the
+    # caller has to render the document a second time with the returned dimensions.
+    unoconv_args = _populate_args_for_image(
+        import_format=import_format, export_format_name='png', dimensions=_null_dimensions, page=page)
+    unoconv_args.extend(['-e', 'Compression=1'])
+
+    image = _load_image(session(unoconv_args))
+    dimensions = _fit_dimensions(dimensions=dimensions, height=image.height, width=image.width)
+
+    if (dimensions.logical_height is None and dimensions.logical_width is None and
+            dimensions.pixel_height <= image.height and dimensions.pixel_width <= image.width):
+        with report.stage('scale'):
+            return dimensions, image.resize((dimensions.pixel_width, dimensions.pixel_height), Image.LANCZOS)
+
+    return dimensions, None
+
+
+def _convert_to_jpg(*, session: _Session, import_format: ImportFormat, dimensions: _Dimensions, quality: int,
+                    page: Optional[int], report: _Report) -> BinaryIO:
 
     if dimensions.scale_height or dimensions.scale_width:
-        unoconv_args = _populate_args_for_image(
-            import_format=import_format, export_format_name='jpg', dimensions=_null_dimensions)
-        unoconv_args.extend(['-e', f'Quality=1'])
+        if _setting('single_render', False):
+            dimensions, image = _render_scaled_once(
+                session=session, import_format=import_format, dimensions=dimensions, page=page, report=report)
+            if image is not None:
+                return _encode_jpg(image=image, quality=quality, report=report)
+        else:
+            unoconv_args = _populate_args_for_image(
+                import_format=import_format, export_format_name='jpg', dimensions=_null_dimensions, page=page)
+            unoconv_args.extend(['-e', 'Quality=1'])
 
-        image = _call_unoconv(args=unoconv_args, data=data, timeout=timeout)
-        dimensions = _scale_dimensions(data=image, dimensions=dimensions)
+            image = session(unoconv_args)
+            dimensions = _scale_dimensions(data=image, dimensions=dimensions, report=report)
 
     unoconv_args = _populate_args_for_image(
-        import_format=import_format, export_format_name='jpg', dimensions=dimensions)
+        import_format=import_format, export_format_name='jpg', dimensions=dimensions, page=page)
     if quality is not None:
         unoconv_args.extend(['-e', f'Quality={quality}'])
 
-    data.seek(0, SEEK_SET)
-    return _call_unoconv(args=unoconv_args, data=data, timeout=timeout)
+    return _optimize_image(data=session(unoconv_args), export_format_name='jpg', report=report)
 
 
-def _convert_to_png(*, data: BinaryIO, import_format: _ImportFormat, dimensions: _Dimensions, compression: int,
-                    timeout: int) -> BytesIO:
+def _convert_to_png(*, session: _Session, import_format: ImportFormat, dimensions: _Dimensions, compression: int,
+                    page: Optional[int], report: _Report) -> BinaryIO:
 
     if dimensions.scale_height or dimensions.scale_width:
-        unoconv_args = _populate_args_for_image(
-            import_format=import_format, export_format_name='png', dimensions=_null_dimensions)
-        unoconv_args.extend(['-e', f'Compression=1'])
+        if _setting('single_render', False):
+            dimensions, image = _render_scaled_once(
+                session=session, import_format=import_format, dimensions=dimensions, page=page, report=report)
+            if image is not None:
+                return _encode_png(image=image, compression=compression, report=report)
+        else:
+            unoconv_args = _populate_args_for_image(
+                import_format=import_format, export_format_name='png', dimensions=_null_dimensions, page=page)
+            unoconv_args.extend(['-e', 'Compression=1'])
 
-        image_io = _call_unoconv(args=unoconv_args, data=data, timeout=timeout)
-        dimensions = _scale_dimensions(data=image_io, dimensions=dimensions)
+            image_io = session(unoconv_args)
+            dimensions = _scale_dimensions(data=image_io, dimensions=dimensions, report=report)
 
     unoconv_args = _populate_args_for_image(
-        import_format=import_format, export_format_name='png', dimensions=dimensions)
+        import_format=import_format, export_format_name='png', dimensions=dimensions, page=page)
     if compression is not None:
         unoconv_args.extend(['-e', f'Compression={compression}'])
 
-    data.seek(0, SEEK_SET)
-    return _call_unoconv(args=unoconv_args, data=data, timeout=timeout)
+    return _optimize_image(
+        data=session(unoconv_args), export_format_name='png', report=report, compression=compression)
 
 
-def _convert_to_pdf(*, data: BinaryIO, import_format: _ImportFormat, paper_format: str, paper_orientation: str,
-                    timeout: int) -> BytesIO:
+def _convert_to_pillow_format(*, session: _Session, import_format: ImportFormat, dimensions: _Dimensions,
+                              export_format_name: str, quality: int, page: Optional[int],
+                              report: _Report) -> BinaryIO:
+    _check_pillow_format(export_format_name)
+
+    if dimensions.scale_height or dimensions.scale_width:
+        if _setting('single_render', False):
+            dimensions, image = _render_scaled_once(
+                session=session, import_format=import_format, dimensions=dimensions, page=page, report=report)
+            if image is not None:
+                return _encode_pillow(
+                    image=image, export_format_name=export_format_name, quality=quality, report=report)
+        else:
+            unoconv_args = _populate_args_for_image(
+                import_format=import_format, export_format_name='png', dimensions=_null_dimensions, page=page)
+            unoconv_args.extend(['-e', 'Compression=1'])
+
+            image_io = session(unoconv_args)
+            dimensions = _scale_dimensions(data=image_io, dimensions=dimensions, report=report)
+
+    unoconv_args = _populate_args_for_image(
+        import_format=import_format, export_format_name='png', dimensions=dimensions, page=page)
+    unoconv_args.extend(['-e', 'Compression=1'])
+
+    image = _load_image(session(unoconv_args))
+    return _encode_pillow(image=image, export_format_name=export_format_name, quality=quality, report=report)
+
+
+def _convert_to_pdf(*, session: _Session, import_format: ImportFormat, paper_format: str,
+                    paper_orientation: str) -> BinaryIO:
     unoconv_args = ['--format', 'pdf']
     if import_format.document_type is not None:
         unoconv_args.extend(['--doctype', import_format.document_type])
@@ -275,36 +652,210 @@ def _convert_to_pdf(*, data: BinaryIO, import_format: _ImportFormat, paper_forma
     if paper_orientation is not None:
         unoconv_args.extend(['-P', f'PaperOrientation={paper_orientation}'])
 
-    return _call_unoconv(args=unoconv_args, data=data, timeout=timeout)
+    return session(unoconv_args)
+
+
+def _filesystem_pool() -> filesystems.FilesystemPool:
+    return filesystems.get_pool(
+        max_idle=_setting('fs_pool_max_idle', 8),
+        idle_timeout=_setting('fs_pool_idle_timeout', 300),
+        health_check_interval=_setting('fs_pool_health_check_interval', 60))
+
+
+@worker_process_shutdown.connect
+def _close_filesystem_pool(**_) -> None:
+    filesystems.close_pool()
+
+
+@contextmanager
+def _filesystem(fs_url: str) -> Iterator[FS]:
+    pool = _filesystem_pool()
+    try:
+        fs = pool.acquire(fs_url)
+    except Exception as exception:
+        raise RuntimeError(f'Opening filesystem failed with a {type(exception).__name__} exception: '
+                           f'{str(exception)}.') from None
+
+    discard = False
+    try:
+        yield fs
+    except Exception as exception:
+        # Missing files and invalid documents say nothing about the state of the connection
+        discard = not isinstance(exception, (FileNotFoundError, ValueError))
+        raise
+    finally:
+        pool.release(fs_url, fs, discard=discard)
+
+
+# Tasks with a single input document whose input is prefetched
+_PREFETCH_TASKS = {
+    'unoconv.tasks.generate_preview_jpg', 'unoconv.tasks.generate_preview_png', 'unoconv.tasks.generate_preview_webp',
+    'unoconv.tasks.generate_pdf', 'unoconv.tasks.generate_renditions', 'unoconv.tasks.generate_page_previews'
+}
+
+# Set in the main process before the pool processes are forked, so that they know it too
+_prefetch_dir: Optional[str] = None
+_prefetcher: Optional[prefetch.Prefetcher] = None
+
+
+@worker_init.connect
+def _start_prefetcher(**_) -> None:
+    global _prefetch_dir, _prefetcher
+
+    if _setting('prefetch_max_files', 0) < 1:
+        return
+    _prefetch_dir = os.path.join(tempfile.gettempdir(), f'unoconv-prefetch-{os.getpid()}')
+    _prefetcher = prefetch.Prefetcher(
+        directory=_prefetch_dir,
+        max_files=_setting('prefetch_max_files'),
+        max_bytes=_setting('prefetch_max_bytes', 256 * 1024**2),
+        max_size=_setting('max_input_size'),
+        ttl=_setting('prefetch_ttl', 600),
+        threads=_setting('prefetch_threads', 2),
+        fs_pool=_filesystem_pool())
+
+
+@worker_shutdown.connect
+def _stop_prefetcher(**_) -> None:
+    if _prefetcher is not None:
+        _prefetcher.close()
+
+
+@task_received.connect
+def _prefetch_input(request, **_) -> None:
+    if _prefetcher is None or request.name not in _PREFETCH_TASKS:
+        return
+    try:
+        kwargs = request.kwargs
+        if isinstance(kwargs.get('input_fs_url'), str) and isinstance(kwargs.get('input_file'), str):
+            _prefetcher.submit(task_id=request.id, fs_url=kwargs['input_fs_url'], file=kwargs['input_file'])
+    except Exception as exception:
+        logger.warning(f'Prefetching failed with a {type(exception).__name__} exception: {str(exception)}.')
+
+
+@task_postrun.connect
+def _discard_prefetched_input(task_id: str, kwargs: Dict[str, Any], **_) -> None:
+    # The input is left over if the task failed before reading it
+    if _prefetch_dir is not None and kwargs and 'input_fs_url' in kwargs and 'input_file' in kwargs:
+        prefetch.discard(
+            directory=_prefetch_dir, task_id=task_id, fs_url=kwargs['input_fs_url'], file=kwargs['input_file'])
+
+
+def _check_size(*, file: str, size: int) -> None:
+    max_input_size = _setting('max_input_size')
+    if max_input_size is not None and size > max_input_size:
+        raise ValueError(f'Input file {file} is too large ({size} bytes, the limit is {max_input_size} bytes).')
+
 
+def _check_input_size(*, fs: FS, file: str) -> None:
+    if _setting('max_input_size') is None:
+        return
 
-def _read_data(*, fs_url: str, file: str, mime_type: str, extension: str) -> Tuple[_ImportFormat, BytesIO]:
     try:
-        with open_fs(fs_url) as fs:
-            data = BytesIO(fs.readbytes(file))
+        size = fs.getinfo(file, namespaces=['details']).size
     except ResourceNotFound:
         raise FileNotFoundError(f'Input file {file} not found.')
     except Exception as exception:
         raise RuntimeError(f'Reading file failed with a {type(exception).__name__} exception: {str(exception)}.') from None
+    _check_size(file=file, size=size)
+
+
+def _read_data(*, fs: FS, file: str, mime_type: str, extension: str,
+               report: _Report) -> Tuple[ImportFormat, BinaryIO]:
+    # Checked before downloading anything
+    _check_input_size(fs=fs, file=file)
+
+    data = _spooled_file()
+    try:
+        with report.stage('read'):
+            fs.download(file, data)
+    except ResourceNotFound:
+        data.close()
+        raise FileNotFoundError(f'Input file {file} not found.')
+    except Exception as exception:
+        data.close()
+        raise RuntimeError(f'Reading file failed with a {type(exception).__name__} exception: {str(exception)}.') from None
+    metrics.input_bytes(data.tell())
+    data.seek(0, SEEK_SET)
+
+    return _identify_data(data=data, file=file, mime_type=mime_type, extension=extension, report=report)
+
+
+def _inspect_data(*, data: BinaryIO, report: _Report) -> None:
+    if not _setting('preflight', True):
+        return
+    try:
+        with report.stage('preflight'):
+            preflight.inspect(
+                data,
+                max_compression_ratio=_setting('preflight_max_compression_ratio', 100),
+                max_uncompressed_size=_setting('preflight_max_uncompressed_size', 1024**3))
+    except preflight.DocumentRejectedError as exception:
+        metrics.document_rejected(exception.reason)
+        raise
+
+
+def _identify_data(*, data: BinaryIO, file: str, mime_type: str, extension: str,
+                   report: _Report) -> Tuple[ImportFormat, BinaryIO]:
+    try:
+        # Encrypted documents would otherwise be reported as unsupported
+        _inspect_data(data=data, report=report)
+    except Exception:
+        data.close()
+        raise
 
     if extension is None:
         _, determined_extension = os.path.splitext(file)
     else:
         determined_extension = extension
 
-    import_format = _determine_import_format(mime_type, determined_extension)
+    try:
+        with report.stage('format'):
+            import_format = formats.determine_import_format(mime_type, determined_extension)
+            import_format = _sniff_import_format(data, import_format)
+    except Exception:
+        data.close()
+        raise
     if import_format is None:
+        data.close()
         raise ValueError('Unsupported input document type.')
+    metrics.set_import_format(
+        import_format=import_format.import_filter or import_format.extension.lstrip('.'),
+        document_type=import_format.document_type)
 
     return import_format, data
 
 
-def _write_data(*, fs_url: str, file: str, data: BinaryIO) -> None:
+def _read_input(*, fs_url: str, file: str, mime_type: str, extension: str,
+                report: _Report) -> Tuple[ImportFormat, BinaryIO]:
+    data = None
+    task_id = current_task.request.id if current_task else None
+    if _prefetch_dir is not None and task_id is not None:
+        with report.stage('read'):
+            data = prefetch.claim(
+                directory=_prefetch_dir, task_id=task_id, fs_url=fs_url, file=file, wait=_setting('prefetch_wait', 60))
+    if data is None:
+        with _filesystem(fs_url) as fs:
+            return _read_data(fs=fs, file=file, mime_type=mime_type, extension=extension, report=report)
+
+    try:
+        size = os.fstat(data.fileno()).st_size
+        _check_size(file=file, size=size)
+    except Exception:
+        data.close()
+        raise
+    metrics.input_bytes(size)
+    return _identify_data(data=data, file=file, mime_type=mime_type, extension=extension, report=report)
+
+
+def _write_data(*, fs: FS, file: str, data: BinaryIO, report: _Report) -> None:
     try:
-        with open_fs(fs_url) as fs:
-            fs.writebytes(file, data.read())
+        with report.stage('write'):
+            # Uploads are streamed, S3 uses multipart uploads for large files
+            fs.upload(file, data)
     except Exception as exception:
         raise RuntimeError(f'Writing file failed with a {type(exception).__name__} exception: {str(exception)}.') from None
+    metrics.output_bytes(data.tell())
 
 
 def _build_dimensions(*, pixel_height: Optional[int], pixel_width: Optional[int], logical_height: Optional[int],
@@ -335,6 +886,546 @@ def _build_dimensions(*, pixel_height: Optional[int], pixel_width: Optional[int]
         scale_width=scale_width)
 
 
+# Increment when the output of a conversion changes for the same parameters
+_CACHE_KEY_VERSION = 1
+
+
+def _conversion_cache() -> Optional[cache.ConversionCache]:
+    fs_url = _setting('cache_fs_url')
+    if fs_url is None:
+        return None
+
+    try:
+        return cache.get_cache(
+            fs_url=fs_url,
+            max_bytes=_setting('cache_max_bytes', 1024**3),
+            ttl=_setting('cache_ttl'))
+    except Exception as exception:
+        # The cache is an optimization, so conversions continue without it
+        logger.warning(f'Opening the conversion cache failed with a {type(exception).__name__} exception: {str(exception)}.')
+        return None
+
+
+_cache_evictor: Optional[cache.Evictor] = None
+
+
+@worker_init.connect
+def _start_cache_evictor(**_) -> None:
+    global _cache_evictor
+
+    # Only the main process evicts entries, the pool processes only read and store them
+    conversion_cache = _conversion_cache()
+    if conversion_cache is not None:
+        _cache_evictor = cache.Evictor(cache=conversion_cache, interval=_setting('cache_eviction_interval', 60))
+
+
+@worker_shutdown.connect
+def _stop_cache_evictor(**_) -> None:
+    if _cache_evictor is not None:
+        _cache_evictor.close()
+
+
+@inspect_command()
+def unoconv_cache_statistics(state) -> Dict[str, int]:
+    return cache.statistics()
+
+
+def _digest(data: BinaryIO) -> str:
+    data.seek(0, SEEK_SET)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: data.read(1024 * 1024), b''):
+        digest.update(chunk)
+    data.seek(0, SEEK_SET)
+    return digest.hexdigest()
+
+
+def _cache_key(*, input_digest: str, import_format: ImportFormat, rendition: _Rendition, pyramid: bool) -> str:
+    parameters = {
+        'version': _CACHE_KEY_VERSION,
+        'input': input_digest,
+        'import_format': import_format._asdict(),
+        'rendition': rendition._replace(output_file=None)._asdict(),
+        'single_render': bool(_setting('single_render', False)),
+        'first_page_only': bool(_setting('preview_first_page_only', False)),
+        'optimize_images': bool(_setting('optimize_images', False)),
+        'raster_fast_path': bool(_setting('raster_fast_path', True)),
+        'pyramid': pyramid,
+    }
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _check_quality(quality: Optional[int]) -> None:
+    if quality is not None and (quality < 1 or quality > 100):
+        raise ValueError('Quality must be in the range of 1 to 100 (inclusive).')
+
+
+def _check_compression(compression: Optional[int]) -> None:
+    if compression is not None and (compression < 1 or compression > 9):
+        raise ValueError('PNG compression must be in the range of 1 to 9 (inclusive).')
+
+
+def _check_page(page: Optional[int]) -> None:
+    if page is not None and (not isinstance(page, int) or page < 1):
+        raise ValueError('The page must be a positive integer.')
+
+
+_RENDITION_OPTIONS = {
+    'jpg': {'format', 'output_file', 'pixel_height', 'pixel_width', 'maintain_ratio', 'quality', 'page'},
+    'png': {'format', 'output_file', 'pixel_height', 'pixel_width', 'maintain_ratio', 'compression', 'page'},
+    'pdf': {'format', 'output_file', 'paper_format', 'paper_orientation'},
+    'webp': {'format', 'output_file', 'pixel_height', 'pixel_width', 'maintain_ratio', 'quality', 'page'},
+}
+
+
+def _build_rendition(specification: Dict[str, Any]) -> _Rendition:
+    export_format_name = specification.get('format')
+    if export_format_name not in _RENDITION_OPTIONS:
+        raise ValueError(f'Unsupported rendition format {export_format_name}.')
+    unknown_options = set(specification.keys()) - _RENDITION_OPTIONS[export_format_name]
+    if unknown_options:
+        raise ValueError(f'Unsupported options for {export_format_name} rendition: {", ".join(sorted(unknown_options))}.')
+    if not specification.get('output_file'):
+        raise ValueError('Each rendition needs an output file.')
+    if export_format_name in _PILLOW_FORMATS:
+        _check_pillow_format(export_format_name)
+
+    if export_format_name == 'pdf':
+        dimensions = _null_dimensions
+    else:
+        maintain_ratio = specification.get('maintain_ratio', False)
+        dimensions = _build_dimensions(
+            pixel_height=specification.get('pixel_height'),
+            pixel_width=specification.get('pixel_width'),
+            logical_height=None,
+            logical_width=None,
+            scale_height=maintain_ratio,
+            scale_width=maintain_ratio)
+    _check_quality(specification.get('quality'))
+    _check_compression(specification.get('compression'))
+    _check_page(specification.get('page'))
+
+    return _Rendition(
+        export_format_name=export_format_name,
+        output_file=specification['output_file'],
+        dimensions=dimensions,
+        quality=specification.get('quality'),
+        compression=specification.get('compression'),
+        paper_format=specification.get('paper_format'),
+        paper_orientation=specification.get('paper_orientation'),
+        page=specification.get('page'))
+
+
+def _build_pyramid(*, rendition: _Rendition, pyramid: List[Dict[str, Any]]) -> List[_Rendition]:
+    if rendition.dimensions.pixel_height is None or rendition.dimensions.pixel_width is None:
+        raise ValueError('A pyramid requires the pixel height and width to be set.')
+
+    renditions = [rendition]
+    for level in pyramid:
+        unknown_options = set(level.keys()) - {'output_file', 'pixel_height', 'pixel_width'}
+        if unknown_options:
+            raise ValueError(f'Unsupported options for pyramid level: {", ".join(sorted(unknown_options))}.')
+        if not level.get('output_file'):
+            raise ValueError('Each pyramid level needs an output file.')
+        if level.get('pixel_height') is None or level.get('pixel_width') is None:
+            raise ValueError('Each pyramid level needs a pixel height and width.')
+        dimensions = _build_dimensions(
+            pixel_height=level['pixel_height'],
+            pixel_width=level['pixel_width'],
+            logical_height=None,
+            logical_width=None,
+            scale_height=rendition.dimensions.scale_height,
+            scale_width=rendition.dimensions.scale_width)
+        renditions.append(rendition._replace(output_file=level['output_file'], dimensions=dimensions))
+    return renditions
+
+
+def _convert_rendition(*, session: _Session, import_format: ImportFormat, rendition: _Rendition,
+                       report: _Report) -> BinaryIO:
+    if rendition.export_format_name == 'jpg':
+        return _convert_to_jpg(
+            session=session,
+            import_format=import_format,
+            dimensions=rendition.dimensions,
+            quality=rendition.quality,
+            page=rendition.page,
+            report=report)
+    elif rendition.export_format_name == 'png':
+        return _convert_to_png(
+            session=session,
+            import_format=import_format,
+            dimensions=rendition.dimensions,
+            compression=rendition.compression,
+            page=rendition.page,
+            report=report)
+    elif rendition.export_format_name in _PILLOW_FORMATS:
+        return _convert_to_pillow_format(
+            session=session,
+            import_format=import_format,
+            dimensions=rendition.dimensions,
+            export_format_name=rendition.export_format_name,
+            quality=rendition.quality,
+            page=rendition.page,
+            report=report)
+    elif rendition.export_format_name == 'pdf':
+        return _convert_to_pdf(
+            session=session,
+            import_format=import_format,
+            paper_format=rendition.paper_format,
+            paper_orientation=rendition.paper_orientation)
+    else:
+        raise NotImplementedError
+
+
+def _resample(*, image: Image.Image, width: int, height: int, report: _Report) -> Image.Image:
+    with report.stage('scale'):
+        if (width, height) == image.size:
+            return image
+        # Reduce large factors with a cheap box filter first, LANCZOS on the full image gets expensive and the
+        # result is indistinguishable.
+        factor = min(image.width // (2 * width), image.height // (2 * height))
+        if factor >= 2:
+            image = image.resize((image.width // factor, image.height // factor), Image.BOX)
+        return image.resize((width, height), Image.LANCZOS)
+
+
+def _convert_pyramid(*, session: _Session, import_format: ImportFormat, renditions: List[_Rendition],
+                     report: _Report) -> List[BinaryIO]:
+    # All renditions share the export format, maintain_ratio and the page. The document is rendered losslessly once at the
+    # largest size and all renditions are resampled from that image.
+    scale = renditions[0].dimensions.scale_height or renditions[0].dimensions.scale_width
+    image = None
+    if scale:
+        # The aspect ratio of the document is needed to know the largest size
+        unoconv_args = _populate_args_for_image(
+            import_format=import_format, export_format_name='png', dimensions=_null_dimensions, page=renditions[0].page)
+        unoconv_args.extend(['-e', 'Compression=1'])
+        image = _load_image(session(unoconv_args))
+        sizes = []
+        for rendition in renditions:
+            dimensions = _fit_dimensions(dimensions=rendition.dimensions, height=image.height, width=image.width)
+            sizes.append((dimensions.pixel_width, dimensions.pixel_height))
+    else:
+        sizes = [(rendition.dimensions.pixel_width, rendition.dimensions.pixel_height) for rendition in renditions]
+
+    source_width = max(width for width, _ in sizes)
+    source_height = max(height for _, height in sizes)
+    if image is None or source_width > image.width or source_height > image.height:
+        source_dimensions = _null_dimensions._replace(pixel_height=source_height, pixel_width=source_width)
+        unoconv_args = _populate_args_for_image(
+            import_format=import_format,
+            export_format_name='png',
+            dimensions=source_dimensions,
+            page=renditions[0].page)
+        unoconv_args.extend(['-e', 'Compression=1'])
+        image = _load_image(session(unoconv_args))
+
+    return [
+        _encode_rendition(
+            image=_resample(image=image, width=width, height=height, report=report), rendition=rendition, report=report)
+        for rendition, (width, height) in zip(renditions, sizes)
+    ]
+
+
+def _encode_rendition(*, image: Image.Image, rendition: _Rendition, report: _Report) -> BytesIO:
+    if rendition.export_format_name == 'jpg':
+        return _encode_jpg(image=image, quality=rendition.quality, report=report)
+    elif rendition.export_format_name == 'png':
+        return _encode_png(image=image, compression=rendition.compression, report=report)
+    elif rendition.export_format_name in _PILLOW_FORMATS:
+        return _encode_pillow(
+            image=image, export_format_name=rendition.export_format_name, quality=rendition.quality, report=report)
+    else:
+        raise NotImplementedError
+
+
+def _raster_fast_path(*, import_format: ImportFormat, rendition: _Rendition) -> bool:
+    return (import_format.import_filter in formats.RASTER_IMPORT_FILTERS and rendition.export_format_name != 'pdf' and
+            _setting('raster_fast_path', True))
+
+
+def _load_raster(*, data: BinaryIO, page: Optional[int], report: _Report) -> Image.Image:
+    with report.stage('load'):
+        data.seek(0, SEEK_SET)
+        image = Image.open(data)
+        if page is not None:
+            try:
+                # Pages of multi-page TIFF images
+                image.seek(page - 1)
+            except EOFError:
+                raise RuntimeError(f'The image has no page {page}.') from None
+        image.load()
+        # Resampling and all encoders support these modes
+        if image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+        elif image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+    return image
+
+
+def _convert_raster(*, data: BinaryIO, renditions: List[_Rendition], report: _Report) -> List[BinaryIO]:
+    # Raster images are decoded with Pillow instead of letting LibreOffice Draw render a page containing the image.
+    # The natural size of the image corresponds to the page size of the document. Renditions of different pages
+    # are possible with generate_renditions.
+    data.seek(0, SEEK_SET)
+    with Image.open(data) as image:
+        report.page_count = getattr(image, 'n_frames', 1)
+
+    images: Dict[Optional[int], Image.Image] = {}
+    output_data = []
+    for rendition in renditions:
+        if rendition.page not in images:
+            images[rendition.page] = _load_raster(data=data, page=rendition.page, report=report)
+        image = images[rendition.page]
+
+        dimensions = rendition.dimensions
+        if dimensions.scale_height or dimensions.scale_width:
+            dimensions = _fit_dimensions(dimensions=dimensions, height=image.height, width=image.width)
+        width = dimensions.pixel_width or image.width
+        height = dimensions.pixel_height or image.height
+        output_data.append(
+            _encode_rendition(
+                image=_resample(image=image, width=width, height=height, report=report),
+                rendition=rendition,
+                report=report))
+    return output_data
+
+
+# Previews stored by LibreOffice (ODF) and Microsoft Office (OOXML), the first one found is used
+_EMBEDDED_THUMBNAILS = ['Thumbnails/thumbnail.png', 'docProps/thumbnail.jpeg', 'docProps/thumbnail.jpg']
+_EMBEDDED_THUMBNAIL_MAX_SIZE = 16 * 1024 * 1024
+
+
+def _load_embedded_thumbnail(*, data: BinaryIO, report: _Report) -> Optional[Image.Image]:
+    try:
+        data.seek(0, SEEK_SET)
+        with zipfile.ZipFile(data) as archive:
+            names = set(archive.namelist())
+            for name in _EMBEDDED_THUMBNAILS:
+                if name in names and archive.getinfo(name).file_size <= _EMBEDDED_THUMBNAIL_MAX_SIZE:
+                    return _load_raster(data=BytesIO(archive.read(name)), page=None, report=report)
+    except Exception as exception:
+        logger.info(f'Reading the embedded thumbnail failed with a {type(exception).__name__} exception: '
+                    f'{str(exception)}.')
+    finally:
+        data.seek(0, SEEK_SET)
+    return None
+
+
+# Document statistics stored by LibreOffice (ODF) and Microsoft Office (OOXML)
+_METADATA_PAGE_COUNTS = [
+    ('meta.xml', re.compile(rb'meta:page-count="(\d+)"')),
+    ('docProps/app.xml', re.compile(rb'<(?:\w+:)?(?:Pages|Slides)>(\d+)<')),
+]
+_METADATA_MAX_SIZE = 1024 * 1024
+
+
+def _record_metadata_page_count(*, data: BinaryIO, import_format: ImportFormat, report: _Report) -> None:
+    # Falls back to the statistics saved with the document when the conversion didn't determine the page count,
+    # for example with the unoconv backend. They may be outdated if the document was edited by other software.
+    if report.page_count is not None or sniffer.container(import_format.extension) != 'zip':
+        return
+    try:
+        data.seek(0, SEEK_SET)
+        with zipfile.ZipFile(data) as archive:
+            names = set(archive.namelist())
+            for name, pattern in _METADATA_PAGE_COUNTS:
+                if name in names and archive.getinfo(name).file_size <= _METADATA_MAX_SIZE:
+                    match = pattern.search(archive.read(name))
+                    if match is not None:
+                        report.page_count = int(match.group(1))
+                        return
+    except Exception as exception:
+        logger.info(f'Reading the document statistics failed with a {type(exception).__name__} exception: '
+                    f'{str(exception)}.')
+    finally:
+        data.seek(0, SEEK_SET)
+
+
+def _convert_embedded_thumbnail(*, data: BinaryIO, import_format: ImportFormat, renditions: List[_Rendition],
+                                report: _Report) -> Optional[List[BinaryIO]]:
+    # Returns None when the thumbnail can't be used for all renditions. Thumbnails are never enlarged, so
+    # renditions need explicit dimensions to compare against.
+    if sniffer.container(import_format.extension) != 'zip':
+        return None
+    if any(rendition.page not in (None, 1) or rendition.dimensions.pixel_height is None or
+           rendition.dimensions.pixel_width is None for rendition in renditions):
+        return None
+
+    image = _load_embedded_thumbnail(data=data, report=report)
+    if image is None:
+        return None
+
+    sizes = []
+    for rendition in renditions:
+        dimensions = rendition.dimensions
+        if dimensions.scale_height or dimensions.scale_width:
+            dimensions = _fit_dimensions(dimensions=dimensions, height=image.height, width=image.width)
+        if dimensions.pixel_width > image.width or dimensions.pixel_height > image.height:
+            logger.debug(f'Embedded thumbnail of {image.width}x{image.height} pixels is too small.')
+            return None
+        sizes.append((dimensions.pixel_width, dimensions.pixel_height))
+
+    return [
+        _encode_rendition(
+            image=_resample(image=image, width=width, height=height, report=report), rendition=rendition, report=report)
+        for rendition, (width, height) in zip(renditions, sizes)
+    ]
+
+
+def _convert_previews(*, data: BinaryIO, import_format: ImportFormat, renditions: List[_Rendition], timeout: int,
+                      report: _Report, pyramid: bool, embedded_thumbnail: bool) -> Tuple[List[BinaryIO], List[str]]:
+    if embedded_thumbnail:
+        output_data = _convert_embedded_thumbnail(
+            data=data, import_format=import_format, renditions=renditions, report=report)
+        if output_data is not None:
+            _record_metadata_page_count(data=data, import_format=import_format, report=report)
+            return output_data, [SOURCE_EMBEDDED_THUMBNAIL] * len(output_data)
+    return _convert_renditions(
+        data=data, import_format=import_format, renditions=renditions, timeout=timeout, report=report, pyramid=pyramid)
+
+
+def _convert_renditions(*,
+                        data: BinaryIO,
+                        import_format: ImportFormat,
+                        renditions: List[_Rendition],
+                        timeout: int,
+                        report: _Report,
+                        pyramid: bool = False) -> Tuple[List[BinaryIO], List[str]]:
+    # Also returns where each output came from
+    conversion_cache = _conversion_cache()
+
+    output_data: List[Optional[BinaryIO]] = [None] * len(renditions)
+    sources = [SOURCE_CONVERSION] * len(renditions)
+    cache_keys = []
+    if conversion_cache is not None:
+        input_digest = _digest(data)
+        cache_keys = [
+            _cache_key(input_digest=input_digest, import_format=import_format, rendition=rendition, pyramid=pyramid)
+            for rendition in renditions
+        ]
+        output_data = [conversion_cache.get(cache_key, _spooled_file) for cache_key in cache_keys]
+        sources = [SOURCE_CONVERSION if rendition_data is None else SOURCE_CACHE for rendition_data in output_data]
+
+    missing = [index for index, rendition_data in enumerate(output_data) if rendition_data is None]
+    raster = [index for index in missing if _raster_fast_path(import_format=import_format, rendition=renditions[index])]
+    if raster:
+        try:
+            raster_data = _convert_raster(
+                data=data, renditions=[renditions[index] for index in raster], report=report)
+            for index, rendition_data in zip(raster, raster_data):
+                output_data[index] = rendition_data
+                sources[index] = SOURCE_RASTER
+            missing = [index for index in missing if index not in raster]
+        except Exception as exception:
+            # Pillow doesn't support all variants of these formats, LibreOffice might
+            logger.info(f'Converting the image with Pillow failed with a {type(exception).__name__} exception: '
+                        f'{str(exception)}, falling back to LibreOffice.')
+
+    if missing:
+        with _conversion_session(data=data, import_format=import_format, timeout=timeout, report=report) as session:
+            if pyramid:
+                pyramid_data = _convert_pyramid(
+                    session=session,
+                    import_format=import_format,
+                    renditions=[renditions[index] for index in missing],
+                    report=report)
+                for index, rendition_data in zip(missing, pyramid_data):
+                    output_data[index] = rendition_data
+            else:
+                for index in missing:
+                    output_data[index] = _convert_rendition(
+                        session=session, import_format=import_format, rendition=renditions[index], report=report)
+
+    if conversion_cache is not None:
+        for index, rendition_data in enumerate(output_data):
+            if index in raster or index in missing:
+                conversion_cache.put(cache_keys[index], rendition_data)
+
+    if any(rendition.export_format_name != 'pdf' for rendition in renditions):
+        _record_metadata_page_count(data=data, import_format=import_format, report=report)
+    return output_data, sources
+
+
+def _data_size(data: BinaryIO) -> int:
+    size = data.seek(0, SEEK_END)
+    data.seek(0, SEEK_SET)
+    return size
+
+
+def _pdf_page_count(*, data: BinaryIO, timeout: int) -> Optional[int]:
+    try:
+        file_descriptor = _file_descriptor(data)
+        if file_descriptor is not None:
+            # Also works for files which have already been unlinked
+            return pages.page_count(pdf_path=f'/proc/{os.getpid()}/fd/{file_descriptor}', timeout=timeout)
+        with tempfile.NamedTemporaryFile(prefix='unoconv-', suffix='.pdf') as pdf_file:
+            data.seek(0, SEEK_SET)
+            shutil.copyfileobj(data, pdf_file)
+            pdf_file.flush()
+            return pages.page_count(pdf_path=pdf_file.name, timeout=timeout)
+    except Exception as exception:
+        # The page count is informational only
+        logger.info(f'Determining the page count failed with a {type(exception).__name__} exception: {str(exception)}.')
+        return None
+    finally:
+        data.seek(0, SEEK_SET)
+
+
+def _describe_output(*, rendition: _Rendition, data: BinaryIO, source: str, timeout: int,
+                     report: _Report) -> Dict[str, Any]:
+    description = {
+        'output_file': rendition.output_file,
+        'source': source,
+        'format': rendition.export_format_name,
+        'size': _data_size(data),
+        'sha256': _digest(data),
+        'pixel_width': None,
+        'pixel_height': None,
+        'page_count': None,
+    }
+    if rendition.export_format_name in ('jpg', 'png') or rendition.export_format_name in _PILLOW_FORMATS:
+        # Only the header is read
+        description['pixel_width'], description['pixel_height'] = Image.open(data).size
+        data.seek(0, SEEK_SET)
+        # Pages of the input document, previews usually show only one of them
+        description['page_count'] = report.page_count
+    elif rendition.export_format_name == 'pdf':
+        description['page_count'] = _pdf_page_count(data=data, timeout=timeout)
+    return description
+
+
+def _write_outputs(*, output_fs_url: str, renditions: List[_Rendition], output_data: List[BinaryIO],
+                   sources: List[str], timeout: int, report: _Report) -> List[Dict[str, Any]]:
+    outputs = []
+    with _filesystem(output_fs_url) as output_fs:
+        for rendition, rendition_data, source in zip(renditions, output_data, sources):
+            outputs.append(
+                _describe_output(
+                    rendition=rendition, data=rendition_data, source=source, timeout=timeout, report=report))
+            _write_data(fs=output_fs, file=rendition.output_file, data=rendition_data, report=report)
+    return outputs
+
+
+def _task_result(*,
+                 input_file: str,
+                 import_format: ImportFormat,
+                 input_size: int,
+                 outputs: List[Dict[str, Any]],
+                 report: _Report) -> Dict[str, Any]:
+    sources = {output['source'] for output in outputs}
+    return {
+        'input_file': input_file,
+        'source': sources.pop() if len(sources) == 1 else SOURCE_MIXED,
+        'import_format': import_format.import_filter or import_format.extension.lstrip('.'),
+        'mime_type': import_format.mime_type,
+        'document_type': import_format.document_type,
+        'input_size': input_size,
+        'outputs': outputs,
+        'bytes_saved': report.bytes_saved,
+        'durations': dict(report.durations),
+    }
+
+
 @app.task
 def generate_preview_jpg(*,
                          input_fs_url: str,
@@ -347,7 +1438,10 @@ def generate_preview_jpg(*,
                          pixel_width: int = None,
                          maintain_ratio: bool = False,
                          quality: int = None,
-                         timeout: int = UNOCONV_DEFAULT_TIMEOUT):
+                         pyramid: List[Dict[str, Any]] = None,
+                         page: int = None,
+                         embedded_thumbnail: bool = False,
+                         timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
     dimensions = _build_dimensions(
         pixel_height=pixel_height,
         pixel_width=pixel_width,
@@ -355,13 +1449,41 @@ def generate_preview_jpg(*,
         logical_width=None,
         scale_height=maintain_ratio,
         scale_width=maintain_ratio)
-    if quality is not None and (quality < 1 or quality > 100):
-        raise ValueError('JPEG quality must be in the range of 1 to 100 (inclusive).')
+    _check_quality(quality)
+    _check_page(page)
+    rendition = _Rendition(
+        export_format_name='jpg',
+        output_file=output_file,
+        dimensions=dimensions,
+        quality=quality,
+        compression=None,
+        paper_format=None,
+        paper_orientation=None,
+        page=page)
 
-    import_format, data = _read_data(fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension)
-    output_data = _convert_to_jpg(
-        data=data, import_format=import_format, dimensions=dimensions, quality=quality, timeout=timeout)
-    _write_data(fs_url=output_fs_url, file=output_file, data=output_data)
+    renditions = [rendition] if pyramid is None else _build_pyramid(rendition=rendition, pyramid=pyramid)
+
+    report = _Report()
+    import_format, data = _read_input(
+        fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension, report=report)
+    input_size = _data_size(data)
+    output_data, sources = _convert_previews(
+        data=data,
+        import_format=import_format,
+        renditions=renditions,
+        timeout=timeout,
+        report=report,
+        pyramid=pyramid is not None,
+        embedded_thumbnail=embedded_thumbnail)
+    outputs = _write_outputs(
+        output_fs_url=output_fs_url,
+        renditions=renditions,
+        output_data=output_data,
+        sources=sources,
+        timeout=timeout,
+        report=report)
+    return _task_result(
+        input_file=input_file, import_format=import_format, input_size=input_size, outputs=outputs, report=report)
 
 
 @app.task
@@ -376,7 +1498,10 @@ def generate_preview_png(*,
                          pixel_width: int = None,
                          maintain_ratio: bool = False,
                          compression: int = None,
-                         timeout: int = UNOCONV_DEFAULT_TIMEOUT):
+                         pyramid: List[Dict[str, Any]] = None,
+                         page: int = None,
+                         embedded_thumbnail: bool = False,
+                         timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
     dimensions = _build_dimensions(
         pixel_height=pixel_height,
         pixel_width=pixel_width,
@@ -384,13 +1509,122 @@ def generate_preview_png(*,
         logical_width=None,
         scale_height=maintain_ratio,
         scale_width=maintain_ratio)
-    if compression is not None and (compression < 1 or compression > 9):
-        raise ValueError('PNG compression must be in the range of 1 to 9 (inclusive).')
+    _check_compression(compression)
+    _check_page(page)
+    rendition = _Rendition(
+        export_format_name='png',
+        output_file=output_file,
+        dimensions=dimensions,
+        quality=None,
+        compression=compression,
+        paper_format=None,
+        paper_orientation=None,
+        page=page)
 
-    import_format, data = _read_data(fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension)
-    output_data = _convert_to_png(
-        data=data, import_format=import_format, dimensions=dimensions, compression=compression, timeout=timeout)
-    _write_data(fs_url=output_fs_url, file=output_file, data=output_data)
+    renditions = [rendition] if pyramid is None else _build_pyramid(rendition=rendition, pyramid=pyramid)
+
+    report = _Report()
+    import_format, data = _read_input(
+        fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension, report=report)
+    input_size = _data_size(data)
+    output_data, sources = _convert_previews(
+        data=data,
+        import_format=import_format,
+        renditions=renditions,
+        timeout=timeout,
+        report=report,
+        pyramid=pyramid is not None,
+        embedded_thumbnail=embedded_thumbnail)
+    outputs = _write_outputs(
+        output_fs_url=output_fs_url,
+        renditions=renditions,
+        output_data=output_data,
+        sources=sources,
+        timeout=timeout,
+        report=report)
+    return _task_result(
+        input_file=input_file, import_format=import_format, input_size=input_size, outputs=outputs, report=report)
+
+
+def _generate_preview_pillow(*, export_format_name: str, input_fs_url: str, input_file: str, output_fs_url: str,
+                             output_file: str, mime_type: Optional[str], extension: Optional[str],
+                             pixel_height: Optional[int], pixel_width: Optional[int], maintain_ratio: bool,
+                             quality: Optional[int], pyramid: Optional[List[Dict[str, Any]]], page: Optional[int],
+                             timeout: int) -> Dict[str, Any]:
+    _check_pillow_format(export_format_name)
+    dimensions = _build_dimensions(
+        pixel_height=pixel_height,
+        pixel_width=pixel_width,
+        logical_height=None,
+        logical_width=None,
+        scale_height=maintain_ratio,
+        scale_width=maintain_ratio)
+    _check_quality(quality)
+    _check_page(page)
+    rendition = _Rendition(
+        export_format_name=export_format_name,
+        output_file=output_file,
+        dimensions=dimensions,
+        quality=quality,
+        compression=None,
+        paper_format=None,
+        paper_orientation=None,
+        page=page)
+
+    renditions = [rendition] if pyramid is None else _build_pyramid(rendition=rendition, pyramid=pyramid)
+
+    report = _Report()
+    import_format, data = _read_input(
+        fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension, report=report)
+    input_size = _data_size(data)
+    output_data, sources = _convert_renditions(
+        data=data,
+        import_format=import_format,
+        renditions=renditions,
+        timeout=timeout,
+        report=report,
+        pyramid=pyramid is not None)
+    outputs = _write_outputs(
+        output_fs_url=output_fs_url,
+        renditions=renditions,
+        output_data=output_data,
+        sources=sources,
+        timeout=timeout,
+        report=report)
+    return _task_result(
+        input_file=input_file, import_format=import_format, input_size=input_size, outputs=outputs, report=report)
+
+
+@app.task
+def generate_preview_webp(*,
+                          input_fs_url: str,
+                          input_file: str,
+                          output_fs_url: str,
+                          output_file: str,
+                          mime_type: str = None,
+                          extension: str = None,
+                          pixel_height: int = None,
+                          pixel_width: int = None,
+                          maintain_ratio: bool = False,
+                          quality: int = None,
+                          pyramid: List[Dict[str, Any]] = None,
+                          page: int = None,
+                          timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    return _generate_preview_pillow(
+        export_format_name='webp',
+        input_fs_url=input_fs_url,
+        input_file=input_file,
+        output_fs_url=output_fs_url,
+        output_file=output_file,
+        mime_type=mime_type,
+        extension=extension,
+        pixel_height=pixel_height,
+        pixel_width=pixel_width,
+        maintain_ratio=maintain_ratio,
+        quality=quality,
+        pyramid=pyramid,
+        page=page,
+        timeout=timeout)
 
 
 @app.task
@@ -403,12 +1637,528 @@ def generate_pdf(*,
                  extension: str = None,
                  paper_format: str = None,
                  paper_orientation: str = None,
-                 timeout: int = UNOCONV_DEFAULT_TIMEOUT):
-    import_format, data = _read_data(fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension)
-    output_data = _convert_to_pdf(
-        data=data,
-        import_format=import_format,
+                 timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    rendition = _Rendition(
+        export_format_name='pdf',
+        output_file=output_file,
+        dimensions=_null_dimensions,
+        quality=None,
+        compression=None,
         paper_format=paper_format,
         paper_orientation=paper_orientation,
+        page=None)
+
+    report = _Report()
+    import_format, data = _read_input(
+        fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension, report=report)
+    input_size = _data_size(data)
+    output_data, sources = _convert_renditions(
+        data=data, import_format=import_format, renditions=[rendition], timeout=timeout, report=report)
+    outputs = _write_outputs(
+        output_fs_url=output_fs_url,
+        renditions=[rendition],
+        output_data=output_data,
+        sources=sources,
+        timeout=timeout,
+        report=report)
+    return _task_result(
+        input_file=input_file, import_format=import_format, input_size=input_size, outputs=outputs, report=report)
+
+
+@app.task
+def generate_renditions(*,
+                        input_fs_url: str,
+                        input_file: str,
+                        output_fs_url: str,
+                        renditions: List[Dict[str, Any]],
+                        mime_type: str = None,
+                        extension: str = None,
+                        timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    if not renditions:
+        raise ValueError('At least one rendition must be specified.')
+    parsed_renditions = [_build_rendition(specification) for specification in renditions]
+
+    report = _Report()
+    import_format, data = _read_input(
+        fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension, report=report)
+    input_size = _data_size(data)
+    output_data, sources = _convert_renditions(
+        data=data, import_format=import_format, renditions=parsed_renditions, timeout=timeout, report=report)
+    outputs = _write_outputs(
+        output_fs_url=output_fs_url,
+        renditions=parsed_renditions,
+        output_data=output_data,
+        sources=sources,
+        timeout=timeout,
+        report=report)
+    return _task_result(
+        input_file=input_file, import_format=import_format, input_size=input_size, outputs=outputs, report=report)
+
+
+DEFAULT_INLINE_MAX_SIZE = 1024 * 1024
+
+
+def _convert_inline(*, export_format_name: str, data: ByteString, input_file: Optional[str], mime_type: Optional[str],
+                    extension: Optional[str], options: Dict[str, Any], output_fs_url: Optional[str],
+                    output_file: Optional[str], timeout: int) -> Dict[str, Any]:
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise ValueError('The document must be supplied as bytes, this requires a binary serializer like msgpack.')
+    if (output_fs_url is None) != (output_file is None):
+        raise ValueError('Both output filesystem URL and output file must be set or unset.')
+    # Keeps large documents and results out of the broker and the result backend
+    max_size = _setting('inline_max_size', DEFAULT_INLINE_MAX_SIZE)
+    if len(data) > max_size:
+        raise ValueError(f'Document is too large to be passed inline ({len(data)} bytes, the limit is {max_size} bytes).')
+    _check_size(file=input_file or 'inline document', size=len(data))
+
+    rendition = _build_rendition({
+        'format': export_format_name,
+        'output_file': output_file or f'inline.{export_format_name}',
+        **{name: value for name, value in options.items() if value is not None}
+    })
+
+    metrics.input_bytes(len(data))
+    report = _Report()
+    import_format, input_data = _identify_data(
+        data=BytesIO(data), file=input_file or '', mime_type=mime_type, extension=extension, report=report)
+    [output_data], [source] = _convert_renditions(
+        data=input_data, import_format=import_format, renditions=[rendition], timeout=timeout, report=report)
+
+    output = _describe_output(rendition=rendition, data=output_data, source=source, timeout=timeout, report=report)
+    if output['size'] <= max_size:
+        output['output_file'] = None
+        output['data'] = output_data.read()
+        metrics.output_bytes(output['size'])
+    elif output_file is not None:
+        with _filesystem(output_fs_url) as output_fs:
+            _write_data(fs=output_fs, file=output_file, data=output_data, report=report)
+        output['data'] = None
+    else:
+        raise ValueError(f'Result is too large to be returned inline ({output["size"]} bytes, the limit is {max_size} '
+                         'bytes).')
+    return _task_result(
+        input_file=input_file, import_format=import_format, input_size=len(data), outputs=[output], report=report)
+
+
+@app.task
+def generate_preview_jpg_inline(*,
+                                data: bytes,
+                                input_file: str = None,
+                                mime_type: str = None,
+                                extension: str = None,
+                                pixel_height: int = None,
+                                pixel_width: int = None,
+                                maintain_ratio: bool = False,
+                                quality: int = None,
+                                page: int = None,
+                                output_fs_url: str = None,
+                                output_file: str = None,
+                                timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    return _convert_inline(
+        export_format_name='jpg',
+        data=data,
+        input_file=input_file,
+        mime_type=mime_type,
+        extension=extension,
+        options={
+            'pixel_height': pixel_height,
+            'pixel_width': pixel_width,
+            'maintain_ratio': maintain_ratio,
+            'quality': quality,
+            'page': page,
+        },
+        output_fs_url=output_fs_url,
+        output_file=output_file,
+        timeout=timeout)
+
+
+@app.task
+def generate_preview_png_inline(*,
+                                data: bytes,
+                                input_file: str = None,
+                                mime_type: str = None,
+                                extension: str = None,
+                                pixel_height: int = None,
+                                pixel_width: int = None,
+                                maintain_ratio: bool = False,
+                                compression: int = None,
+                                page: int = None,
+                                output_fs_url: str = None,
+                                output_file: str = None,
+                                timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    return _convert_inline(
+        export_format_name='png',
+        data=data,
+        input_file=input_file,
+        mime_type=mime_type,
+        extension=extension,
+        options={
+            'pixel_height': pixel_height,
+            'pixel_width': pixel_width,
+            'maintain_ratio': maintain_ratio,
+            'compression': compression,
+            'page': page,
+        },
+        output_fs_url=output_fs_url,
+        output_file=output_file,
         timeout=timeout)
-    _write_data(fs_url=output_fs_url, file=output_file, data=output_data)
+
+
+@app.task
+def generate_pdf_inline(*,
+                        data: bytes,
+                        input_file: str = None,
+                        mime_type: str = None,
+                        extension: str = None,
+                        paper_format: str = None,
+                        paper_orientation: str = None,
+                        output_fs_url: str = None,
+                        output_file: str = None,
+                        timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    return _convert_inline(
+        export_format_name='pdf',
+        data=data,
+        input_file=input_file,
+        mime_type=mime_type,
+        extension=extension,
+        options={
+            'paper_format': paper_format,
+            'paper_orientation': paper_orientation
+        },
+        output_fs_url=output_fs_url,
+        output_file=output_file,
+        timeout=timeout)
+
+
+_BATCH_ITEM_OPTIONS = {'input_file', 'mime_type', 'extension'}
+
+
+def _read_batch_item(*, input_fs: FS, export_format_name: str, item: Dict[str, Any],
+                     report: _Report) -> Tuple[_Rendition, ImportFormat, BinaryIO]:
+    if not item.get('input_file'):
+        raise ValueError('Each batch item needs an input file.')
+    rendition = _build_rendition({
+        'format': export_format_name,
+        **{name: value for name, value in item.items() if name not in _BATCH_ITEM_OPTIONS}
+    })
+
+    import_format, data = _read_data(
+        fs=input_fs,
+        file=item['input_file'],
+        mime_type=item.get('mime_type'),
+        extension=item.get('extension'),
+        report=report)
+    return rendition, import_format, data
+
+
+def _write_batch_item(*, output_fs: FS, rendition: _Rendition, data: BinaryIO, report: _Report) -> None:
+    try:
+        _write_data(fs=output_fs, file=rendition.output_file, data=data, report=report)
+    finally:
+        data.close()
+
+
+def _finish_batch_item(*, result: Dict[str, Any], start: float, exception: Optional[Exception]) -> None:
+    if exception is not None:
+        result['error'] = f'{type(exception).__name__}: {str(exception)}'
+        logger.warning(f'Converting batch item {result["input_file"]} failed with {result["error"]}.')
+    result['status'] = 'success' if exception is None else 'failure'
+    result['duration'] = time.monotonic() - start
+
+
+def _convert_batch(*, input_fs_url: str, output_fs_url: str, export_format_name: str, items: List[Dict[str, Any]],
+                   timeout: int) -> List[Dict[str, Any]]:
+    if not items:
+        raise ValueError('At least one batch item must be specified.')
+    if not all(isinstance(item, dict) for item in items):
+        raise ValueError('Each batch item must be a dictionary.')
+
+    results = [{
+        'input_file': item.get('input_file'),
+        'output_file': item.get('output_file'),
+        'status': None,
+        'error': None,
+        'duration': None,
+    } for item in items]
+    # The reader and writer threads work on other items than the conversion
+    reports = [_Report() for _ in items]
+
+    # Failures of single items are reported in the result, only problems affecting the whole batch raise. While an
+    # item is converted the input of the next item is downloaded and the output of the previous one is uploaded. Each
+    # filesystem is only used by one thread. The task finishes only after all uploads have completed.
+    with _filesystem(input_fs_url) as input_fs, _filesystem(output_fs_url) as output_fs, \
+            ThreadPoolExecutor(max_workers=1) as reader, ThreadPoolExecutor(max_workers=1) as writer:
+
+        def read(index: int) -> Future:
+            return reader.submit(
+                _read_batch_item,
+                input_fs=input_fs,
+                export_format_name=export_format_name,
+                item=items[index],
+                report=reports[index])
+
+        def finish_write(pending: Tuple[Dict[str, Any], float, Future]) -> None:
+            result, start, write = pending
+            # Waits for the upload
+            _finish_batch_item(result=result, start=start, exception=write.exception())
+
+        next_read = read(0)
+        pending_write = None
+        for index, result in enumerate(results):
+            start = time.monotonic()
+            current_read = next_read
+            next_read = read(index + 1) if index + 1 < len(items) else None
+            try:
+                rendition, import_format, data = current_read.result()
+                try:
+                    [output_data], _ = _convert_renditions(
+                        data=data,
+                        import_format=import_format,
+                        renditions=[rendition],
+                        timeout=timeout,
+                        report=reports[index])
+                finally:
+                    data.close()
+            except Exception as exception:
+                _finish_batch_item(result=result, start=start, exception=exception)
+                continue
+
+            # At most one finished output waits for its upload
+            if pending_write is not None:
+                finish_write(pending_write)
+            pending_write = (result, start,
+                             writer.submit(
+                                 _write_batch_item,
+                                 output_fs=output_fs,
+                                 rendition=rendition,
+                                 data=output_data,
+                                 report=reports[index]))
+
+        if pending_write is not None:
+            finish_write(pending_write)
+
+    return results
+
+
+@app.task
+def generate_preview_jpg_batch(*,
+                               input_fs_url: str,
+                               output_fs_url: str,
+                               items: List[Dict[str, Any]],
+                               timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> List[Dict[str, Any]]:
+    return _convert_batch(
+        input_fs_url=input_fs_url, output_fs_url=output_fs_url, export_format_name='jpg', items=items, timeout=timeout)
+
+
+@app.task
+def generate_preview_png_batch(*,
+                               input_fs_url: str,
+                               output_fs_url: str,
+                               items: List[Dict[str, Any]],
+                               timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> List[Dict[str, Any]]:
+    return _convert_batch(
+        input_fs_url=input_fs_url, output_fs_url=output_fs_url, export_format_name='png', items=items, timeout=timeout)
+
+
+@app.task
+def generate_pdf_batch(*,
+                       input_fs_url: str,
+                       output_fs_url: str,
+                       items: List[Dict[str, Any]],
+                       timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> List[Dict[str, Any]]:
+    return _convert_batch(
+        input_fs_url=input_fs_url, output_fs_url=output_fs_url, export_format_name='pdf', items=items, timeout=timeout)
+
+
+def _page_output_file(output_file: str, page: int) -> str:
+    try:
+        return output_file.format(n=page)
+    except (IndexError, KeyError, ValueError):
+        raise ValueError('The output file template must only contain the field {n}.') from None
+
+
+def _make_parent_dirs(*, fs: FS, file: str) -> None:
+    # Templates like pages/{n}.jpg would otherwise fail on filesystems with real directories
+    parent = dirname(file)
+    if parent not in ('', '/'):
+        try:
+            fs.makedirs(parent, recreate=True)
+        except Exception as exception:
+            raise RuntimeError(f'Creating directory failed with a {type(exception).__name__} exception: '
+                               f'{str(exception)}.') from None
+
+
+def _page_preview_workers() -> int:
+    workers = _setting('page_previews_workers')
+    if workers is None:
+        workers = pages.cpu_limit()
+    return max(1, workers)
+
+
+def _select_pages(*, page_count: int, first_page: int, last_page: Optional[int],
+                  max_pages: Optional[int]) -> Tuple[List[int], bool]:
+    if first_page > page_count:
+        raise ValueError(f'The first page {first_page} is beyond the last page of the document ({page_count}).')
+    last_page = page_count if last_page is None else min(last_page, page_count)
+    selected = list(range(first_page, last_page + 1))
+    if max_pages is not None and len(selected) > max_pages:
+        return selected[:max_pages], True
+    return selected, False
+
+
+def _page_dimensions(*, dimensions: _Dimensions, size: Tuple[float, float]) -> Tuple[Optional[int], Optional[int]]:
+    if dimensions.scale_height or dimensions.scale_width:
+        width, height = size
+        dimensions = _fit_dimensions(dimensions=dimensions, height=height, width=width)
+    return dimensions.pixel_width, dimensions.pixel_height
+
+
+def _rasterize_pages(*, pdf_path: str, page_numbers: List[int], sizes: Dict[int, Tuple[float, float]],
+                     scratch_dir: str, export_format_name: str, dimensions: _Dimensions, quality: Optional[int],
+                     compression: Optional[int], deadline: float, report: _Report) -> List[Tuple[int, str]]:
+
+    def rasterize(page: int) -> Tuple[int, str]:
+        pixel_width, pixel_height = _page_dimensions(dimensions=dimensions, size=sizes[page])
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RuntimeError('Generating page previews failed due to timeout.')
+        output_path = pages.rasterize(
+            pdf_path=pdf_path,
+            page=page,
+            output_root=os.path.join(scratch_dir, f'page-{page}'),
+            export_format_name=export_format_name,
+            pixel_width=pixel_width,
+            pixel_height=pixel_height,
+            quality=quality,
+            timeout=remaining)
+        if export_format_name == 'png' and compression is not None:
+            # pdftoppm has no option for the compression level
+            with open(output_path, 'rb') as image_file:
+                image = _load_image(image_file)
+            with open(output_path, 'wb') as image_file:
+                shutil.copyfileobj(_encode_png(image=image, compression=compression, report=report), image_file)
+        return page, output_path
+
+    # Each page is rasterized by a separate pdftoppm process, the threads only wait for them.
+    with ThreadPoolExecutor(max_workers=min(_page_preview_workers(), len(page_numbers))) as executor:
+        return list(executor.map(rasterize, page_numbers))
+
+
+@app.task
+def generate_page_previews(*,
+                           input_fs_url: str,
+                           input_file: str,
+                           output_fs_url: str,
+                           output_file: str,
+                           manifest_file: str = None,
+                           mime_type: str = None,
+                           extension: str = None,
+                           format: str = 'jpg',
+                           pixel_height: int = None,
+                           pixel_width: int = None,
+                           maintain_ratio: bool = False,
+                           quality: int = None,
+                           compression: int = None,
+                           first_page: int = 1,
+                           last_page: int = None,
+                           max_pages: int = None,
+                           timeout: int = UNOCONV_DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    if format not in ('jpg', 'png'):
+        raise ValueError(f'Unsupported page preview format {format}.')
+    if _page_output_file(output_file, 1) == _page_output_file(output_file, 2):
+        raise ValueError('The output file template must contain the page number field {n}.')
+    dimensions = _build_dimensions(
+        pixel_height=pixel_height,
+        pixel_width=pixel_width,
+        logical_height=None,
+        logical_width=None,
+        scale_height=maintain_ratio,
+        scale_width=maintain_ratio)
+    _check_quality(quality)
+    _check_compression(compression)
+    if first_page is None or first_page < 1:
+        raise ValueError('The first page must be a positive integer.')
+    if last_page is not None and last_page < first_page:
+        raise ValueError('The last page must not be before the first page.')
+    if max_pages is not None and max_pages < 1:
+        raise ValueError('The maximum number of pages must be a positive integer.')
+    # The worker's limit can't be raised by the caller
+    max_pages_limit = _setting('page_previews_max_pages', 100)
+    if max_pages_limit is not None:
+        max_pages = max_pages_limit if max_pages is None else min(max_pages, max_pages_limit)
+
+    deadline = time.monotonic() + _clamp_timeout(timeout)
+    rendition = _Rendition(
+        export_format_name='pdf',
+        output_file=None,
+        dimensions=_null_dimensions,
+        quality=None,
+        compression=None,
+        paper_format=None,
+        paper_orientation=None,
+        page=None)
+    report = _Report()
+    import_format, data = _read_input(
+        fs_url=input_fs_url, file=input_file, mime_type=mime_type, extension=extension, report=report)
+    try:
+        [pdf_data], _ = _convert_renditions(
+            data=data, import_format=import_format, renditions=[rendition], timeout=timeout, report=report)
+    finally:
+        data.close()
+
+    with tempfile.TemporaryDirectory(prefix='unoconv-pages-') as scratch_dir:
+        pdf_path = os.path.join(scratch_dir, 'document.pdf')
+        with pdf_data, open(pdf_path, 'wb') as pdf_file:
+            shutil.copyfileobj(pdf_data, pdf_file)
+
+        page_count = pages.page_count(pdf_path=pdf_path, timeout=max(1.0, deadline - time.monotonic()))
+        page_numbers, truncated = _select_pages(
+            page_count=page_count, first_page=first_page, last_page=last_page, max_pages=max_pages)
+        sizes = pages.page_sizes(
+            pdf_path=pdf_path,
+            first_page=page_numbers[0],
+            last_page=page_numbers[-1],
+            timeout=max(1.0, deadline - time.monotonic()))
+        with report.stage('rasterize'):
+            rasterized = _rasterize_pages(
+                pdf_path=pdf_path,
+                page_numbers=page_numbers,
+                sizes=sizes,
+                scratch_dir=scratch_dir,
+                export_format_name=format,
+                dimensions=dimensions,
+                quality=quality,
+                compression=compression,
+                deadline=deadline,
+                report=report)
+
+        manifest = {
+            'input_file': input_file,
+            'page_count': page_count,
+            'truncated': truncated,
+            'pages': [],
+        }
+        with _filesystem(output_fs_url) as output_fs:
+            for page, output_path in rasterized:
+                with Image.open(output_path) as image:
+                    width, height = image.size
+                page_output_file = _page_output_file(output_file, page)
+                _make_parent_dirs(fs=output_fs, file=page_output_file)
+                with open(output_path, 'rb') as page_data:
+                    _write_data(fs=output_fs, file=page_output_file, data=page_data, report=report)
+                manifest['pages'].append({
+                    'page': page,
+                    'output_file': page_output_file,
+                    'pixel_width': width,
+                    'pixel_height': height,
+                })
+
+            if manifest_file is not None:
+                _make_parent_dirs(fs=output_fs, file=manifest_file)
+                _write_data(
+                    fs=output_fs,
+                    file=manifest_file,
+                    data=BytesIO(json.dumps(manifest, indent=2).encode('utf-8')),
+                    report=report)
+
+    return manifest
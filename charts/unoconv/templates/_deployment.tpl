@@ -0,0 +1,219 @@
+{{/*
+Deployment of one pool of Celery workers. Expects a dict with the keys root (the top-level context) and pool (an entry
+of pools, an empty dict for the default pool). Unset settings of a pool default to the top-level values.
+*/}}
+{{- define "unoconv.deployment" -}}
+{{- $root := .root -}}
+{{- $pool := .pool -}}
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: {{ include "unoconv.fullname" $root }}{{ if $pool.name }}-{{ $pool.name }}{{ end }}
+  labels:
+    app.kubernetes.io/name: {{ include "unoconv.name" $root }}
+    helm.sh/chart: {{ include "unoconv.chart" $root }}
+    app.kubernetes.io/instance: {{ $root.Release.Name }}
+    app.kubernetes.io/managed-by: {{ $root.Release.Service }}
+{{- if $pool.name }}
+    app.kubernetes.io/component: {{ $pool.name }}
+{{- end }}
+spec:
+  replicas: {{ default $root.Values.replicaCount $pool.replicaCount }}
+  selector:
+    matchLabels:
+      app.kubernetes.io/name: {{ include "unoconv.name" $root }}
+      app.kubernetes.io/instance: {{ $root.Release.Name }}
+{{- if $pool.name }}
+      app.kubernetes.io/component: {{ $pool.name }}
+{{- end }}
+  template:
+    metadata:
+      labels:
+        app.kubernetes.io/name: {{ include "unoconv.name" $root }}
+        app.kubernetes.io/instance: {{ $root.Release.Name }}
+{{- if $pool.name }}
+        app.kubernetes.io/component: {{ $pool.name }}
+{{- end }}
+{{- if and $root.Values.metrics.enabled $root.Values.metrics.podAnnotations }}
+      annotations:
+        prometheus.io/scrape: "true"
+        prometheus.io/port: {{ $root.Values.metrics.port | quote }}
+        prometheus.io/path: /metrics
+{{- end }}
+    spec:
+      securityContext:
+        fsGroup: 1000
+      containers:
+        - name: celery-worker
+          image: "{{ $root.Values.image.repository }}:{{ $root.Values.image.tag }}"
+          imagePullPolicy: {{ $root.Values.image.pullPolicy }}
+          args:
+              - celery-worker
+{{- if $root.Values.metrics.enabled }}
+          ports:
+            - name: metrics
+              containerPort: {{ $root.Values.metrics.port }}
+              protocol: TCP
+{{- end }}
+          livenessProbe:
+            exec:
+              command:
+                - /healthcheck-celery-worker.sh
+            initialDelaySeconds: 60
+            timeoutSeconds: 10
+            periodSeconds: 30
+            failureThreshold: 3
+          env:
+            - name: POD_NAME
+              valueFrom:
+                  fieldRef:
+                      fieldPath: metadata.name
+            - name: POD_NAMESPACE
+              valueFrom:
+                  fieldRef:
+                      fieldPath: metadata.namespace
+            - name: UNOCONV_INSTANCES
+              value: {{ default $root.Values.instances $pool.instances | quote }}
+{{- if $pool.queues }}
+            - name: UNOCONV_QUEUES
+              value: {{ $pool.queues | join "," | quote }}
+{{- end }}
+{{- if $root.Values.containers.celeryWorker.scratchVolume.enabled }}
+            - name: TMPDIR
+              value: {{ $root.Values.containers.celeryWorker.scratchVolume.mountPath }}
+{{- end }}
+          volumeMounts:
+            - mountPath: /celery-worker/config
+              name: celery-worker
+{{- if $root.Values.containers.celeryWorker.dataVolume.enabled }}
+            - mountPath: {{ $root.Values.containers.celeryWorker.dataVolume.mountPath }}
+              name: data-volume
+{{- end }}
+{{- if $root.Values.containers.celeryWorker.scratchVolume.enabled }}
+            - mountPath: {{ $root.Values.containers.celeryWorker.scratchVolume.mountPath }}
+              name: scratch-volume
+{{- end }}
+          resources:
+{{ toYaml (default $root.Values.resources $pool.resources) | indent 12 }}
+{{- if $root.Values.containers.unoconvListener.enabled }}
+        - name: unoconv-listener
+          image: "{{ $root.Values.image.repository }}:{{ $root.Values.image.tag }}"
+          imagePullPolicy: {{ $root.Values.image.pullPolicy }}
+          args:
+            - unoconv-listener
+          livenessProbe:
+            exec:
+              command:
+                - /healthcheck-unoconv-listener.sh
+            initialDelaySeconds: 60
+            timeoutSeconds: 15
+            periodSeconds: 30
+            failureThreshold: 3
+          readinessProbe:
+            exec:
+              command:
+                - /healthcheck-unoconv-listener.sh
+                - --conversion
+            initialDelaySeconds: 60
+            timeoutSeconds: 70
+            periodSeconds: 300
+            failureThreshold: 2
+          env:
+            - name: POD_NAME
+              valueFrom:
+                fieldRef:
+                  fieldPath: metadata.name
+            - name: POD_NAMESPACE
+              valueFrom:
+                fieldRef:
+                  fieldPath: metadata.namespace
+            - name: UNOCONV_INSTANCES
+              value: {{ default $root.Values.instances $pool.instances | quote }}
+          resources:
+{{ toYaml (default $root.Values.resources $pool.resources) | indent 12 }}
+{{- end }}
+      volumes:
+        - name: celery-worker
+          configMap:
+            name: {{ include "unoconv.fullname" $root }}{{ if $pool.name }}-{{ $pool.name }}{{ end }}-celery-worker
+{{- if $root.Values.containers.celeryWorker.dataVolume.enabled }}
+        - name: data-volume
+                  {{ toYaml $root.Values.containers.celeryWorker.dataVolume.reference | indent 10 }}
+{{- end }}
+{{- if $root.Values.containers.celeryWorker.scratchVolume.enabled }}
+        - name: scratch-volume
+          emptyDir:
+            medium: {{ $root.Values.containers.celeryWorker.scratchVolume.medium | quote }}
+            sizeLimit: {{ $root.Values.containers.celeryWorker.scratchVolume.sizeLimit }}
+{{- end }}
+    {{- with $root.Values.nodeSelector }}
+      nodeSelector:
+{{ toYaml . | indent 8 }}
+    {{- end }}
+    {{- with $root.Values.affinity }}
+      affinity:
+{{ toYaml . | indent 8 }}
+    {{- end }}
+    {{- with $root.Values.tolerations }}
+      tolerations:
+{{ toYaml . | indent 8 }}
+    {{- end }}
+{{- end -}}
+
+{{/*
+ConfigMap with the Celery configuration of one pool of Celery workers.
+*/}}
+{{- define "unoconv.celeryWorkerConfigMap" -}}
+{{- $root := .root -}}
+{{- $pool := .pool -}}
+apiVersion: v1
+kind: ConfigMap
+metadata:
+  name: {{ include "unoconv.fullname" $root }}{{ if $pool.name }}-{{ $pool.name }}{{ end }}-celery-worker
+  labels:
+    app.kubernetes.io/name: {{ include "unoconv.name" $root }}
+    helm.sh/chart: {{ include "unoconv.chart" $root }}
+    app.kubernetes.io/instance: {{ $root.Release.Name }}
+    app.kubernetes.io/managed-by: {{ $root.Release.Service }}
+{{- if $pool.name }}
+    app.kubernetes.io/component: {{ $pool.name }}
+{{- end }}
+data:
+  celeryconfig.py: |
+    {{- $root.Values.containers.celeryWorker.config | nindent 4 }}
+{{- if $root.Values.metrics.enabled }}
+    unoconv_metrics_port = {{ $root.Values.metrics.port }}
+{{- end }}
+{{- if $pool.config }}
+    {{- $pool.config | nindent 4 }}
+{{- end }}
+{{- end -}}
+
+{{/*
+Horizontal pod autoscaler of one pool of Celery workers.
+*/}}
+{{- define "unoconv.horizontalPodAutoscaler" -}}
+{{- $root := .root -}}
+{{- $pool := .pool -}}
+{{- $hpa := default $root.Values.horizontalPodAutoscaler $pool.horizontalPodAutoscaler -}}
+apiVersion: autoscaling/v1
+kind: HorizontalPodAutoscaler
+metadata:
+    name: {{ include "unoconv.fullname" $root }}{{ if $pool.name }}-{{ $pool.name }}{{ end }}
+    labels:
+        app.kubernetes.io/name: {{ include "unoconv.name" $root }}
+        helm.sh/chart: {{ include "unoconv.chart" $root }}
+        app.kubernetes.io/instance: {{ $root.Release.Name }}
+        app.kubernetes.io/managed-by: {{ $root.Release.Service }}
+{{- if $pool.name }}
+        app.kubernetes.io/component: {{ $pool.name }}
+{{- end }}
+spec:
+    maxReplicas: {{ $hpa.maxReplicas }}
+    minReplicas: {{ $hpa.minReplicas }}
+    scaleTargetRef:
+        apiVersion: apps/v1
+        kind: Deployment
+        name: {{ include "unoconv.fullname" $root }}{{ if $pool.name }}-{{ $pool.name }}{{ end }}
+    targetCPUUtilizationPercentage: {{ $hpa.targetCPUUtilizationPercentage }}
+{{- end -}}
@@ -11,15 +11,41 @@ EOF
     exit 64 # EX_USAGE
 fi
 
+# Number of LibreOffice listeners and Celery worker processes per pod, listener i uses port UNOCONV_BASE_PORT + i
+export UNOCONV_INSTANCES="${UNOCONV_INSTANCES:-1}"
+export UNOCONV_BASE_PORT="${UNOCONV_BASE_PORT:-2002}"
+
 COMMAND="$1"
 case "$COMMAND" in
     unoconv-listener)
-        /usr/bin/dumb-init -- /usr/bin/unoconv --listener --server=127.0.0.1 --port=2002 -v
+        if [ "$UNOCONV_INSTANCES" -eq 1 ]; then
+            /usr/bin/dumb-init -- /usr/bin/unoconv --listener --server=127.0.0.1 --port="$UNOCONV_BASE_PORT" -v
+        else
+            # Each listener gets its own user profile, LibreOffice instances can't share one. If one of them
+            # dies the container is restarted.
+            exec /usr/bin/dumb-init -- /bin/bash -c '
+                for ((i = 0; i < UNOCONV_INSTANCES; i++)); do
+                    port=$((UNOCONV_BASE_PORT + i))
+                    /usr/bin/unoconv --listener --server=127.0.0.1 --port="$port" \
+                        --user-profile="${TMPDIR:-/tmp}/unoconv-profile-$port" -v &
+                done
+                wait -n
+                exit 1'
+        fi
     ;;
     celery-worker)
         export PYTHONPATH=/celery-worker/lib
+        # Worker processes share their metrics via files in this directory, stale files from a previous run
+        # would be added to the new values.
+        export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-${TMPDIR:-/tmp}/prometheus}"
+        export prometheus_multiproc_dir="$PROMETHEUS_MULTIPROC_DIR"
+        rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+        # Checked by the liveness probe, healthcheck-celery-worker.sh uses the same default
+        export UNOCONV_HEARTBEAT_FILE="${UNOCONV_HEARTBEAT_FILE:-${TMPDIR:-/tmp}/unoconv-heartbeat}"
+        # Comma separated list of queues to consume, by default the queues from the Celery configuration
         exec /usr/bin/dumb-init -- /usr/local/bin/celery worker --loglevel=INFO \
-                    --concurrency=1 -n "${POD_NAME:-%h}" -A unoconv
+                    --concurrency="$UNOCONV_INSTANCES" -n "${POD_NAME:-%h}" ${UNOCONV_QUEUES:+-Q "$UNOCONV_QUEUES"} \
+                    -A unoconv
     ;;
     *)
         echo 'Unknown command. Valid commands are "unoconv-listener" and "celery-worker".' 1>&2
@@ -1,11 +1,21 @@
 #!/usr/bin/env bash
 
-export PYTHONPATH=/celery-worker/lib
-HOSTNAME="$(hostname -f)"
-if timeout 60 celery -A celery_unoconv status | grep -q "${POD_NAME:-$HOSTNAME}"':.*OK'; then
-    echo 'SUCCESS: Celery worker is running successfully'
+# The worker touches the heartbeat file regularly while it is connected to the broker (see unoconv/heartbeat.py).
+# Only the local file is checked, so the probe neither involves the broker nor other workers and isn't affected
+# by long running conversions.
+HEARTBEAT_FILE="${UNOCONV_HEARTBEAT_FILE:-${TMPDIR:-/tmp}/unoconv-heartbeat}"
+MAX_AGE="${UNOCONV_HEARTBEAT_MAX_AGE:-60}"
+
+if [ ! -f "$HEARTBEAT_FILE" ]; then
+    echo "FAILURE: Celery worker has not written a heartbeat to $HEARTBEAT_FILE"
+    exit 1
+fi
+
+age=$(($(date +%s) - $(stat -c %Y "$HEARTBEAT_FILE")))
+if [ "$age" -le "$MAX_AGE" ]; then
+    echo "SUCCESS: Celery worker is running successfully (last heartbeat ${age}s ago)"
     exit 0
 else
-    echo 'FAILURE: Celery worker has failed'
+    echo "FAILURE: Celery worker has failed (last heartbeat ${age}s ago)"
     exit 1
 fi
@@ -1,9 +1,62 @@
 #!/usr/bin/env bash
 
-if timeout 60 unoconv -n -f jpg -o /tmp/example.jpg /example.docx; then
-    echo 'SUCCESS: unoconv listener is running successfully'
+# Without arguments the listeners are only pinged via UNO which is cheap enough for a liveness probe. With
+# --conversion a document is converted by each listener, this is meant for an infrequent readiness probe.
+MODE=ping
+if [ "$1" == "--conversion" ]; then
+    MODE=conversion
+elif [ $# -gt 0 ]; then
+    echo "Usage: $0 [--conversion]" 1>&2
+    exit 64 # EX_USAGE
+fi
+
+INSTANCES="${UNOCONV_INSTANCES:-1}"
+BASE_PORT="${UNOCONV_BASE_PORT:-2002}"
+
+ping_listener() {
+    # Connecting and fetching the service manager is handled by the UNO bridge of the listener. Unlike most other
+    # calls it doesn't wait for LibreOffice's global lock, so the ping doesn't block while a conversion is running.
+    timeout 10 python3 - "$1" <<'EOF'
+import sys
+
+import uno
+
+port = sys.argv[1]
+local_context = uno.getComponentContext()
+resolver = local_context.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local_context)
+context = resolver.resolve(f'uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext')
+if context.ServiceManager is None:
+    sys.exit(1)
+EOF
+}
+
+convert_document() {
+    timeout 60 unoconv -n --port="$1" -f jpg -o "/tmp/example-$1.jpg" /example.docx
+}
+
+# All listeners are checked in parallel
+pids=()
+for ((i = 0; i < INSTANCES; i++)); do
+    port=$((BASE_PORT + i))
+    if [ "$MODE" == "ping" ]; then
+        ping_listener "$port" &
+    else
+        convert_document "$port" &
+    fi
+    pids+=($!)
+done
+
+failed=0
+for ((i = 0; i < INSTANCES; i++)); do
+    if ! wait "${pids[$i]}"; then
+        echo "FAILURE: unoconv listener on port $((BASE_PORT + i)) has failed ($MODE)"
+        failed=1
+    fi
+done
+
+if [ $failed -eq 0 ]; then
+    echo "SUCCESS: unoconv listener is running successfully ($MODE)"
     exit 0
 else
-    echo 'FAILURE: unoconv listener has failed'
     exit 1
 fi
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# Offline benchmark of the conversion tasks over the example files. The tasks are called directly in this process,
+# no broker or object storage is needed. See the "Benchmarking" section of the README.
+import argparse
+import json
+import os
+import platform
+import resource
+import stat
+import sys
+import tempfile
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from unoconv import tasks
+
+TASKS = OrderedDict([
+    ('generate_preview_jpg', (tasks.generate_preview_jpg, 'jpg', {
+        'pixel_height': 800,
+        'pixel_width': 800,
+        'maintain_ratio': True
+    })),
+    ('generate_preview_png', (tasks.generate_preview_png, 'png', {
+        'pixel_height': 800,
+        'pixel_width': 800,
+        'maintain_ratio': True
+    })),
+    ('generate_pdf', (tasks.generate_pdf, 'pdf', {})),
+])
+
+# A4 at 96 DPI like LibreOffice's image export
+STUB_PAGE_SIZE = (794, 1123)
+
+STUB_UNOCONV = '''#!/bin/sh
+format=
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --format) format="$2"; shift ;;
+    esac
+    shift
+done
+cat >/dev/null
+exec cat "{stub_dir}/output.$format"
+'''
+
+
+def install_stub(stub_dir: str) -> None:
+    # Replaces unoconv with a shell script returning canned output. What remains is the overhead of the Python side
+    # of a task: reading the input, starting the subprocess, post-processing and writing the output.
+    page = Image.new('RGB', STUB_PAGE_SIZE, 'white')
+    page.save(os.path.join(stub_dir, 'output.jpg'), format='JPEG')
+    page.save(os.path.join(stub_dir, 'output.png'), format='PNG')
+    page.save(os.path.join(stub_dir, 'output.pdf'), format='PDF')
+
+    stub_path = os.path.join(stub_dir, 'unoconv')
+    with open(stub_path, 'w') as stub:
+        stub.write(STUB_UNOCONV.format(stub_dir=stub_dir))
+    os.chmod(stub_path, os.stat(stub_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ['PATH'] = stub_dir + os.pathsep + os.environ.get('PATH', '')
+
+
+def reset_peak_rss() -> bool:
+    # Supported since Linux 4.0, without it the peak is the maximum since the start of the process
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss() -> int:
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def find_files(corpus: str, formats: Optional[List[str]]) -> List[str]:
+    files = []
+    for directory, _, filenames in os.walk(corpus):
+        for filename in filenames:
+            extension = os.path.splitext(filename)[1].lower().lstrip('.')
+            if filename.startswith('example') and (formats is None or extension in formats):
+                files.append(os.path.relpath(os.path.join(directory, filename), corpus))
+    return sorted(files)
+
+
+def run_task(*, task_name: str, corpus: str, output_dir: str, file: str) -> Tuple[float, int]:
+    task, output_extension, options = TASKS[task_name]
+    output_file = f'{task_name}-{os.path.basename(file)}.{output_extension}'
+    start = time.perf_counter()
+    task(
+        input_fs_url=f'osfs://{corpus}',
+        input_file=file,
+        output_fs_url=f'osfs://{output_dir}',
+        output_file=output_file,
+        extension=os.path.splitext(file)[1],
+        **options)
+    duration = time.perf_counter() - start
+    output_path = os.path.join(output_dir, output_file)
+    output_size = os.path.getsize(output_path)
+    os.unlink(output_path)
+    return duration, output_size
+
+
+def benchmark(*, corpus: str, files: List[str], task_names: List[str], repeat: int,
+              warmup: int) -> List[Dict[str, Any]]:
+    groups = defaultdict(list)
+    for file in files:
+        groups[os.path.splitext(file)[1].lower().lstrip('.')].append(file)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='unoconv-benchmark-') as output_dir:
+        for task_name in task_names:
+            for input_format, group_files in sorted(groups.items()):
+                reset_peak_rss()
+                latencies, output_sizes, errors = [], [], []
+                input_bytes = 0
+                for file in group_files:
+                    for iteration in range(warmup + repeat):
+                        try:
+                            duration, output_size = run_task(
+                                task_name=task_name, corpus=corpus, output_dir=output_dir, file=file)
+                        except Exception as exception:
+                            errors.append(f'{file}: {type(exception).__name__}: {str(exception)}')
+                            break
+                        if iteration >= warmup:
+                            latencies.append(duration)
+                            output_sizes.append(output_size)
+                            input_bytes += os.path.getsize(os.path.join(corpus, file))
+
+                total_time = sum(latencies)
+                results.append({
+                    'task': task_name,
+                    'format': input_format,
+                    'files': len(group_files),
+                    'runs': len(latencies),
+                    'failures': len(errors),
+                    'errors': errors,
+                    'latency_p50': percentile(latencies, 0.5),
+                    'latency_p95': percentile(latencies, 0.95),
+                    'latency_mean': total_time / len(latencies) if latencies else None,
+                    'throughput_per_second': len(latencies) / total_time if total_time > 0 else None,
+                    'input_bytes_per_second': input_bytes / total_time if total_time > 0 else None,
+                    'output_bytes_min': min(output_sizes) if output_sizes else None,
+                    'output_bytes_max': max(output_sizes) if output_sizes else None,
+                    'output_bytes_mean': sum(output_sizes) / len(output_sizes) if output_sizes else None,
+                    'peak_rss_bytes': peak_rss(),
+                })
+                print(
+                    f'{task_name:24} {input_format:6} runs={len(latencies):3} failures={len(errors):2} '
+                    f'p50={_format_seconds(results[-1]["latency_p50"])} '
+                    f'p95={_format_seconds(results[-1]["latency_p95"])}',
+                    file=sys.stderr)
+
+    return results
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    return f'{value * 1000:8.1f}ms' if value is not None else '       n/a'
+
+
+def compare(*, results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float,
+            min_difference: float) -> List[str]:
+    # The p50 is compared as the p95 of a handful of runs is too noisy to gate on
+    baseline_results = {(result['task'], result['format']): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_results.get((result['task'], result['format']))
+        if previous is None:
+            continue
+        if result['failures'] > previous['failures']:
+            regressions.append(f'{result["task"]} {result["format"]}: {result["failures"]} failures, '
+                               f'baseline had {previous["failures"]}')
+        current_p50, previous_p50 = result['latency_p50'], previous['latency_p50']
+        if current_p50 is None or previous_p50 is None:
+            continue
+        if current_p50 > previous_p50 * (1 + threshold) and current_p50 - previous_p50 > min_difference:
+            regressions.append(f'{result["task"]} {result["format"]}: p50 {current_p50 * 1000:.1f}ms, '
+                               f'baseline {previous_p50 * 1000:.1f}ms')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the conversion tasks without a broker.')
+    parser.add_argument(
+        '--corpus',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example-files'),
+        help='directory containing the input documents')
+    parser.add_argument('--tasks', nargs='+', choices=list(TASKS), default=list(TASKS), help='tasks to benchmark')
+    parser.add_argument('--formats', nargs='+', help='only benchmark input documents with these extensions')
+    parser.add_argument('--repeat', type=int, default=3, help='measured runs per input document')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs per input document')
+    parser.add_argument('--backend', choices=['unoconv', 'uno'], default='unoconv', help='conversion backend')
+    parser.add_argument('--stub', action='store_true', help='replace unoconv with a stub returning canned output')
+    parser.add_argument('--output', help='write the results to this file instead of standard output')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2, help='relative p50 latency increase treated as a regression')
+    parser.add_argument(
+        '--min-difference', type=float, default=0.005, help='ignore p50 latency increases smaller than this (seconds)')
+    args = parser.parse_args()
+
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error('--repeat must be at least one and --warmup must not be negative.')
+    if args.stub and args.backend != 'unoconv':
+        parser.error('--stub requires the unoconv backend.')
+
+    corpus = os.path.abspath(args.corpus)
+    files = find_files(corpus, [extension.lower().lstrip('.') for extension in args.formats] if args.formats else None)
+    if not files:
+        parser.error(f'No input documents found in {corpus}.')
+
+    tasks.app.conf.update({'unoconv_backend': args.backend, 'unoconv_cache_fs_url': None})
+
+    with tempfile.TemporaryDirectory(prefix='unoconv-stub-') as stub_dir:
+        if args.stub:
+            install_stub(stub_dir)
+        peak_rss_per_group = reset_peak_rss()
+        start = time.time()
+        results = benchmark(
+            corpus=corpus, files=files, task_names=args.tasks, repeat=args.repeat, warmup=args.warmup)
+
+    report = {
+        'started': start,
+        'duration': time.time() - start,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'stub': args.stub,
+        'repeat': args.repeat,
+        'warmup': args.warmup,
+        'peak_rss_per_group': peak_rss_per_group,
+        'peak_child_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('stub') != args.stub or baseline.get('backend') != args.backend:
+            print('Warning: The baseline was recorded with a different backend or stub setting.', file=sys.stderr)
+        regressions = compare(
+            results=results,
+            baseline=baseline['results'],
+            threshold=args.threshold,
+            min_difference=args.min_difference)
+        for regression in regressions:
+            print(f'Regression: {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import os
+import tempfile
+import time
+import unittest
+from io import BytesIO
+from unittest import mock
+
+from parameterized import parameterized
+
+from unoconv import cache, formats, tasks
+
+_ODT = formats.determine_import_format('application/vnd.oasis.opendocument.text', '.odt')
+
+
+class TestConversionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = cache.ConversionCache(fs_url=f'osfs://{self.cache_dir.name}', max_bytes=None, ttl=None)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def _age(self, key: str, seconds: float) -> None:
+        path = os.path.join(self.cache_dir.name, key[:2], key)
+        modified = time.time() - seconds
+        os.utime(path, (modified, modified))
+
+    def _keys(self):
+        return sorted(file for _, _, files in os.walk(self.cache_dir.name) for file in files)
+
+    def test_miss_and_hit(self):
+        statistics = cache.statistics()
+        self.assertIsNone(self.cache.get('ab' * 32, BytesIO))
+
+        data = BytesIO(b'converted')
+        self.cache.put('ab' * 32, data)
+        self.assertEqual(0, data.tell())
+
+        cached = self.cache.get('ab' * 32, BytesIO)
+        self.assertEqual(b'converted', cached.read())
+        self.assertIsNone(self.cache.get('cd' * 32, BytesIO))
+
+        self.assertEqual(statistics['misses'] + 2, cache.statistics()['misses'])
+        self.assertEqual(statistics['hits'] + 1, cache.statistics()['hits'])
+        self.assertEqual(statistics['stores'] + 1, cache.statistics()['stores'])
+
+    def test_overwrite(self):
+        self.cache.put('ab' * 32, BytesIO(b'old'))
+        self.cache.put('ab' * 32, BytesIO(b'new'))
+        self.assertEqual(b'new', self.cache.get('ab' * 32, BytesIO).read())
+        self.assertEqual(['ab' * 32], self._keys())
+
+    def test_evict_max_bytes(self):
+        self.cache = cache.ConversionCache(fs_url=f'osfs://{self.cache_dir.name}', max_bytes=2048, ttl=None)
+        for age, key in enumerate(['ab' * 32, 'cd' * 32, 'ef' * 32]):
+            self.cache.put(key, BytesIO(b'\0' * 1024))
+            self._age(key, 100 - age)
+        # Reading an entry makes it the most recently used one
+        self.cache.get('ab' * 32, BytesIO)
+
+        self.cache.evict()
+        self.assertEqual(['ab' * 32, 'ef' * 32], self._keys())
+
+    def test_evict_ttl(self):
+        self.cache = cache.ConversionCache(fs_url=f'osfs://{self.cache_dir.name}', max_bytes=None, ttl=60)
+        self.cache.put('ab' * 32, BytesIO(b'old'))
+        self._age('ab' * 32, 120)
+        self.cache.put('cd' * 32, BytesIO(b'new'))
+
+        self.cache.evict()
+        self.assertEqual(['cd' * 32], self._keys())
+
+
+class TestCacheKey(unittest.TestCase):
+
+    def _configure(self, **settings):
+        setting = tasks._setting
+        patcher = mock.patch.object(
+            tasks, '_setting', lambda name, default=None: settings.get(name, setting(name, default)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _key(*, input_digest='0' * 64, import_format=_ODT, pyramid=False, **specification):
+        rendition = tasks._build_rendition({'format': 'jpg', 'output_file': 'output.jpg', **specification})
+        return tasks._cache_key(
+            input_digest=input_digest, import_format=import_format, rendition=rendition, pyramid=pyramid)
+
+    def test_stable(self):
+        self.assertEqual(self._key(quality=80), self._key(quality=80))
+        self.assertEqual(self._key(), self._key(output_file='other.jpg'))
+
+    @parameterized.expand([
+        ('input', {'input_digest': '1' * 64}),
+        ('import_format', {'import_format': formats.determine_import_format(None, '.docx')}),
+        ('format', {'format': 'png'}),
+        ('quality', {'quality': 80}),
+        ('dimensions', {'pixel_height': 100, 'pixel_width': 100}),
+        ('maintain_ratio', {'pixel_height': 100, 'pixel_width': 100, 'maintain_ratio': True}),
+        ('page', {'page': 2}),
+        ('pyramid', {'pyramid': True}),
+    ])
+    def test_parameters(self, _, parameters):
+        self.assertNotEqual(self._key(), self._key(**parameters))
+
+    @parameterized.expand([('single_render',), ('preview_first_page_only',), ('optimize_images',)])
+    def test_settings(self, name):
+        key = self._key()
+        self._configure(**{name: True})
+        self.assertNotEqual(key, self._key())
+
+    def test_cached_rendition_is_not_converted(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self._configure(cache_fs_url=f'osfs://{cache_dir.name}')
+        self.addCleanup(setattr, cache, '_cache', None)
+        cache._cache = None
+
+        data = BytesIO(b'not really a document')
+        rendition = tasks._build_rendition({'format': 'pdf', 'output_file': 'output.pdf'})
+        cache_key = tasks._cache_key(
+            input_digest=tasks._digest(data), import_format=_ODT, rendition=rendition, pyramid=False)
+        tasks._conversion_cache().put(cache_key, BytesIO(b'%PDF-1.4'))
+
+        # A conversion of this input would fail
+        [output_data], sources = tasks._convert_renditions(
+            data=data, import_format=_ODT, renditions=[rendition], timeout=10, report=tasks._Report())
+        self.assertEqual(b'%PDF-1.4', output_data.read())
+        self.assertEqual([tasks.SOURCE_CACHE], sources)
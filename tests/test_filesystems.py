@@ -0,0 +1,100 @@
+import shutil
+import tempfile
+import unittest
+
+from fs.errors import CreateFailed
+from parameterized import parameterized
+
+from unoconv import filesystems, tasks
+
+
+class TestFilesystemPool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fs_url = f'osfs://{self.directory}'
+        self.pool = filesystems.FilesystemPool(max_idle=2, idle_timeout=300, health_check_interval=60)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_reuse(self):
+        fs = self.pool.acquire(self.fs_url)
+        self.pool.release(self.fs_url, fs)
+        self.assertIs(fs, self.pool.acquire(self.fs_url))
+        # Used exclusively until it is released
+        other_fs = self.pool.acquire(self.fs_url)
+        self.assertIsNot(fs, other_fs)
+        self.assertIsNot(fs, self.pool.acquire('mem://'))
+
+    def test_discard(self):
+        fs = self.pool.acquire(self.fs_url)
+        self.pool.release(self.fs_url, fs, discard=True)
+        self.assertTrue(fs.isclosed())
+        self.assertIsNot(fs, self.pool.acquire(self.fs_url))
+
+    def test_max_idle(self):
+        fs_list = [self.pool.acquire(self.fs_url) for _ in range(3)]
+        for fs in fs_list:
+            self.pool.release(self.fs_url, fs)
+        # The least recently released one is closed
+        self.assertEqual([True, False, False], [fs.isclosed() for fs in fs_list])
+
+    def test_pooling_disabled(self):
+        self.pool = filesystems.FilesystemPool(max_idle=0, idle_timeout=300, health_check_interval=60)
+        fs = self.pool.acquire(self.fs_url)
+        self.pool.release(self.fs_url, fs)
+        self.assertTrue(fs.isclosed())
+
+    def test_idle_timeout(self):
+        self.pool = filesystems.FilesystemPool(max_idle=2, idle_timeout=-1, health_check_interval=60)
+        fs = self.pool.acquire(self.fs_url)
+        self.pool.release(self.fs_url, fs)
+        self.assertIsNot(fs, self.pool.acquire(self.fs_url))
+        self.assertTrue(fs.isclosed())
+
+    def test_health_check(self):
+        self.pool = filesystems.FilesystemPool(max_idle=2, idle_timeout=300, health_check_interval=0)
+        fs = self.pool.acquire(self.fs_url)
+        self.pool.release(self.fs_url, fs)
+        self.assertIs(fs, self.pool.acquire(self.fs_url))
+        self.pool.release(self.fs_url, fs)
+
+        # The pooled filesystem is dropped and opening a new one fails
+        shutil.rmtree(self.directory)
+        with self.assertRaises(CreateFailed):
+            self.pool.acquire(self.fs_url)
+        self.assertTrue(fs.isclosed())
+
+    def test_get_pool(self):
+        self.addCleanup(filesystems.close_pool)
+        pool = filesystems.get_pool(max_idle=2, idle_timeout=300, health_check_interval=60)
+        self.assertIs(pool, filesystems.get_pool(max_idle=2, idle_timeout=300, health_check_interval=60))
+        filesystems.close_pool()
+        self.assertIsNot(pool, filesystems.get_pool(max_idle=2, idle_timeout=300, health_check_interval=60))
+
+
+class TestFilesystem(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(filesystems.close_pool)
+
+    @parameterized.expand([('no_scheme', 'this-is-invalid'), ('unknown_scheme', 'unknown://bucket')])
+    def test_invalid_url(self, _, fs_url):
+        with self.assertRaises(RuntimeError):
+            with tasks._filesystem(fs_url):
+                pass
+
+    @parameterized.expand([
+        ('not_found', FileNotFoundError, False),
+        ('invalid_document', ValueError, False),
+        ('connection', RuntimeError, True),
+    ])
+    def test_failure(self, _, exception_type, discarded):
+        with self.assertRaises(exception_type):
+            with tasks._filesystem('mem://') as fs:
+                raise exception_type()
+        self.assertEqual(discarded, fs.isclosed())
+        with tasks._filesystem('mem://') as other_fs:
+            self.assertEqual(discarded, fs is not other_fs)
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+from parameterized import parameterized
+
+from unoconv import filesystems, tasks
+
+
+def _bmp(width: int, height: int) -> bytes:
+    # Noise doesn't compress, so the size of a PNG rendition grows with its dimensions. BMP images are converted by
+    # Pillow, LibreOffice isn't needed.
+    data = BytesIO()
+    Image.frombytes('RGB', (width, height), os.urandom(width * height * 3)).save(data, format='BMP')
+    return data.getvalue()
+
+
+class TestInline(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(filesystems.close_pool)
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+        self.output_fs_url = f'osfs://{self.output_dir.name}'
+        self.data = _bmp(64, 64)
+
+    def _configure(self, **settings):
+        setting = tasks._setting
+        patcher = mock.patch.object(
+            tasks, '_setting', lambda name, default=None: settings.get(name, setting(name, default)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _convert(self, pixel_size: int, **kwargs):
+        return tasks.generate_preview_png_inline(
+            data=self.data, extension='.bmp', pixel_height=pixel_size, pixel_width=pixel_size, timeout=10, **kwargs)
+
+    def test_returned_inline(self):
+        result = self._convert(32, output_fs_url=self.output_fs_url, output_file='output.png')
+        [output] = result['outputs']
+        self.assertIsNone(output['output_file'])
+        self.assertEqual(output['size'], len(output['data']))
+        self.assertEqual((32, 32), Image.open(BytesIO(output['data'])).size)
+        self.assertEqual(len(self.data), result['input_size'])
+        # Nothing is written when the result is returned inline
+        self.assertEqual([], os.listdir(self.output_dir.name))
+
+    def test_written_when_too_large(self):
+        self._configure(inline_max_size=len(self.data))
+        result = self._convert(512, output_fs_url=self.output_fs_url, output_file='output.png')
+        [output] = result['outputs']
+        self.assertGreater(output['size'], len(self.data))
+        self.assertEqual('output.png', output['output_file'])
+        self.assertIsNone(output['data'])
+        with Image.open(os.path.join(self.output_dir.name, 'output.png')) as image:
+            self.assertEqual((512, 512), image.size)
+
+    def test_result_too_large(self):
+        self._configure(inline_max_size=len(self.data))
+        with self.assertRaisesRegex(ValueError, 'Result is too large'):
+            self._convert(512)
+
+    @parameterized.expand([('inline_max_size',), ('max_input_size',)])
+    def test_input_too_large(self, setting):
+        self._configure(**{setting: len(self.data) - 1})
+        with self.assertRaisesRegex(ValueError, 'too large'):
+            self._convert(32)
+
+    @parameterized.expand([
+        ('not_bytes', {'data': 'text'}),
+        ('output_file_only', {'output_file': 'output.png'}),
+        ('output_fs_url_only', {'output_fs_url': 'mem://'}),
+    ])
+    def test_invalid(self, _, kwargs):
+        with self.assertRaises(ValueError):
+            tasks.generate_preview_png_inline(**{'data': self.data, 'extension': '.bmp', 'timeout': 10, **kwargs})
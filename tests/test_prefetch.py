@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from unoconv import filesystems, prefetch
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.input_dir = tempfile.TemporaryDirectory()
+        self.prefetch_dir = os.path.join(self.input_dir.name, 'prefetch')
+        self.fs_url = f'osfs://{self.input_dir.name}'
+        with open(os.path.join(self.input_dir.name, 'small.odt'), 'wb') as input_file:
+            input_file.write(b'\0' * 1024)
+        with open(os.path.join(self.input_dir.name, 'large.odt'), 'wb') as input_file:
+            input_file.write(b'\0' * 4096)
+
+    def tearDown(self):
+        self.input_dir.cleanup()
+
+    def _prefetch(self, file, **kwargs):
+        fs_pool = filesystems.FilesystemPool(max_idle=1, idle_timeout=60, health_check_interval=60)
+        prefetcher = prefetch.Prefetcher(
+            **{
+                'directory': self.prefetch_dir,
+                'max_files': 10,
+                'max_bytes': 1024**2,
+                'max_size': None,
+                'ttl': 600,
+                'threads': 1,
+                'fs_pool': fs_pool,
+                **kwargs
+            })
+        try:
+            prefetcher.submit(task_id='task', fs_url=self.fs_url, file=file)
+            data = prefetch.claim(directory=self.prefetch_dir, task_id='task', fs_url=self.fs_url, file=file, wait=10)
+        finally:
+            fs_pool.close()
+        if data is not None:
+            with data:
+                return data.read()
+        return None
+
+    def test_prefetched(self):
+        self.assertEqual(b'\0' * 1024, self._prefetch('small.odt'))
+        self.assertIsNone(
+            prefetch.claim(directory=self.prefetch_dir, task_id='task', fs_url=self.fs_url, file='small.odt', wait=0))
+
+    def test_other_task(self):
+        self._prefetch('small.odt')
+        self.assertIsNone(
+            prefetch.claim(directory=self.prefetch_dir, task_id='other', fs_url=self.fs_url, file='small.odt', wait=0))
+
+    def test_too_large(self):
+        self.assertEqual(b'\0' * 1024, self._prefetch('small.odt', max_size=2048))
+        self.assertIsNone(self._prefetch('large.odt', max_size=2048))
+
+    def test_over_budget(self):
+        self.assertIsNone(self._prefetch('large.odt', max_bytes=2048))
+
+    def test_not_found(self):
+        self.assertIsNone(self._prefetch('does-not-exist.odt'))
@@ -0,0 +1,108 @@
+import os
+import struct
+import unittest
+import zipfile
+from io import BytesIO
+
+from parameterized import parameterized
+
+from unoconv import preflight
+
+example_files = [os.path.join(dp, f) for dp, dn, filenames in os.walk('example-files') for f in filenames]
+
+_LIMITS = {'max_compression_ratio': 100, 'max_uncompressed_size': 1024**3}
+
+
+def _zip(files, **kwargs) -> bytes:
+    data = BytesIO()
+    with zipfile.ZipFile(data, 'w', zipfile.ZIP_DEFLATED, **kwargs) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return data.getvalue()
+
+
+def _ole2(stream_names) -> bytes:
+    # A minimal compound document with 512 byte sectors: header, one FAT sector and one directory sector
+    header = bytearray(512)
+    header[0:8] = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    struct.pack_into('<HHH', header, 0x1a, 0x3e, 3, 0xfffe)
+    struct.pack_into('<H', header, 0x1e, 9)
+    struct.pack_into('<I', header, 0x2c, 1)
+    struct.pack_into('<I', header, 0x30, 1)
+    struct.pack_into('<109I', header, 0x4c, 0, *([0xffffffff] * 108))
+
+    fat = bytearray(b'\xff' * 512)
+    struct.pack_into('<II', fat, 0, 0xfffffffd, 0xfffffffe)
+
+    directory = bytearray(512)
+    for index, name in enumerate(['Root Entry'] + stream_names[:3]):
+        encoded_name = (name + '\0').encode('utf-16-le')
+        directory[index * 128:index * 128 + len(encoded_name)] = encoded_name
+        struct.pack_into('<HB', directory, index * 128 + 0x40, len(encoded_name), 5 if index == 0 else 2)
+
+    return bytes(header + fat + directory)
+
+
+class TestPreflight(unittest.TestCase):
+
+    def assertRejected(self, reason, data, **limits):
+        with self.assertRaises(preflight.DocumentRejectedError) as context:
+            preflight.inspect(BytesIO(data), **{**_LIMITS, **limits})
+        self.assertEqual(reason, context.exception.reason)
+        self.assertIsInstance(context.exception, ValueError)
+
+    @parameterized.expand([(input_file,) for input_file in example_files])
+    def test_example_file(self, input_file):
+        with open(input_file, 'rb') as data:
+            preflight.inspect(data, **_LIMITS)
+            self.assertEqual(0, data.tell())
+
+    @parameterized.expand([('EncryptionInfo',), ('EncryptedPackage',), ('EncryptedSummary',)])
+    def test_encrypted_ole2(self, stream_name):
+        preflight.inspect(BytesIO(_ole2(['WordDocument'])), **_LIMITS)
+        self.assertRejected(preflight.REASON_ENCRYPTED, _ole2(['WordDocument', stream_name]))
+
+    def test_encrypted_odf_manifest(self):
+        manifest = ('<manifest:manifest><manifest:file-entry manifest:full-path="content.xml">'
+                    '<manifest:encryption-data manifest:checksum-type="SHA1/1K"/></manifest:file-entry>'
+                    '</manifest:manifest>')
+        self.assertRejected(
+            preflight.REASON_ENCRYPTED,
+            _zip({
+                'mimetype': 'application/vnd.oasis.opendocument.text',
+                'META-INF/manifest.xml': manifest
+            }))
+
+    def test_encrypted_zip_member(self):
+        data = bytearray(_zip({'[Content_Types].xml': '<Types/>', 'word/document.xml': '<document/>'}))
+        # Sets the encryption flag in the central directory entries, which is all that is inspected
+        offset = data.find(b'PK\x01\x02')
+        while offset != -1:
+            data[offset + 8] |= 0x1
+            offset = data.find(b'PK\x01\x02', offset + 4)
+        self.assertRejected(preflight.REASON_ENCRYPTED, bytes(data))
+
+    def test_truncated(self):
+        with open('example-files/document/docx/example.docx', 'rb') as input_file:
+            data = input_file.read()
+        self.assertRejected(preflight.REASON_CORRUPT, data[:len(data) // 2])
+
+    def test_truncated_members(self):
+        data = _zip({'word/document.xml': os.urandom(64 * 1024)})
+        central_directory = data.find(b'PK\x01\x02')
+        # The central directory is intact, but the member data before it is partially missing
+        self.assertRejected(preflight.REASON_CORRUPT, data[:1024] + data[central_directory:])
+
+    def test_compression_ratio(self):
+        self.assertRejected(preflight.REASON_ZIP_BOMB, _zip({'bomb.xml': b'\0' * (32 * 1024 * 1024)}))
+
+    def test_small_documents_with_high_ratio(self):
+        # Office documents compress well, the ratio isn't checked for small documents
+        preflight.inspect(BytesIO(_zip({'content.xml': b'\0' * (1024 * 1024)})), **_LIMITS)
+
+    def test_uncompressed_size(self):
+        self.assertRejected(
+            preflight.REASON_ZIP_BOMB, _zip({'content.xml': b'\0' * (2 * 1024 * 1024)}), max_uncompressed_size=1024**2)
+
+    def test_other_formats(self):
+        preflight.inspect(BytesIO(b'{\\rtf1 Hello}'), **_LIMITS)
@@ -0,0 +1,146 @@
+import os
+import tempfile
+import unittest
+
+from parameterized import parameterized
+
+from unoconv import filesystems, routing
+
+_LANES = [
+    {'queue': 'fast-preview', 'outputs': ['jpg', 'png'], 'max_input_size': 2048},
+    {'queue': 'heavy-pdf', 'outputs': ['pdf'], 'document_types': ['document', 'spreadsheet']},
+    {'queue': 'page-previews', 'tasks': ['generate_page_previews']},
+    {'queue': 'oversized', 'outputs': ['jpg', 'png', 'pdf']},
+]
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(filesystems.close_pool)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.fs_url = f'osfs://{self.directory.name}'
+        for file, size in [('small.odt', 1024), ('large.odt', 4096), ('small.xlsx', 1024), ('small.ppt', 1024)]:
+            with open(os.path.join(self.directory.name, file), 'wb') as input_file:
+                input_file.write(b'\0' * size)
+        self.router = routing.Router(lanes=_LANES, max_input_size=1024**2)
+
+    def route(self, task, options=None, **kwargs):
+        return self.router(f'unoconv.tasks.{task}', (), kwargs, options or {})
+
+    @parameterized.expand([
+        ('small_preview', 'generate_preview_jpg', 'small.odt', 'fast-preview'),
+        ('large_preview', 'generate_preview_png', 'large.odt', 'oversized'),
+        ('missing_preview', 'generate_preview_jpg', 'does-not-exist.odt', 'oversized'),
+        ('document_pdf', 'generate_pdf', 'small.odt', 'heavy-pdf'),
+        ('spreadsheet_pdf', 'generate_pdf', 'small.xlsx', 'heavy-pdf'),
+        ('presentation_pdf', 'generate_pdf', 'small.ppt', 'oversized'),
+        ('webp', 'generate_preview_webp', 'small.odt', None),
+    ])
+    def test_single_input(self, _, task, input_file, queue):
+        route = self.route(task, input_fs_url=self.fs_url, input_file=input_file)
+        self.assertEqual(queue, route['queue'] if route is not None else None)
+
+    def test_document_type_from_metadata(self):
+        route = self.route(
+            'generate_pdf',
+            input_fs_url=self.fs_url,
+            input_file='small.ppt',
+            mime_type='application/vnd.oasis.opendocument.text',
+            extension='.odt')
+        self.assertEqual({'queue': 'heavy-pdf'}, route)
+
+    @parameterized.expand([
+        ('previews', [{'format': 'jpg'}, {'format': 'png'}], 'fast-preview'),
+        ('mixed', [{'format': 'jpg'}, {'format': 'pdf'}], 'oversized'),
+        ('none', [], None),
+    ])
+    def test_renditions(self, _, renditions, queue):
+        route = self.route(
+            'generate_renditions', input_fs_url=self.fs_url, input_file='small.odt', renditions=renditions)
+        self.assertEqual(queue, route['queue'] if route is not None else None)
+
+    def test_page_previews(self):
+        route = self.route('generate_page_previews', input_fs_url=self.fs_url, input_file='large.odt', format='png')
+        self.assertEqual({'queue': 'page-previews'}, route)
+
+    @parameterized.expand([
+        ('small', ['small.odt'], 'fast-preview'),
+        # The sizes of all items are added up
+        ('large', ['small.odt', 'small.xlsx', 'small.ppt'], 'oversized'),
+    ])
+    def test_batch(self, _, input_files, queue):
+        route = self.route(
+            'generate_preview_jpg_batch',
+            input_fs_url=self.fs_url,
+            items=[{
+                'input_file': input_file,
+                'output_file': f'{input_file}.jpg'
+            } for input_file in input_files])
+        self.assertEqual({'queue': queue}, route)
+
+    def test_batch_mixed_document_types(self):
+        route = self.route(
+            'generate_pdf_batch',
+            input_fs_url=self.fs_url,
+            items=[{
+                'input_file': 'small.odt',
+                'output_file': 'small.odt.pdf'
+            }, {
+                'input_file': 'small.xlsx',
+                'output_file': 'small.xlsx.pdf'
+            }])
+        self.assertEqual({'queue': 'oversized'}, route)
+
+    @parameterized.expand([('small', 1024, 'fast-preview'), ('large', 4096, 'oversized')])
+    def test_inline(self, _, size, queue):
+        route = self.route('generate_preview_jpg_inline', data=b'\0' * size, extension='.odt')
+        self.assertEqual({'queue': queue}, route)
+
+    def test_max_input_size(self):
+        self.router = routing.Router(lanes=_LANES, max_input_size=2048)
+        with self.assertRaises(ValueError):
+            self.route('generate_pdf', input_fs_url=self.fs_url, input_file='large.odt')
+        with self.assertRaises(ValueError):
+            self.route('generate_pdf_inline', data=b'\0' * 4096, extension='.odt')
+
+    def test_unavailable_filesystem(self):
+        route = self.route('generate_preview_jpg', input_fs_url='this-is-invalid', input_file='small.odt')
+        self.assertEqual({'queue': 'oversized'}, route)
+
+    def test_not_routed(self):
+        self.assertIsNone(
+            self.route('generate_preview_jpg', {'queue': 'explicit'}, input_fs_url=self.fs_url, input_file='small.odt'))
+        self.assertIsNone(
+            self.router('other.tasks.generate_preview_jpg', (), {
+                'input_fs_url': self.fs_url,
+                'input_file': 'small.odt'
+            }, {}))
+        self.assertIsNone(routing.Router(lanes=[])('unoconv.tasks.generate_pdf', (), {}, {}))
+
+
+class TestLanes(unittest.TestCase):
+
+    def test_parse(self):
+        [lane] = routing.parse_lanes([{'queue': 'fast', 'outputs': ['jpg'], 'max_input_size': 1024}])
+        self.assertEqual(
+            routing.Lane(queue='fast', tasks=None, outputs={'jpg'}, document_types=None, max_input_size=1024), lane)
+
+    @parameterized.expand([
+        ('no_queue', {'outputs': ['jpg']}),
+        ('empty_queue', {'queue': ''}),
+        ('unknown_option', {'queue': 'fast', 'priority': 1}),
+    ])
+    def test_invalid(self, _, specification):
+        with self.assertRaises(ValueError):
+            routing.parse_lanes([specification])
+
+    def test_first_match_wins(self):
+        lanes = routing.parse_lanes([{'queue': 'first', 'tasks': ['generate_pdf']}, {'queue': 'second'}])
+        lane = routing.select_lane(
+            lanes, task='generate_pdf', outputs={'pdf'}, document_type='document', input_size=None)
+        self.assertEqual('first', lane.queue)
+        lane = routing.select_lane(
+            lanes, task='generate_preview_jpg', outputs={'jpg'}, document_type='document', input_size=None)
+        self.assertEqual('second', lane.queue)
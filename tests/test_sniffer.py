@@ -0,0 +1,69 @@
+import os
+import unittest
+from io import BytesIO
+
+from parameterized import parameterized
+
+from unoconv import sniffer
+
+# yapf: disable
+example_files = [
+    ('document/doc/example.doc', None, '.doc', 'ole2'),
+    ('document/dot/example.dot', None, '.doc', 'ole2'),
+    ('spreadsheet/xls/example.xls', None, '.xls', 'ole2'),
+    ('presentation/ppt/example.ppt', None, '.ppt', 'ole2'),
+    ('presentation/pps/example.pps', None, '.ppt', 'ole2'),
+    ('document/docx/example.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', None, 'zip'),
+    ('spreadsheet/xlsx/example.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', None, 'zip'),
+    ('presentation/pptx/example.pptx', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', None, 'zip'),
+    ('document/odt/example.odt', 'application/vnd.oasis.opendocument.text', None, 'zip'),
+    ('spreadsheet/ods/example.ods', 'application/vnd.oasis.opendocument.spreadsheet', None, 'zip'),
+    ('rtf/example_small.rtf', 'application/rtf', '.rtf', 'rtf'),
+    ('raster image/tif/example.tif', 'image/tiff', '.tiff', 'tiff'),
+    ('raster image/tiff/example.tiff', 'image/tiff', '.tiff', 'tiff'),
+    ('raster image/bmp/example.bmp', 'image/bmp', '.bmp', 'bmp'),
+    ('raster image/emf/example.emf', 'image/emf', '.emf', 'emf'),
+    ('raster image/wmf/example.wmf', 'image/wmf', '.wmf', 'wmf'),
+    ('vector image/svg/example.svg', 'image/svg+xml', '.svg', 'svg'),
+]
+# yapf: enable
+
+_SVG = sniffer.Sniffed(mime_type='image/svg+xml', extension='.svg', container='svg')
+
+
+class TestSniffer(unittest.TestCase):
+
+    @parameterized.expand(example_files)
+    def test_example_file(self, file, mime_type, extension, container):
+        with open(os.path.join('example-files', file), 'rb') as data:
+            self.assertEqual(
+                sniffer.Sniffed(mime_type=mime_type, extension=extension, container=container), sniffer.sniff(data))
+            self.assertEqual(0, data.tell())
+
+    def test_unknown(self):
+        with open('example-files/spreadsheet/csv/example.csv', 'rb') as data:
+            self.assertIsNone(sniffer.sniff(data))
+        self.assertIsNone(sniffer.sniff(BytesIO(b'')))
+
+    @parameterized.expand([
+        ('plain', b'<svg xmlns="http://www.w3.org/2000/svg"/>'),
+        ('bom', b'\xef\xbb\xbf<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg"></svg>'),
+        ('prefixed', b'<?xml version="1.0"?><svg:svg xmlns:svg="http://www.w3.org/2000/svg"></svg:svg>'),
+        ('prolog', b'<?xml version="1.0"?>\n<!-- <html> -->\n<?xml-stylesheet href="a.css"?>\n'
+         b'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd" '
+         b'[<!ENTITY a "b">]>\n<svg\n  xmlns="http://www.w3.org/2000/svg"></svg>'),
+    ])
+    def test_svg(self, _, content):
+        self.assertEqual(_SVG, sniffer.sniff(BytesIO(content)))
+
+    @parameterized.expand([
+        ('flat_odf', b'<?xml version="1.0" encoding="UTF-8"?>\n<office:document '
+         b'xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+         b'xmlns:svg="urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0" '
+         b'office:mimetype="application/vnd.oasis.opendocument.graphics"><svg:desc/></office:document>'),
+        ('docbook', b'<?xml version="1.0"?>\n<!DOCTYPE article>\n<article><mediaobject><imageobject>'
+         b'<imagedata><svg xmlns="http://www.w3.org/2000/svg"/></imagedata></imageobject></mediaobject></article>'),
+        ('similar_name', b'<?xml version="1.0"?><svgdoc/>'),
+    ])
+    def test_xml_containing_svg(self, _, content):
+        self.assertIsNone(sniffer.sniff(BytesIO(content)))